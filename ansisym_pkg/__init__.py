@@ -0,0 +1,3 @@
+"ansisym -- ANSI-style gschem symbol generator."
+
+__version__ = '0.1'
@@ -0,0 +1,646 @@
+"ansisym build driver -- compiles .symt sources into .sym files."
+
+#   Copyright 2013 David B. Curtis
+
+#   This file is part of ansisym.
+#
+#   ansisym is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   ansisym is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with ansisym.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# The driver is split out of the ansisym script so that a single
+# process can compile any number of source files.  Everything that
+# is expensive to set up -- the lexer and parser tables, font
+# measurement caches, and the boilerplate -- is built once and
+# reused for every file.
+
+import os
+import glob
+import json
+import time
+import hashlib
+import shutil
+import cStringIO
+import datetime as dt
+
+import ansisym_pkg
+import ansisymErrorSink as er
+import ansisymModel as mdl
+import ansisymGSView as vw
+import ansisymFontTables as ft
+from ansisymProfile import prof
+from ansisymTrace import trace
+
+boilerplatePath = ['.ansisym.boilerplate','~/.ansisym.boilerplate']
+
+sourceSuffix = '.symt'
+
+timingsFile = '.ansisym.timings' # Per-file compile times from earlier -j runs.
+
+manifestFile = '.ansisym.manifest' # Input hashes and outputs for --incremental.
+
+theDate = dt.date.today()
+
+def fileNameRoot(s):
+    bn = os.path.basename(s)
+    return os.path.splitext(bn)[0]
+
+def substMetaChars(s):
+    "Interprets % meta chars in attributes and returns updated string."
+    if '%' not in s:
+        return s
+    s = s.replace('%Y',str(theDate.year))
+    return s
+
+def searchForBoilerplateFile(path, override = None):
+    "Returns a filename, or None."
+    # Don't search path if override is specified.
+    if override != None:
+        return override if os.path.isfile(override) else None
+    for name in path:
+        if os.path.isfile(name):
+            return name
+    return None
+
+def loadBoilerplate(path, override = None):
+    "Loads and preprocesses boilerplate, returns as list of [attr,value] lists."
+    fname = searchForBoilerplateFile(path, override)
+    if fname == None:
+        if override == None:
+            m = 'No boilerplate file found in: '
+            m += ', '.join(path)
+            m += " Run 'ansisym -S' to create example."
+        else:
+            m = override + ' not found.'
+        er.ror.msg('w', m)
+        return []
+    with open(fname) as f:
+        try:
+            bp = f.read()
+        except:
+            er.ror.msg('w',"Can't read boilerplate file" + fname)
+            return []
+    try:
+        bp = bp.split('\n')
+        bp = [x.split('=') for x in bp if x != '' and x[0] != '#']
+        boilerplate = [[x,substMetaChars(y.strip('"'))] for x,y in bp]
+    except:
+        er.ror.msg('w', "Syntax error in boilerplate file.")
+        boilerplate = []
+    return boilerplate
+
+def expandSources(specs):
+    """Expands a list of file names, directories and glob patterns
+    into a list of source files.  Directories are searched recursively
+    for *.symt files.  Duplicates are dropped, order is preserved."""
+    l = []
+    seen = set()
+    for spec in specs:
+        if os.path.isdir(spec):
+            names = []
+            for root, dirs, files in os.walk(spec):
+                dirs.sort()
+                names.extend([os.path.join(root, fn) for fn in sorted(files)
+                              if fn.endswith(sourceSuffix)])
+        elif os.path.isfile(spec):
+            names = [spec]
+        else:
+            # Globs normally get expanded by the shell, but a quoted
+            # pattern lets us get past ARG_MAX on really big libraries.
+            names = sorted(glob.glob(os.path.expanduser(spec)))
+            if not names:
+                er.ror.msg('f', ' '.join([spec, 'not found.']))
+        for name in names:
+            if name not in seen:
+                seen.add(name)
+                l.append(name)
+    return l
+
+#
+# Output files.
+#
+# Outputs are only written when their contents change, so unchanged
+# symbols keep their mtimes.  A changed file is written in one go to
+# a temporary file next to it and renamed into place, so readers never
+# see a half-written symbol.
+def outputChanged(fname, text):
+    "True unless fname exists and holds exactly text."
+    try:
+        if os.path.getsize(fname) != len(text):
+            return True
+        with open(fname, 'rb') as f:
+            return f.read() != text
+    except (IOError, OSError):
+        return True
+
+def _tempName(fname):
+    d, bn = os.path.split(fname)
+    return os.path.join(d, '.{0:s}.{1:d}.tmp'.format(bn, os.getpid()))
+
+def _backup(fname):
+    "Preserves existing fname as fname~."
+    bak = fname + '~'
+    try:
+        os.remove(bak)
+    except OSError:
+        pass
+    try:
+        os.link(fname, bak)
+    except OSError:
+        try:
+            shutil.copy2(fname, bak)
+        except (IOError, OSError):
+            pass # Nothing to back up.
+
+def writeOutputs(files, args):
+    """Writes a list of (fname, text), skipping files that are unchanged.
+    The files are all staged before any is renamed into place, so if
+    one can't be written none of them are changed.  With args.dry_run
+    nothing is written; the files that would change are reported."""
+    changed = [(fn, text) for fn, text in files if outputChanged(fn, text)]
+    if args.dry_run:
+        for fn, text in changed:
+            verb = 'would change.' if os.path.exists(fn) else 'would be created.'
+            er.ror.msg('i', ' '.join([fn, verb]))
+        return
+    staged = []
+    try:
+        for fn, text in changed:
+            tmp = _tempName(fn)
+            staged.append(tmp)
+            with open(tmp, 'wb') as f:
+                f.write(text)
+    except:
+        for tmp in staged:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        raise
+    for (fn, text), tmp in zip(changed, staged):
+        if not args.nosave:
+            _backup(fn)
+        os.rename(tmp, fn)
+
+def _reusedBlocks(part, blocks):
+    """Reports blocks of part that are already in blocks, the names of
+    blocks in earlier parts of the same source, since their outputs
+    would overwrite each other.  Adds the rest to blocks.  Returns True
+    if there were any."""
+    names = part.blockNameSet()
+    reused = names & blocks
+    for name in sorted(reused):
+        er.ror.msg('f', ' '.join(['Block', name,
+                                  'is also in an earlier part.']))
+    blocks |= names
+    return bool(reused)
+
+def readParts(fname, boilerplate, args, text = None):
+    """Yields the Parts in one source file, one at a time, reading no
+    more of the file than the part being yielded.  The source is read
+    from fname unless its text is given.  A part with fatal errors, or
+    a block id used by an earlier part, is reported and yielded as None."""
+    f = open(fname) if text == None else cStringIO.StringIO(text)
+    blocks = set() # Block ids of the parts so far.
+    try:
+        if args.fromrep:
+            # Load existing .symr file.
+            n = 0
+            while True:
+                try:
+                    with prof.phase('loadrep'):
+                        part = mdl.loadRep(f)
+                except ValueError as e:
+                    er.ror.msg('p', ' '.join(["Can't read intermediate representation from",
+                                              fname + ':', str(e)]))
+                if part == None:
+                    break
+                n += 1
+                if _reusedBlocks(part, blocks):
+                    part = None
+                else:
+                    prof.countPart(part)
+                yield part
+            if n == 0:
+                er.ror.msg('p', ' '.join(["Can't read intermediate representation from",
+                                          fname + ': empty file.']))
+            return
+        # Building the lexer and parser is the biggest part of startup,
+        # so it is put off until there is something to parse.  Clients
+        # of the compile server and --fromrep never need them.
+        import ansisymParser
+        import ply.lex as lex
+        for partText, firstLine, name in ansisymParser.splitParts(f):
+            checkpoint = er.ror.checkpoint()
+            er.ror.lineNo = firstLine # For messages that don't give a line.
+            if name != None:
+                # Says which part of a library a message is about; with
+                # compilerStyle the line number does that.
+                er.ror.part = name if name != '' else (
+                    'P, line ' + str(firstLine - 1))
+            try:
+                with prof.phase('parse'):
+                    part = ansisymParser.parse(partText, boilerplate,
+                                               1 if 'p' in args.debug else 0,
+                                               firstLine)
+            except er.ansisymPanic:
+                part = None
+            except lex.LexError as e:
+                # One bad character loses the part, not the rest of the run.
+                er.ror.msg('f', "Illegal character '{0:s}', line: {1:d}".format(
+                           e.text[0], e.lineno), e.lineno)
+                part = None
+            # A part with fatal errors isn't worth validating.
+            if er.ror.fatalSince(checkpoint):
+                part = None
+            elif part != None:
+                if _reusedBlocks(part, blocks):
+                    part = None
+                else:
+                    prof.countPart(part)
+            yield part
+    finally:
+        er.ror.lineNo = None
+        er.ror.part = None
+        f.close()
+
+def renderPart(part, args):
+    """Validates and renders one part, yielding (output file name,
+    contents) for each selected block as it is rendered.  Raises
+    ansisymPanic if the part isn't valid."""
+    # Debug output: dump part model.
+    if 'm' in args.debug:
+        print '==== Model ===='
+        print part
+
+    # Validate the part model.
+    with prof.phase('validate'):
+        valid = part.isValid
+    if not valid:
+        raise er.ansisymPanic
+
+    if args.block == None:
+        selectedBlocks = part.blockNameSet()
+    else:
+        selectedBlocks = part.blockNameSet() & set([args.block])
+        if not selectedBlocks:
+            return
+    # Create a gEDA view on the selected blocks of the part model.
+    with prof.phase('view'):
+        view = vw.GVPart(part, selectedBlocks)
+    if 'v' in args.debug:
+        print '==== View ===='
+        print view
+    # Assign pin sequences.
+    with prof.phase('pinseq'):
+        view.assignPinseqAll()
+    with prof.phase('slotattrs'):
+        view.addSlotAttrsAll()
+    # Lay out the drawing elements.
+    with prof.phase('layout'):
+        view.layoutAll()
+    if 'l' in args.debug:
+        print '==== View post layout ===='
+        print view
+    # Render selected packages and blocks.
+    for name in selectedBlocks:
+        with prof.phase('render'):
+            text = '\n'.join(view.render(name)) + '\n'
+        prof.countOutput(text)
+        yield (name + '.sym', text)
+
+def renderSource(fname, boilerplate, args, text = None):
+    """Compiles one source file a part at a time.  For each block,
+    yields a list of (output file name, contents) as soon as it is
+    rendered; each part is dropped before the next is read, so a
+    library file of any size compiles in bounded memory.  Parts with
+    errors are reported and skipped.  With args.reponly a single .symr
+    file with all the parts is yielded at the end, if they are all valid."""
+    rep = cStringIO.StringIO() if args.reponly else None
+    found = False # Some part has the selected block.
+    anyValid = False
+    allValid = True
+    for part in readParts(fname, boilerplate, args, text):
+        if part == None:
+            allValid = False
+            continue
+        try:
+            if rep != None:
+                # Just the intermediate representation.
+                with prof.phase('validate'):
+                    valid = part.isValid
+                if not valid:
+                    raise er.ansisymPanic
+                with prof.phase('dumprep'):
+                    mdl.dumpRep(part, rep)
+            else:
+                for output in renderPart(part, args):
+                    found = True
+                    yield [output]
+            anyValid = True
+        except er.ansisymPanic:
+            allValid = False
+    if rep != None:
+        # A partial .symr would replace a good one, and an empty one
+        # can't be read back.
+        if anyValid and allValid:
+            yield [(fileNameRoot(fname) + '.symr', rep.getvalue())]
+    elif args.block != None and anyValid and not found:
+        er.ror.msg('p', ' '.join([args.block,'is not a block id.']))
+
+def compileFile(fname, boilerplate, args, outputs = None):
+    """Compiles one source file.  Returns True on success.
+    Names of files written are appended to outputs, if given.
+    Each block's output is written as soon as it is rendered, or
+    with args.atomic all together at the end."""
+    checkpoint = er.ror.checkpoint()
+    try:
+        with trace.span('compile', file=fname), prof.source(fname):
+            pending = []
+            for rendered in renderSource(fname, boilerplate, args):
+                if args.atomic:
+                    pending.extend(rendered)
+                else:
+                    with prof.phase('write'):
+                        writeOutputs(rendered, args)
+                if outputs != None:
+                    outputs.extend([fn for fn, text in rendered])
+            if pending:
+                with prof.phase('write'):
+                    writeOutputs(pending, args)
+    except er.ansisymPanic:
+        return False
+    except (IOError, OSError) as e:
+        er.ror.msg('f', ' '.join(["Can't process", fname + ':', e.strerror]))
+        return False
+    return not er.ror.fatalSince(checkpoint)
+
+def checkFile(fname, boilerplate, args):
+    """Parses and validates every part in one source file, with no
+    view, layout or output.  Returns True if all are valid."""
+    checkpoint = er.ror.checkpoint()
+    try:
+        with trace.span('check', file=fname), prof.source(fname):
+            for part in readParts(fname, boilerplate, args):
+                if part == None:
+                    continue
+                with prof.phase('validate'):
+                    part.isValid
+    except er.ansisymPanic:
+        return False
+    except (IOError, OSError) as e:
+        er.ror.msg('f', ' '.join(["Can't process", fname + ':', e.strerror]))
+        return False
+    return not er.ror.fatalSince(checkpoint)
+
+#
+# Incremental builds.
+#
+# The manifest remembers, for every source compiled without errors,
+# a hash of everything that goes into its outputs and the names of
+# the files it wrote.  A source whose hash is unchanged and whose
+# outputs are all still present is skipped without being parsed.
+class Manifest(object):
+    "Input hashes and output lists of sources from earlier runs."
+    _version = 1
+    def __init__(self, fname = manifestFile):
+        self.fname = fname
+        self.entries = dict() # abs source name -> {'hash':..., 'outputs':[...]}
+        self._pending = dict() # source name -> hash of this run's inputs
+    @classmethod
+    def load(cls, fname = manifestFile):
+        m = cls(fname)
+        try:
+            with open(fname) as f:
+                d = json.load(f)
+            if d['version'] == cls._version:
+                m.entries = d['sources']
+        except (IOError, ValueError, KeyError, TypeError):
+            pass
+        return m
+    def save(self):
+        try:
+            with open(self.fname, 'w') as f:
+                json.dump({'version':self._version, 'sources':self.entries}, f,
+                          indent=0, sort_keys=True)
+        except IOError:
+            er.ror.msg('w', "Can't write " + self.fname)
+    @staticmethod
+    def inputHash(text, boilerplate, args, fontTables):
+        """Hash of the source text and everything else that affects the
+        outputs.  fontTables is ft.tablesChecksum(); with --metrics auto
+        it also decides which fonts are measured by cairo.  Directives
+        the source sets are in its text."""
+        h = hashlib.sha1()
+        for item in [ansisym_pkg.__version__, str(theDate.year),
+                     repr(mdl.DirectiveDict().settings()), fontTables,
+                     repr(boilerplate),
+                     repr([args.block, args.reponly, args.fromrep, args.metrics]),
+                     text]:
+            h.update(item)
+            h.update('\0')
+        return h.hexdigest()
+    def staleSources(self, fnames, boilerplate, args):
+        "Returns the sources in fnames that need to be compiled."
+        l = []
+        fontTables = ft.tablesChecksum() # Tables can be rebuilt between runs.
+        for fname in fnames:
+            try:
+                with open(fname) as f:
+                    h = self.inputHash(f.read(), boilerplate, args, fontTables)
+            except IOError:
+                l.append(fname) # Let the compiler report it.
+                continue
+            self._pending[fname] = h
+            e = self.entries.get(os.path.abspath(fname))
+            if e == None or e['hash'] != h \
+            or not all([os.path.isfile(o) for o in e['outputs']]):
+                l.append(fname)
+        return l
+    def update(self, fname, ok, outputs):
+        "Records the result of compiling fname."
+        key = os.path.abspath(fname)
+        if ok and fname in self._pending:
+            self.entries[key] = {'hash':self._pending[fname], 'outputs':outputs}
+        else:
+            self.entries.pop(key, None)
+
+def loadTextWidths():
+    "Primes the text width cache from its on-disk copy, if there is one."
+    vw.textWidths.load(vw.textWidthsFile)
+
+def saveTextWidths():
+    if not vw.textWidths.save(vw.textWidthsFile):
+        er.ror.msg('w', "Can't write text width cache " + vw.textWidthsFile)
+
+def compileFiles(fnames, boilerplate, args, manifest = None):
+    """Compiles a list of source files in this process, or with
+    args.check just validates them.  Returns count of failures."""
+    failed = 0
+    for fname in fnames:
+        if len(fnames) > 1 or args.check:
+            er.ror.source = fname
+        outputs = []
+        if args.check:
+            ok = checkFile(fname, boilerplate, args)
+        else:
+            ok = compileFile(fname, boilerplate, args, outputs)
+        if manifest != None:
+            manifest.update(fname, ok, outputs)
+        if not ok:
+            failed += 1
+    er.ror.source = None
+    return failed
+
+#
+# Parallel builds.
+#
+# Each worker process compiles whole files.  Messages are captured
+# in the worker and handed back with the result, so the diagnostics
+# for a file are printed together and never interleave with those
+# of another file.
+_workerBoilerplate = None
+_workerArgs = None
+
+def _initWorker(boilerplate, args):
+    global _workerBoilerplate, _workerArgs
+    _workerBoilerplate = boilerplate
+    _workerArgs = args
+    if args.fontcache:
+        vw.textWidths.trackNew() # New widths go back to the parent for saving.
+    if args.profile or args.profile_json:
+        prof.enable()
+    if args.trace:
+        trace.reset() # Events from before the fork are the parent's.
+        trace.enable()
+
+class WorkerResult(object):
+    "What a worker process hands back for one source file."
+    def __init__(self, fname):
+        self.fname = fname
+        self.ok = False
+        self.messages = []
+        self.counts = (0,0,0,0)
+        self.seconds = 0.0
+        self.outputs = [] # Files written.
+        self.widths = [] # New text width cache entries.
+        self.profile = None # Profiler statistics, if profiling.
+        self.trace = None # Trace events, if tracing.
+
+def _compileInWorker(fname):
+    r = WorkerResult(fname)
+    start = time.time()
+    before = er.ror.counts
+    er.ror.source = fname
+    er.ror.capture()
+    try:
+        if _workerArgs.check:
+            r.ok = checkFile(fname, _workerBoilerplate, _workerArgs)
+        else:
+            r.ok = compileFile(fname, _workerBoilerplate, _workerArgs, r.outputs)
+    except Exception as e:
+        er.ror.msg('f', ' '.join(['Internal error:', repr(e)]))
+    r.messages = er.ror.release()
+    r.counts = tuple([a - b for a,b in zip(er.ror.counts, before)])
+    r.seconds = time.time() - start
+    r.widths = vw.textWidths.takeNew()
+    if prof.enabled:
+        r.profile = prof.takeSources()
+    if trace.enabled:
+        r.trace = trace.takeEvents('ansisym worker')
+    return r
+
+def loadTimings(fname = timingsFile):
+    "Returns dict of source name to compile time recorded by an earlier run."
+    try:
+        with open(fname) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return dict()
+
+def saveTimings(timings, fname = timingsFile):
+    try:
+        with open(fname, 'w') as f:
+            json.dump(timings, f, indent=0, sort_keys=True)
+    except IOError:
+        er.ror.msg('w', "Can't write " + fname)
+
+def scheduleOrder(fnames, timings):
+    """Orders fnames biggest-first, so the long poles start early.
+    Recorded timings are used where known; other files are estimated
+    from their size."""
+    sizes = dict()
+    for fn in fnames:
+        try:
+            sizes[fn] = os.path.getsize(fn)
+        except OSError:
+            sizes[fn] = 0
+    known = [fn for fn in fnames if os.path.abspath(fn) in timings]
+    knownSize = sum([sizes[fn] for fn in known])
+    knownTime = sum([timings[os.path.abspath(fn)] for fn in known])
+    rate = knownTime / knownSize if knownSize > 0 and knownTime > 0 else 1.0
+    def cost(fn):
+        t = timings.get(os.path.abspath(fn))
+        return t if t != None else sizes[fn] * rate
+    return sorted(fnames, key=cost, reverse=True)
+
+def compileFilesParallel(fnames, boilerplate, args, jobs, manifest = None):
+    """Compiles source files on a pool of jobs worker processes, or
+    with args.check just validates them.  Returns count of failures."""
+    import multiprocessing # Only needed with -j, so not imported up front.
+    if jobs < 1:
+        jobs = multiprocessing.cpu_count()
+    timings = loadTimings()
+    ordered = scheduleOrder(fnames, timings)
+    pool = multiprocessing.Pool(min(jobs, len(fnames)), _initWorker,
+                                (boilerplate, args))
+    failed = 0
+    try:
+        for r in pool.imap_unordered(_compileInWorker, ordered, 1):
+            with trace.span('collect', file=r.fname):
+                for m in r.messages:
+                    print m
+                er.ror.merge(r.counts)
+                vw.textWidths.merge(r.widths)
+                if r.profile != None:
+                    prof.merge(r.profile)
+                if r.trace != None:
+                    trace.merge(r.trace)
+                timings[os.path.abspath(r.fname)] = r.seconds
+                if manifest != None:
+                    manifest.update(r.fname, r.ok, r.outputs)
+                if not r.ok:
+                    failed += 1
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    # A dry run writes nothing, and checking says little about compile times.
+    if not (args.dry_run or args.check):
+        saveTimings(timings)
+    return failed
+
+def exitMessage(nFiles = 1, nFailed = 0, nSkipped = 0):
+    "Summary of error counts, or '' if there is nothing to report."
+    i,w,f,p = er.ror.counts
+    l = []
+    if nFiles > 1 or nSkipped > 0:
+        l.extend([str(nFiles),'files,'])
+        if nSkipped > 0:
+            l.extend([str(nSkipped),'up to date,'])
+        l.extend([str(nFailed),'failed.'])
+    if w+f > 0:
+        l.extend([str(w),'warnings,',str(f),'fatal errors.'])
+    return ' '.join(l)
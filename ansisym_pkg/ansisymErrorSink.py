@@ -18,6 +18,8 @@
 #   along with ansisym.  If not, see <http://www.gnu.org/licenses/>.
 #   
 
+import re
+
 class ansisymPanic(Exception):
     pass
 
@@ -25,11 +27,53 @@ class ErrorSink(object):
     "Funnels error messages, keeps counts by severity."
     _counters = {'i':0,'w':0,'f':0,'p':0}
     _sevSpell = {'i':'INFO','w':'WARNING','f':'FATAL','p':'PANIC'}
-    def msg(self, sev, message):
+    _sevCompiler = {'i':'note','w':'warning','f':'error','p':'error'}
+    source = None # Name of file being compiled, prefixed to messages if set.
+    lineNo = None # Line of the part being compiled, if a message gives none.
+    part = None # Part of a library being compiled, prefixed to messages if set.
+    compilerStyle = False # Print 'file:line: error: message' for editors.
+    _captured = None # List of captured message lines, or None to print.
+    _lineRef = re.compile(r',? +[Ll]ine: ?(\d+)') # As messages spell it.
+    def msg(self, sev, message, lineNo = None):
+        """Reports message with severity sev.  lineNo is the source line
+        it is about, if known; it is only used for compilerStyle."""
         self._counters[sev] += 1
-        print ': '.join([self._sevSpell[sev],message])
+        if self.compilerStyle:
+            if lineNo == None:
+                lineNo = self.lineNo
+            else:
+                # The file:line: prefix says it; drop the message's own.
+                message = self._lineRef.sub(
+                    lambda m: '' if int(m.group(1)) == lineNo else m.group(0),
+                    message)
+            l = [self._sevCompiler[sev],message]
+            if self.source != None:
+                l.insert(0, self.source if lineNo == None
+                         else '{0:s}:{1:d}'.format(self.source, lineNo))
+        else:
+            l = [self._sevSpell[sev],message]
+            if self.part != None:
+                l.insert(0, self.part)
+            if self.source != None:
+                l.insert(0, self.source)
+        if self._captured != None:
+            self._captured.append(': '.join(l))
+        else:
+            print ': '.join(l)
         if sev == 'p':
             raise ansisymPanic
+    def capture(self):
+        "Collect messages instead of printing them, until release()."
+        self._captured = []
+    def release(self):
+        "Stops capturing, returns list of captured message lines."
+        l = self._captured if self._captured != None else []
+        self._captured = None
+        return l
+    def merge(self, counts):
+        "Adds (i,w,f,p) counts reported elsewhere, e.g. by a worker process."
+        for sev, n in zip('iwfp', counts):
+            self._counters[sev] += n
     @property
     def counts(self):
         return (self._counters['i'], self._counters['w'], 
@@ -37,6 +81,13 @@ class ErrorSink(object):
     @property
     def haveFatalErrors(self):
         return self._counters['f'] > 0 or self._counters['p'] > 0
+    def checkpoint(self):
+        "Returns a snapshot of the counts for use with fatalSince()."
+        return self.counts
+    def fatalSince(self, checkpoint):
+        "True if fatal errors have been reported since checkpoint was taken."
+        i,w,f,p = self.counts
+        return f > checkpoint[2] or p > checkpoint[3]
 
 # Single instance of ErrorSink class.
 # The goofy name becomes readable if this module is imported as 'er',
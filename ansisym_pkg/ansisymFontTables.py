@@ -0,0 +1,214 @@
+"ansisym font tables -- cairo-free text measurement from precomputed metrics."
+
+#   Copyright 2013 David B. Curtis
+
+#   This file is part of ansisym.
+#
+#   ansisym is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   ansisym is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with ansisym.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Layout only needs the ink width of short strings in a handful of
+# fonts, so cairo is overkill at run time.  A font table holds, for
+# every printable ASCII character, the advance width and the left and
+# right ink edges relative to the pen position, plus any kerning
+# pairs.  All values are measured once with cairo at a reference
+# scale (normally by 'ansisym --setup') and stored as JSON next to
+# the installed modules.  Measuring a string is then a table sum.
+#
+# The ink width of a string is taken to run from the left edge of its
+# first non-blank glyph to the right edge of its last one, which is
+# what cairo's text_extents() reports for ordinary text.
+
+import os
+import re
+import glob
+import json
+import random
+import hashlib
+
+_tableVersion = 1
+_referenceScale = 1000.0 # Font scale the tables are measured at.
+_chars = [chr(c) for c in xrange(32,127)] # Printable ASCII.
+
+tableDir = os.path.dirname(os.path.abspath(__file__))
+
+_tables = dict() # Loaded FontTable instances (or None) by font name.
+
+def tableFileName(fontName):
+    "Returns the path of the table file for fontName."
+    safe = re.sub('[^A-Za-z0-9_-]', '_', fontName)
+    return os.path.join(tableDir, 'fonttable-' + safe + '.json')
+
+def tablesChecksum():
+    """md5, in hex, of the names and contents of the font tables there
+    are.  Which fonts have tables, and what is in them, decide text
+    widths and so layout."""
+    h = hashlib.md5()
+    for fname in sorted(glob.glob(os.path.join(tableDir, 'fonttable-*.json'))):
+        h.update(os.path.basename(fname))
+        h.update('\0')
+        try:
+            with open(fname, 'rb') as f:
+                h.update(f.read())
+        except IOError:
+            pass
+        h.update('\0')
+    return h.hexdigest()
+
+class FontTable(object):
+    "Per-character metrics for one font at the reference scale."
+    def __init__(self, fontName, glyphs, kerning):
+        self.name = fontName
+        self._advance = dict()
+        self._left = dict()
+        self._right = dict()
+        for c, (adv, left, right) in glyphs.items():
+            self._advance[c] = adv
+            self._left[c] = left
+            self._right[c] = right
+        self._kerning = kerning # dict of two character strings
+    def width(self, aString, scale):
+        "Ink width of aString at scale, or None if a character isn't in the table."
+        t = aString.strip(' ')
+        if t == '':
+            return 0.0
+        try:
+            w = sum(map(self._advance.__getitem__, t[:-1]))
+            w += self._right[t[-1]] - self._left[t[0]]
+        except KeyError:
+            return None
+        if self._kerning:
+            kern = self._kerning
+            w += sum([kern.get(t[i:i+2], 0.0) for i in xrange(len(t)-1)])
+        return w * scale / _referenceScale
+    def widths(self, strings, scale):
+        "List of width() for each of strings."
+        return [self.width(s, scale) for s in strings]
+    def approxWidth(self, aString, scale):
+        "Like width(), but unknown characters are measured as 'n'."
+        known = self._advance
+        return self.width(''.join([c if c in known else 'n' for c in aString]),
+                          scale)
+    def toDict(self):
+        glyphs = dict([(c, [self._advance[c], self._left[c], self._right[c]])
+                       for c in self._advance])
+        return {'version':_tableVersion, 'font':self.name,
+                'scale':_referenceScale, 'glyphs':glyphs,
+                'kerning':self._kerning}
+    @classmethod
+    def fromDict(cls, d):
+        if d['version'] != _tableVersion or d['scale'] != _referenceScale:
+            raise ValueError('Incompatible font table.')
+        glyphs = dict([(c.encode('utf-8'), v) for c, v in d['glyphs'].items()])
+        kerning = dict([(k.encode('utf-8'), v) for k, v in d['kerning'].items()])
+        return cls(d['font'].encode('utf-8'), glyphs, kerning)
+
+def tableFor(fontName):
+    "Returns the FontTable for fontName, or None if there isn't one."
+    try:
+        return _tables[fontName]
+    except KeyError:
+        pass
+    try:
+        with open(tableFileName(fontName)) as f:
+            t = FontTable.fromDict(json.load(f))
+    except (IOError, ValueError, KeyError, TypeError):
+        t = None
+    _tables[fontName] = t
+    return t
+
+def _scaledFont(fontName, scale):
+    import cairo as cr
+    return cr.ScaledFont(cr.ToyFontFace(fontName), cr.Matrix(xx=scale, yy=scale),
+                         cr.Matrix(), cr.FontOptions())
+
+def buildTable(fontName):
+    "Measures fontName with cairo, returns a FontTable."
+    csf = _scaledFont(fontName, _referenceScale)
+    glyphs = dict()
+    for c in _chars:
+        xb, yb, w, h, xadv, yadv = csf.text_extents(c)
+        glyphs[c] = [xadv, xb, xb + w]
+    kerning = dict()
+    for a in _chars:
+        for b in _chars:
+            xadv = csf.text_extents(a + b)[4]
+            k = xadv - glyphs[a][0] - glyphs[b][0]
+            if abs(k) > 0.5:
+                kerning[a + b] = k
+    return FontTable(fontName, glyphs, kerning)
+
+def writeTable(fontName):
+    "Builds and saves the table for fontName.  Returns the file name."
+    t = buildTable(fontName)
+    fname = tableFileName(fontName)
+    with open(fname, 'w') as f:
+        json.dump(t.toDict(), f, sort_keys=True)
+    _tables[fontName] = t
+    return fname
+
+#
+# Accuracy benchmark: table widths against cairo.
+#
+_sampleStrings = ['GND', 'Vcc', 'VCC', 'Vdd', 'AGND', 'PB0', 'PB7', 'PC6',
+    'RESET', '~RESET', 'CLK', 'OE', 'D0', 'Q7', 'A15', 'SDA', 'SCL',
+    '(PCINT0/CLKO/ICP1) PB0', 'PC6 (-RESET/PCINT14)', 'ATMegaXX8-TQFP32',
+    'WiW', 'AVAVAV', 'llll', 'mmmm', 'To', 'Ty', 'Wa', 'r.', 'f)']
+
+def accuracyReport(fontName, sizes, strings, gschemScale):
+    """Compares table widths to cairo for every string at every font size.
+    Returns list of (size, max abs error, worst string) in gschem units."""
+    t = tableFor(fontName)
+    if t == None:
+        raise ValueError('No font table for ' + fontName)
+    report = []
+    for size in sizes:
+        scale = size * gschemScale
+        csf = _scaledFont(fontName, scale)
+        worst = (0, '')
+        for s in strings:
+            err = abs(int(csf.text_extents(s)[2]) - int(t.width(s, scale)))
+            if err > worst[0]:
+                worst = (err, s)
+        report.append((size, worst[0], worst[1]))
+    return report
+
+def benchmarkStrings(n = 2000, seed = 1):
+    "Sample pin names plus n reproducible random printable strings."
+    rnd = random.Random(seed)
+    l = list(_sampleStrings) + _chars
+    for i in xrange(n):
+        l.append(''.join([rnd.choice(_chars) for j in xrange(rnd.randint(1,30))]))
+    return l
+
+
+#############################################################################
+# Module quick-test #
+#####################
+if __name__ == '__main__':
+    # Accuracy benchmark: python ansisymFontTables.py [fontname]
+    # Widths must match cairo to within one grid unit.
+    import sys
+    import ansisymGSView as vw
+    fontName = sys.argv[1] if len(sys.argv) > 1 else 'Arial'
+    if tableFor(fontName) == None:
+        print 'Building table:', writeTable(fontName)
+    strings = benchmarkStrings()
+    bad = False
+    for size, err, s in accuracyReport(fontName, xrange(4,25), strings,
+                                       vw.FontInfo._gschemScalingConstant):
+        print '{0:s} {1:2d}pt: max error {2:3d} {3:s}'.format(fontName, size, err, repr(s))
+        bad |= err > vw._gridspacing
+    print 'FAIL' if bad else 'PASS'
+    sys.exit(1 if bad else 0)
@@ -51,6 +51,7 @@
 # Other classes:
 # Pt -- An extended namedtuple for points in the drawing plane.
 # Stroke -- A line definition.
+# StrokeArray -- Many strokes, packed into an array for rendering.
 # FontInfo -- Font measurement information for layout caluclations.
 # Layout -- Layout information.
 #
@@ -58,10 +59,19 @@
 # 1. GViewer classes can not be re-contructed from repr() output,
 #    since the parent object is not included in repr() output.
 
-from collections import namedtuple
-import cairo as cr
+from collections import namedtuple, OrderedDict
+from itertools import izip
+from functools import wraps, partial
+from operator import add
+from array import array
+import os
+import json
+import threading
 
+import ansisymErrorSink as er
 import ansisymModel as mdl
+import ansisymFontTables as ft
+from ansisymTrace import trace
 
 ##################
 # Configuration #
@@ -114,6 +124,7 @@ PointBase = namedtuple('PointBase', ['x', 'y'])
 
 class Pt(PointBase):
     "Drawing point."
+    __slots__ = ()
     def __repr__(self):
         s = self.__class__.__name__ + '('
         s += ','.join([repr(x) for x in [self.x, self.y]])
@@ -129,6 +140,7 @@ class Pt(PointBase):
 
 class Layout(object):
     "Layout position and size information."
+    __slots__ = ['x', 'y', 'w', 'h']
     def __init__(self, x=None, y=None, width=None, height=None):
         self.x = x
         self.y = y
@@ -159,6 +171,7 @@ class Layout(object):
 
 class Stroke(object):
     "A straight line of specified width and dash style."
+    __slots__ = ['p1', 'p2', 'w', 'dashControl']
     def __init__(self, p1, p2, width = _linewidth_for_art, dashed=None):
         assert p1.isValid
         assert p2.isValid
@@ -185,45 +198,322 @@ class Stroke(object):
         return 'L %4d %4d %4d %4d 3 %d 1 %d  %d %d' % \
                 (q1.x, q1.y, q2.x, q2.y, self.w, dstyle, dlen, dspc)
 
+class StrokeArray(object):
+    """Strokes packed into one flat array of ints, eight per stroke:
+    x1 y1 x2 y2 width dashstyle dashlength dashspace.  A block with
+    thousands of pins collects its strokes here instead of as Stroke
+    and Pt objects, moves them a column at a time, and renders all of
+    its L records with a single format operation."""
+    __slots__ = ['a']
+    _width = 8 # ints per stroke
+    _record = 'L %4d %4d %4d %4d 3 %d 1 %d  %d %d'
+    def __init__(self, values = ()):
+        self.a = array('l', values)
+    def __repr__(self):
+        return self.__class__.__name__ + '(' + repr(list(self)) + ')'
+    def __len__(self):
+        return len(self.a) // self._width
+    def __iter__(self):
+        "Generates the strokes as Stroke objects."
+        a = self.a
+        for i in xrange(0, len(a), self._width):
+            x1, y1, x2, y2, w, dstyle, dlen, dspc = a[i:i + self._width]
+            yield Stroke(Pt(x1,y1), Pt(x2,y2), w,
+                         None if dstyle == 0 else (dstyle, dlen, dspc))
+    def add(self, x1, y1, x2, y2, width = _linewidth_for_art, dashed = None):
+        "Adds a stroke from (x1,y1) to (x2,y2); dashed is as for Stroke."
+        self.a.extend((x1, y1, x2, y2, width) + ((0,-1,-1) if dashed == None else dashed))
+    def extend(self, strokes):
+        "Adds the strokes of another StrokeArray."
+        self.a.extend(strokes.a)
+    def _mapped(self, fx, fy):
+        "Returns a copy with fx applied to every x and fy to every y."
+        a = array('l', self.a)
+        for col, f in [(0, fx), (1, fy), (2, fx), (3, fy)]:
+            a[col::self._width] = array('l', map(f, a[col::self._width]))
+        return StrokeArray(a)
+    def displaced(self, dx, dy):
+        "Returns a copy moved by (dx, dy)."
+        return self._mapped(partial(add, dx), partial(add, dy))
+    def scaled(self, factor):
+        "Returns a copy with its end points scaled by factor, like Pt.scale()."
+        f = lambda v: int(v * factor)
+        return self._mapped(f, f)
+    def records(self):
+        "Returns the L records of all the strokes, as one newline separated string."
+        return '\n'.join([self._record] * len(self)) % tuple(self.a)
+
+def _strokeArray(lines):
+    "Returns a StrokeArray of art strokes from a list of (x1,y1, x2,y2)."
+    l = StrokeArray()
+    for x1, y1, x2, y2 in lines:
+        l.add(x1, y1, x2, y2)
+    return l
+
+def _renderStrokes(strokes):
+    "Returns the L records of StrokeArray strokes as a list of .sym lines."
+    return [strokes.records()] if strokes else []
+
+class RenderTemplate(object):
+    """A block rendered once for all its packages.  Runs of .sym lines that
+    are the same for every package alternate with holes: functions of the
+    package name returning the lines that differ, e.g. pinnumber=."""
+    __slots__ = ['_chunks', '_holes', '_lines', '_strokes']
+    def __init__(self):
+        self._chunks = [] # Static text before each hole, None if empty.
+        self._holes = []
+        self._lines = [] # Static lines since the last hole.
+        self._strokes = StrokeArray() # Strokes since the last lines or hole.
+    def extend(self, lines):
+        "Adds lines that are the same for every package."
+        if self._strokes.a:
+            self._flushStrokes()
+        self._lines.extend(lines)
+    def addStrokes(self, strokes):
+        """Adds a StrokeArray of strokes that are the same for every
+        package.  Each run of them is rendered in one go."""
+        self._strokes.extend(strokes)
+    def hole(self, fill):
+        "Adds a hole, filled in with fill(pkgName), a list of lines."
+        self._chunks.append(self._flush())
+        self._holes.append(fill)
+    def _flushStrokes(self):
+        if self._strokes.a:
+            self._lines.append(self._strokes.records())
+            self._strokes = StrokeArray()
+    def _flush(self):
+        self._flushStrokes()
+        s = '\n'.join(self._lines) if self._lines else None
+        self._lines = []
+        return s
+    def finish(self):
+        "Ends the template; call before fill()."
+        self._chunks.append(self._flush())
+        return self
+    def fill(self, pkgName):
+        "Generates the strings to print to a .sym file for package pkgName."
+        for chunk, fill in izip(self._chunks, self._holes):
+            if chunk != None:
+                yield chunk
+            for s in fill(pkgName):
+                yield s
+        if self._chunks[-1] != None:
+            yield self._chunks[-1]
+
+class TextWidthCache(object):
+    """Bounded LRU of measured string widths, keyed by (backend, fontname, size, string).
+    One instance, textWidths, is shared by every FontInfo in the process."""
+    _fileVersion = 2
+    def __init__(self, maxEntries = 65536):
+        self.maxEntries = maxEntries
+        self._widths = OrderedDict()
+        self._lock = threading.Lock()
+        self._new = None # List of (key, width) stored since takeNew(), if tracking.
+        self.hits = 0
+        self.misses = 0
+    def __len__(self):
+        return len(self._widths)
+    def lookup(self, key):
+        "Returns cached width, or None."
+        with self._lock:
+            try:
+                w = self._widths.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._widths[key] = w # Most recently used goes to the end.
+            self.hits += 1
+            return w
+    def store(self, key, width):
+        with self._lock:
+            self._widths[key] = width
+            if len(self._widths) > self.maxEntries:
+                self._widths.popitem(last=False)
+            if self._new != None:
+                self._new.append((key, width))
+    def trackNew(self):
+        "Start remembering new entries, so they can be collected with takeNew()."
+        self._new = []
+    def takeNew(self):
+        "Returns list of (key, width) stored since the last call."
+        with self._lock:
+            l = self._new if self._new != None else []
+            if self._new != None:
+                self._new = []
+            return l
+    def merge(self, entries):
+        for key, width in entries:
+            self.store(tuple(key), width)
+    def load(self, fname):
+        "Loads widths persisted by save().  Returns False if fname is unusable."
+        try:
+            with open(fname) as f:
+                d = json.load(f)
+            if d['version'] != self._fileVersion:
+                return False
+            for backend, name, size, text, width in d['widths']:
+                self.store((backend.encode('utf-8'), name.encode('utf-8'), size,
+                            text.encode('utf-8')), width)
+        except (IOError, ValueError, KeyError, TypeError):
+            return False
+        return True
+    def save(self, fname):
+        "Writes the cache to fname.  Returns False on failure."
+        with self._lock:
+            l = [[backend, name, size, text, width]
+                 for (backend, name, size, text), width in self._widths.items()]
+        try:
+            with open(fname, 'w') as f:
+                json.dump({'version':self._fileVersion, 'widths':l}, f)
+        except (IOError, UnicodeDecodeError):
+            return False
+        return True
+
+textWidths = TextWidthCache() # Process-wide string width LRU.
+
+# Optional on-disk copy of textWidths, kept next to the installed modules.
+textWidthsFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'fontwidths.cache')
+
+_scaledFonts = dict() # Cairo Scaled Fonts by (fontname, size), process-wide.
+
+# Text measurement backends:
+#   'table' -- precomputed per-character metrics, see ansisymFontTables.
+#   'cairo' -- ask pycairo.  pycairo is imported on first use only.
+#   'auto'  -- 'table' for fonts that have a table, 'cairo' otherwise.
+metricsBackends = ('auto', 'table', 'cairo')
+_metricsBackend = 'auto'
+
+def setMetricsBackend(name):
+    "Selects the text measurement backend for FontInfo instances made after this."
+    global _metricsBackend
+    if name not in metricsBackends:
+        raise ValueError(name)
+    _metricsBackend = name
+    _fontInfoCache.clear()
+
+cr = None # pycairo module, once imported.
+
+def _cairo():
+    "Imports pycairo on first use, so it is only needed when it measures text."
+    global cr
+    if cr == None:
+        import cairo
+        cr = cairo
+    return cr
+
 class FontInfo(object):
     "Captures just enough font info to do text measurement for layout."
     _gschemScalingConstant = 10000.0/555.0 # Magic number
-    def __init__(self, fontName, fontSize):
+    def __init__(self, fontName, fontSize, backend = None):
         self._name = fontName
         self._size = fontSize
-        self._csf = None # Cairo Scaled Font, cached.
+        self._scale = fontSize * self._gschemScalingConstant
+        self._table = None
+        backend = backend if backend != None else _metricsBackend
+        if backend != 'cairo':
+            self._table = ft.tableFor(fontName)
+            if self._table == None and backend == 'table':
+                er.ror.msg('p', ''.join(['No font table for ', fontName,
+                    ". Run 'ansisym --fonttable ", fontName, "'."]))
+        self._backend = 'table' if self._table != None else 'cairo'
     @property
     def name(self):
         return self._name
     @property
     def size(self):
         return self._size
+    @property
+    def backend(self):
+        return self._backend
     def measure(self, aString):
         "Returns the layout length of aString in gschem distance."
-        if self._csf == None:
-            self._build_csf()
-        width = self._csf.text_extents(aString)[2]
-        return int(width)
+        key = (self._backend, self._name, self._size, aString)
+        width = textWidths.lookup(key)
+        if width == None:
+            width = self._measure(aString)
+            textWidths.store(key, width)
+        return width
+    def measureMany(self, strings):
+        "Measures a batch of strings up front, so later measure() calls hit the cache."
+        todo = [s for s in set(strings)
+                if textWidths.lookup((self._backend, self._name, self._size, s)) == None]
+        if self._table != None:
+            widths = self._table.widths(todo, self._scale)
+            for s, w in zip(todo, widths):
+                key = (self._backend, self._name, self._size, s)
+                textWidths.store(key, int(w) if w != None else self._measure(s))
+        else:
+            for s in todo:
+                self.measure(s)
+    def _measure(self, aString):
+        if self._table != None:
+            w = self._table.width(aString, self._scale)
+            if w != None:
+                return int(w)
+            # Not all characters are in the table.  Ask cairo if we can.
+            try:
+                _cairo()
+            except ImportError:
+                return int(self._table.approxWidth(aString, self._scale))
+        return int(self._scaledFont().text_extents(aString)[2])
     def height(self, aString):
         "Returns the layout height of aString in gschem distance."
         raise NotImplementedError #FIXME: Complete this method and
                     # convert references to _letterHeight over to this.
+    def _scaledFont(self):
+        "Returns the shared Cairo Scaled Font, building it on first use."
+        key = (self._name, self._size)
+        csf = _scaledFonts.get(key)
+        if csf == None:
+            try:
+                csf = self._build_csf()
+            except ImportError:
+                er.ror.msg('p', ''.join(['pycairo not found, and no font table for ',
+                    self._name, ". Run 'ansisym --fonttable ", self._name,
+                    "' where pycairo is installed."]))
+            _scaledFonts[key] = csf
+        return csf
     def _build_csf(self):
-        "Builds and caches a Cairo Scaled Font."
+        "Builds a Cairo Scaled Font."
+        cr = _cairo()
         fontFace = cr.ToyFontFace(self.name)
         identityMatrix = cr.Matrix()
         fontOptions = cr.FontOptions() # get defaults
         scaling = self.size * self._gschemScalingConstant
         scalingMatrix = cr.Matrix(xx = scaling, yy = scaling)
-        self._csf = cr.ScaledFont(fontFace, scalingMatrix, 
+        return cr.ScaledFont(fontFace, scalingMatrix,
             identityMatrix, fontOptions)
 
+_fontInfoCache = dict() # FontInfo instances by (name, size), shared by all parts.
+
+def fontInfo(fontName, fontSize):
+    "Returns a shared FontInfo instance."
+    key = (fontName, fontSize)
+    try:
+        return _fontInfoCache[key]
+    except KeyError:
+        fi = FontInfo(fontName, fontSize)
+        _fontInfoCache[key] = fi
+        return fi
+
 ##########################
 # View object base class #
 ##########################
+
+# What a view needs to know about its surroundings, resolved once when
+# it is made instead of asked for up the parent chain on every use.
+# part, block and band are the enclosing GVPart, GVBlock and GVBand,
+# or None.  Every view in a band shares the band's context.  GVPart
+# makes new contexts for all its views if the font directives change.
+ViewContext = namedtuple('ViewContext',
+                         'part block band directives textFont pinFont')
+
 class GViewer(object):
+    __slots__ = ['parent', 'ctx']
     def __init__(self, aParent):
         self.parent = aParent
+        self.ctx = aParent.ctx if aParent != None else None
     def __repr__(self):
         s = self.__class__.__name__ + '('
         s += ','.join(repr(x) for x in self.reprvals())
@@ -237,35 +527,60 @@ class GViewer(object):
         # Override in classes that must specialize based on class
         # of aModelObject.
         return cls(aModelObject, self)
+    def setContext(self, ctx):
+        "Replaces the context of this view and the views it contains."
+        self.ctx = ctx
     @property
     def directives(self):
-        return self.parent.directives
+        return self.ctx.directives
     @property
     def textFont(self):
-        return self.parent.textFont
+        return self.ctx.textFont
     @property
     def pinFont(self):
-        return self.parent.pinFont
+        return self.ctx.pinFont
     @property
     def parentBlock(self):
-        return self.parent.parentBlock
+        return self.ctx.block
     @property
     def parentPart(self):
-        return self.parent.parentPart
+        return self.ctx.part.part
     @property 
     def parentBlockName(self):
-        return self.parent.parentBlockName
+        return self.ctx.block.parentBlockName
     @property
     def lineNo(self):
         "Returns associated source line number if possible, or None."
+        if self.ctx.band != None:
+            return self.ctx.band.lineNo
         return self.parent.lineNo
     
+def _cachedSize(slot):
+    """Decorator for minWidth() and minHeight() methods: the result is kept
+    in slot until the part's fonts change or GVPart.invalidate() is called."""
+    def decorate(method):
+        @wraps(method)
+        def cached(self):
+            gen = self.ctx.part.sizeGeneration
+            c = getattr(self, slot)
+            if c == None or c[0] != gen:
+                c = (gen, method(self))
+                setattr(self, slot, c)
+            return c[1]
+        return cached
+    return decorate
+
 ################################
 # View class for attributes #
 ################################
 class GVAttr(GViewer):
-    "View onto an attribute."
+    '''View onto an attribute.  A part's attribute views are shared by
+    all its blocks, each of which places them with render(loc).'''
+    __slots__ = ['attr', 'loc', 'align', 'size', 'col', 'vis', 'shownv', 'angle']
     show_name_val = {'n':2, 'v':1, 'nv':0}
+    # color size vis shownameval angle align, as set by setLayout() defaults.
+    _defaultLayout = (gEDAcolor['attribute'], 10, 0, show_name_val['nv'], 0,
+                      gEDAtextalign['ll'])
     def __init__(self, anAttr, aParent):
         super(GVAttr,self).__init__(aParent)
         self.attr = anAttr
@@ -281,13 +596,19 @@ class GVAttr(GViewer):
         self.vis = 1 if vistuple[0] else 0
         self.shownv = self.show_name_val[vistuple[1]]
         self.angle = angle
-    def render(self):
-        if self.attr.refBy(self.parent.parentBlockName):
+    def render(self, loc = None):
+        "Renders as set by setLayout(), or at loc with the default layout."
+        if loc != None:
+            col, size, vis, shownv, angle, align = self._defaultLayout
+        elif self.attr.refBy(self.parent.parentBlockName):
             return [] # It gets rendered as a RefGlyph
+        else:
+            loc = self.loc
+            col, size, vis, shownv, angle, align = (self.col, self.size,
+                self.vis, self.shownv, self.angle, self.align)
         # T x y color size vis shownameval angle align numlines
         l = ['T %d %d %d %d %d %d %d %d 1' % \
-             (self.loc.x, self.loc.y, self.col, self.size, self.vis,\
-              self.shownv, self.angle, self.align)]
+             (loc.x, loc.y, col, size, vis, shownv, angle, align)]
         l.append('%s=%s' % (self.attr.name, self.attr.value))
         return l
        
@@ -296,6 +617,7 @@ class GVAttr(GViewer):
 # View classes for all glyphic items. #
 #######################################
 class GVGlyph(GViewer):
+    __slots__ = ['glyph', 'lo']
     viewers = dict()
     def __init__(self, aGlyph, aParent):
         super(GVGlyph,self).__init__(aParent)
@@ -310,20 +632,24 @@ class GVGlyph(GViewer):
         return self.viewers[cn](aGlyph, aParent)
     @property
     def parentBand(self):
-        "Unwinds parent nesting up to containing band."
-        return self.parent.parentBand
+        "Containing band."
+        return self.ctx.band
     def layout(self, xCursor):
         raise NotImplementedError
     def strokes(self):
-        'Returns list of Stroke() objects.'
-        return []
+        'Returns a StrokeArray.'
+        return StrokeArray()
     def render(self, pkg):
         return []
+    def addRecords(self, t, pkgs):
+        "Adds the lines render() returns to RenderTemplate t."
+        t.extend(self.render(pkgs[0]))
     @property
     def width(self):
         raise NotImplementedError # Abstract
 
 class GVTextGlyphBase(GVGlyph):
+    __slots__ = []
     def reprvals(self):
         return [self.lo, self.glyph.text]
     @property
@@ -339,6 +665,7 @@ class GVTextGlyphBase(GVGlyph):
 
 class GVTextGlyph(GVTextGlyphBase):
     "View onto a simple text string."
+    __slots__ = []
     def _renderTRecord(self):
         # T x y color size vis shownameval angle align numlines
         if self.singleGlyph:
@@ -358,6 +685,7 @@ class GVTextGlyph(GVTextGlyphBase):
 
 class GVRefGlyph(GVTextGlyphBase):
     "View onto an attribute reference."
+    __slots__ = []
     def render(self, pkg):
         # T x y color size vis shownameval angle align numlines
         show = gEDAAttrShow['val']
@@ -373,6 +701,7 @@ class GVRefGlyph(GVTextGlyphBase):
         return l
 
 class GVPkgTextGlyph(GVTextGlyph):
+    __slots__ = []
     @property
     def width(self):
         return max([self.textFont.measure(pkgName) 
@@ -381,12 +710,19 @@ class GVPkgTextGlyph(GVTextGlyph):
         l = self._renderTRecord()
         l.append(pkgName)
         return l
+    def addRecords(self, t, pkgs):
+        t.extend(self._renderTRecord())
+        t.hole(_pkgNameLines)
+
+def _pkgNameLines(pkgName):
+    return [pkgName]
         
 class GVGraphicGlyph(GVGlyph):
+    __slots__ = []
     def reprvals(self):
         return [self.lo]
     def strokes(self):
-        return [s.displaced(self.lo.origin) for s in self._strokelist]
+        return self._strokelist.displaced(self.lo.x, self.lo.y)
     def layout(self, xCursor):
         plo = self.parent.lo # saves typing
         self.lo = Layout(xCursor,
@@ -394,8 +730,8 @@ class GVGraphicGlyph(GVGlyph):
                 self.width, self._height)
 
 class GVGraphicGlyphTri(GVGraphicGlyph):
-    _strokelist = [Stroke(Pt(0,190),Pt(120,190)), Stroke(Pt(120,190),Pt(60,10)),\
-                  Stroke(Pt(60,10),Pt(0,190))]
+    __slots__ = []
+    _strokelist = _strokeArray([(0,190, 120,190), (120,190, 60,10), (60,10, 0,190)])
     _base = 10
     _height = 180 
     @property
@@ -403,8 +739,8 @@ class GVGraphicGlyphTri(GVGraphicGlyph):
         return 120
 
 class GVGraphicGlyphDrv(GVGraphicGlyph):
-    _strokelist = [Stroke(Pt(0,10),Pt(120,100)), Stroke(Pt(0,190),Pt(120,100)),\
-                  Stroke(Pt(0,10),Pt(0,190))]
+    __slots__ = []
+    _strokelist = _strokeArray([(0,10, 120,100), (0,190, 120,100), (0,10, 0,190)])
     _base = 10
     _height = 180
     @property
@@ -412,8 +748,8 @@ class GVGraphicGlyphDrv(GVGraphicGlyph):
         return 120
 
 class GVGraphicGlyphGE(GVGraphicGlyph):
-    _strokelist = [Stroke(Pt(0,90),Pt(90,60)),Stroke(Pt(0,30),Pt(90,60)),\
-                  Stroke(Pt(0,10),Pt(90,10))]
+    __slots__ = []
+    _strokelist = _strokeArray([(0,90, 90,60), (0,30, 90,60), (0,10, 90,10)])
     _base = 10
     _height = 110 # basic size 90 tall. 
     @property
@@ -421,8 +757,9 @@ class GVGraphicGlyphGE(GVGraphicGlyph):
         return 90
 
 class GVGraphicGlyphTestbox(GVGraphicGlyph):
-    _strokelist = [Stroke(Pt(0,0),Pt(0,100)),Stroke(Pt(400,0),Pt(400,100)),\
-                  Stroke(Pt(0,0),Pt(400,100)),Stroke(Pt(0,100),Pt(400,0))]
+    __slots__ = []
+    _strokelist = _strokeArray([(0,0, 0,100), (400,0, 400,100), (0,0, 400,100),
+                                (0,100, 400,0)])
     _base = 0
     _height = 100 # basic size 90 tall. 
     @property
@@ -442,28 +779,27 @@ GVGlyph.viewers['GraphicGlyph-pkg'] = GVPkgTextGlyph
 # Tile view classes #
 #####################
 class GVTile(GViewer):
+    __slots__ = ['tile', 'placement', 'lo', '_minW', '_minH']
     viewers = dict()
     _validPlacement = 'lcr'
     def __init__(self, viewedModel, parent, aPlacement):
         super(GVTile,self).__init__(parent)
         self.tile = viewedModel
-        self.placement = aPlacement
+        assert isinstance(aPlacement,str) and len(aPlacement) == 1
+        if aPlacement not in self._validPlacement:
+            raise ValueError
+        self.placement = aPlacement # Fixed: read in every layout and render.
         self.lo = None # Compute a Layout() in layout() method.
+        self._minW = None # (size generation, width), see _cachedSize().
+        self._minH = None
     @classmethod
     def viewOf(self, aTile, aParent, placement):
+        if aTile == None:
+            return _noTiles[placement]
         cn = aTile.__class__.__name__
         view = self.viewers[cn](aTile, aParent, placement)
         return view
     @property
-    def placement(self):
-        return self._placement
-    @placement.setter
-    def placement(self, v):
-        assert isinstance(v,str) and len(v) == 1
-        if v not in self._validPlacement:
-            raise ValueError
-        self._placement = v
-    @property
     def parentBand(self):
         "Returns parent band view.  Intended for use by contained/nested GVGlyphs."
         return self.parent
@@ -475,19 +811,33 @@ class GVTile(GViewer):
         return 0
     def layout(self):
         pass
-    def assignPinseq(self,pinMap, pkgName, n):
+    def assignPinseq(self, pkgName, n):
         "Assigns pinseq numbers, starting with n, returning next usable value."
         return n # Handles tiles with no I/O pins.
     def strokes(self, pkg): 
-        return []
+        return StrokeArray()
     def render(self,pkg):
         return []
+    def addStrokes(self, t, pkgs):
+        "Adds strokes to RenderTemplate t; pkgs are the block's packages."
+        t.addStrokes(self.strokes(pkgs[0]))
+    def addRecords(self, t, pkgs):
+        "Adds the lines render() returns to RenderTemplate t."
+        t.extend(self.render(pkgs[0]))
     
 class GVNoTile(GVTile):
+    __slots__ = []
     def __init__(self, ignored, parent, placement):
         super(GVNoTile,self).__init__(None, parent, placement)
+    def setContext(self, ctx):
+        pass # Shared by all bands, and needs no context.
+
+# An empty tile has nothing to lay out or render, so every band shares
+# these instead of having views of its own.
+_noTiles = dict([(p, GVNoTile(None, None, p)) for p in 'lcr'])
 
 class GVPin(GVTile):
+    __slots__ = ['pinseq']
     nameIndent = 25
     clockArtWidth = 75 # FIXME: All this ArtWidth stuff should get re-factored
     schmittArtWidth = 100 # into a class for inside-the-box pin art.
@@ -502,16 +852,22 @@ class GVPin(GVTile):
         return [self.lo, self.tile]
     def minHeight(self):
         return 2*_gridspacing
+    @_cachedSize('_minW')
     def minWidth(self):
         t = self.pinFont.measure(self.tile.name) + self.nameIndent \
                 + self.artWidth
         return t
-    def assignPinseq(self, pinMap, pkgName, n):
+    def assignPinseq(self, pkgName, n):
         if self.tile.isShadowPin(pkgName):
             return n
         self.pinseq[pkgName] = n
-        pinMap[pkgName][n] = self.tile.pinListDict[pkgName]
         return n+1
+    def _shadowIn(self, pkgs):
+        "True if this is a shadow pin in any of pkgs."
+        for pkg in pkgs:
+            if self.tile.isShadowPin(pkg):
+                return True
+        return False
     def layout(self):
         plo = self.parent.lo
         y = plo.middleY
@@ -519,22 +875,20 @@ class GVPin(GVTile):
         self.lo = Layout(x, y, _pinlength, 0)
     def strokes(self, pkg):
         if self.tile.isShadowPin(pkg): 
-            return []
-        l = []
+            return StrokeArray()
+        l = StrokeArray()
+        flags = self.tile.flags
         # Inside the box pin art.
         # Note: Only one pin art at a time handled right now.  FIXME.
-        if '^' in self.tile.pinFlags:
-            l.extend(self._strokeClock())
-        elif '!st' in self.tile.pinFlags:
-            l.extend(self._strokeSchmitt())
-        elif '!tri' in self.tile.pinFlags:
-            l.extend(self._strokeTristate())
+        art = self._pinArt[flags & _pinArtFlags][1]
+        if art != None:
+            l.extend(art(self))
         # Outside the box pin decorations.
-        if '~' in self.tile.pinFlags:
+        if flags & _invertFlag:
             # Invert also handles bidirectional and "backwards" I/O
             l.extend(self._strokeInvert())
         else:
-            if '%' in self.tile.pinFlags:
+            if flags & _bidirFlag:
                 l.extend(self._strokeDirInOut())
             # FIXME: the in/out direction arrows are going to
             # be wonky for flipped symbols.  Create a directive
@@ -548,15 +902,13 @@ class GVPin(GVTile):
                     l.extend(self._strokeDirOut())
         return l
     def _strokeClock(self):
-        l = []
+        l = StrokeArray()
         x1 = self.lo.right if self.placement == 'l' else self.lo.x
         x2 = x1 + self.clockArtWidth * (1 if self.placement == 'l' else -1)
         y1 = self.lo.y - self.clockArtWidth
         y2 = self.lo.y + self.clockArtWidth
-        p1 = Pt(x1,y1)
-        p2 = Pt(x2,self.lo.y)
-        p3 = Pt(x1,y2)
-        l.extend([Stroke(p1,p2), Stroke(p2,p3)])    
+        l.add(x1, y1, x2, self.lo.y)
+        l.add(x2, self.lo.y, x1, y2)
         return l
     @property
     def _pinDir(self):
@@ -568,68 +920,63 @@ class GVPin(GVTile):
             return t
         return 'in' if t in frozenset(['clk','pas','pwr']) else 'out'
     def _strokeInvert(self):
-        l = []
+        l = StrokeArray()
         pd = self._pinDir
+        y = self.lo.y
         if pd == 'in':
             if self.placement == 'l':
-                p1 = Pt(self.lo.right - _invertLength, self.lo.y)
-                p2 = Pt(self.lo.right - _invertLength, self.lo.y + _invertHeight)
-                p3 = Pt(self.lo.right, self.lo.y)
+                x1 = self.lo.right - _invertLength
+                x3 = self.lo.right
             else:
-                p1 = Pt(self.lo.x + _invertLength, self.lo.y)
-                p2 = Pt(self.lo.x + _invertLength, self.lo.y + _invertHeight)
-                p3 = Pt(self.lo.x, self.lo.y)
-            l.append(Stroke(p1,p2))
-            l.append(Stroke(p2,p3))
+                x1 = self.lo.x + _invertLength
+                x3 = self.lo.x
+            l.add(x1, y, x1, y + _invertHeight)
+            l.add(x1, y + _invertHeight, x3, y)
         elif pd == 'out':
             if self.placement == 'r':
-                l.append(Stroke(Pt(self.lo.x, self.lo.y + _invertHeight),
-                            Pt(self.lo.x + _invertLength, self.lo.y)))
+                l.add(self.lo.x, y + _invertHeight, self.lo.x + _invertLength, y)
             else:
-                l.append(Stroke(Pt(self.lo.right, self.lo.y + _invertHeight),
-                            Pt(self.lo.x - _invertLength, self.lo.y)))
+                l.add(self.lo.right, y + _invertHeight, self.lo.x - _invertLength, y)
         else: # pd == 'io':
             style = self.directives['bidirstyle']
             if style == 0:
                 if self.placement == 'l':
-                    p1 = Pt(self.lo.right - _invertLength, self.lo.y)
-                    p2 = Pt(self.lo.right - _invertLength, self.lo.y + _invertHeight)
-                    p3 = Pt(self.lo.right, self.lo.y)
-                    p4 = Pt(self.lo.right, self.lo.y - _invertHeight)
+                    p1 = (self.lo.right - _invertLength, y)
+                    p2 = (self.lo.right - _invertLength, y + _invertHeight)
+                    p3 = (self.lo.right, y)
+                    p4 = (self.lo.right, y - _invertHeight)
                 else: # self.placement == 'r'
-                    p1 = Pt(self.lo.x + _invertLength, self.lo.y - _invertHeight)
-                    p2 = Pt(self.lo.x + _invertLength, self.lo.y)
-                    p3 = Pt(self.lo.x, self.lo.y + _invertHeight)
-                    p4 = Pt(self.lo.x, self.lo.y)
-                l.append(Stroke(p1,p2))
-                l.append(Stroke(p1,p4))
-                l.append(Stroke(p2,p3))
+                    p1 = (self.lo.x + _invertLength, y - _invertHeight)
+                    p2 = (self.lo.x + _invertLength, y)
+                    p3 = (self.lo.x, y + _invertHeight)
+                    p4 = (self.lo.x, y)
+                l.add(*(p1 + p2))
+                l.add(*(p1 + p4))
+                l.add(*(p2 + p3))
             else:
                 print 'FIXME: bidirstyle',style,'not handled in _strokeInvert.'
         return l
     def _strokeDirIn(self):
-        l = []
+        l = StrokeArray()
         if self.placement == 'r':
-            p1 = Pt(self.lo.middleX - backArroX, self.lo.y)
-            p2 = Pt(self.lo.middleX, self.lo.y + backArrowY)
-            p3 = Pt(self.lo.middleX, self.lo.y - backArrowY)            
-            l.append(Stroke(p1,p2))
-            l.append(Stroke(p1,p3))
+            x = self.lo.middleX
+            y = self.lo.y
+            l.add(x - self.backArrowX, y, x, y + self.backArrowY)
+            l.add(x - self.backArrowX, y, x, y - self.backArrowY)
         return l
     def _strokeDirOut(self):
-        l = []
+        l = StrokeArray()
         if self.placement == 'l':
-            p1 = Pt(self.lo.middleX, self.lo.y)
-            p2 = Pt(self.lo.middleX + backArrowX, self.lo.y + backArrowY)
-            p3 = Pt(self.lo.middleX + backArrowX, self.lo.y - backArrowY)            
-            l.append(Stroke(p1,p2))
-            l.append(Stroke(p1,p3))
+            x = self.lo.middleX
+            y = self.lo.y
+            l.add(x, y, x + self.backArrowX, y + self.backArrowY)
+            l.add(x, y, x + self.backArrowX, y - self.backArrowY)
         return l
     def _strokeDirInOut(self):
         style = self.directives['bidirstyle']
         if style == 0:
-            return [] # bidirstyle 0 is "do nothing" for high-active I/O
-        l = []
+            return StrokeArray() # bidirstyle 0 is "do nothing" for high-active I/O
+        l = StrokeArray()
         print 'FIXME: bidirstyle',style,'not handled in _strokeDirInOut'
         return l
     def _strokeSchmitt(self):
@@ -640,12 +987,12 @@ class GVPin(GVTile):
         x4 = x0 + 100
         bot = -50
         top = 50
-        o = Pt(self.lo.right, self.lo.top)
-        l = [Stroke(Pt(x1,bot), Pt(x3,bot)).displaced(o),
-             Stroke(Pt(x2,top), Pt(x4,top)).displaced(o),
-             Stroke(Pt(x2,bot), Pt(x2,top)).displaced(o),
-             Stroke(Pt(x3,bot), Pt(x3,top)).displaced(o)]
-        return l
+        l = StrokeArray()
+        l.add(x1, bot, x3, bot)
+        l.add(x2, top, x4, top)
+        l.add(x2, bot, x2, top)
+        l.add(x3, bot, x3, top)
+        return l.displaced(self.lo.right, self.lo.top)
     def _strokeTristate(self):
         s = 58
         x0 = self.lo.x if self.placement == 'l' else self.lo.x -2*s
@@ -654,23 +1001,14 @@ class GVPin(GVTile):
         x3 = x2 + s
         bot = -50
         top = 50
-        #o = Pt(self.lo.right, self.lo.top)
-        o = Pt(0,self.lo.top)
-        l = []
-        l.append(Stroke(Pt(x1,top), Pt(x3, top)).displaced(o)) #.displaced(o),
-        l.append(Stroke(Pt(x1,top), Pt(x2, bot)).displaced(o)) #.displaced(o),
-        l.append(Stroke(Pt(x3,top), Pt(x2, bot)).displaced(o)) #.displaced(o)]
-        return l
+        l = StrokeArray()
+        l.add(x1, top, x3, top)
+        l.add(x1, top, x2, bot)
+        l.add(x3, top, x2, bot)
+        return l.displaced(0, self.lo.top)
     @property
     def artWidth(self):
-        if '^' in self.tile.pinFlags:
-            return self.clockArtWidth
-        elif '!st' in self.tile.pinFlags:
-            return self.schmittArtWidth
-        elif '!tri' in self.tile.pinFlags:
-            return self.tristateArtWidth
-        else:
-            return 0
+        return self._pinArt[self.tile.flags & _pinArtFlags][0]
     @property
     def artOffset(self):
         sign = 1 if self.placement == 'l' else -1
@@ -698,13 +1036,13 @@ class GVPin(GVTile):
             y = piny + pinspy
             al = 0 if self.placement == 'r' else 6
             l.append('T %d %d 5 %d 1 1 0 %d 1' % (x, y, self.pinFont.size, al))
-            l.append('pinnumber=%d' % self.tile.pinListDict[pkg][0])
+            l.extend(self._pinnumberLines(pkg))
         elif name == 'pinseq':
             offset = pinseqoffset * (1 if self.placement == 'r' else -1)
             align = 1 if self.placement == 'r' else 7
             l.append('T %d %d 5 %d 0 0 0 %d 1' %
                 (pinx + offset, piny, self.textFont.size, align))
-            l.append('pinseq=%d' % self.pinseq[pkg])
+            l.extend(self._pinseqLines(pkg))
         elif name == 'pintype':
             if self.tile.pinType == None:
                 # set pin type from left/right context
@@ -719,16 +1057,20 @@ class GVPin(GVTile):
         else:
             assert False, 'Bad pin attribute name.'
         return l
+    def _pinnumberLines(self, pkg):
+        return ['pinnumber=%d' % self.tile.pinListDict[pkg][0]]
+    def _pinseqLines(self, pkg):
+        return ['pinseq=%d' % self.pinseq[pkg]]
+    def _ends(self):
+        "Returns (near x, far x): the box end and the outer end of the pin."
+        if self.placement == 'l':
+            return (self.lo.right, self.lo.x)
+        return (self.lo.x, self.lo.right)
     def render(self,pkg):
         if self.tile.isShadowPin(pkg): 
             return []
         l = []
-        if self.placement == 'l':
-            nearx = self.lo.right
-            farx = self.lo.x
-        else:
-            nearx = self.lo.x
-            farx = self.lo.right
+        nearx, farx = self._ends()
         y = self.lo.y
         # Pin format:
         # P x1 y1 x2 y2 color pintype whichend
@@ -740,8 +1082,55 @@ class GVPin(GVTile):
         l.extend(self.renderPinAttr('pintype', nearx, y, pkg))
         l.append('}')
         return l
+    def addStrokes(self, t, pkgs):
+        if self._shadowIn(pkgs):
+            t.hole(lambda pkg: _renderStrokes(self.strokes(pkg)))
+        else:
+            super(GVPin,self).addStrokes(t, pkgs)
+    def addRecords(self, t, pkgs):
+        "Adds the pin with holes for its pinnumber and pinseq values."
+        if self._shadowIn(pkgs):
+            t.hole(self.render)
+            return
+        pkg = pkgs[0]
+        nearx, farx = self._ends()
+        y = self.lo.y
+        t.extend(['P %d %d %d %d 1 0 0' % (farx, y, nearx, y), '{'])
+        t.extend(self.renderPinAttr('pinlabel', nearx, y, pkg))
+        t.extend(self.renderPinAttr('pinnumber', nearx, y, pkg)[:1])
+        t.hole(self._pinnumberLines)
+        t.extend(self.renderPinAttr('pinseq', nearx, y, pkg)[:1])
+        t.hole(self._pinseqLines)
+        t.extend(self.renderPinAttr('pintype', nearx, y, pkg))
+        t.extend(['}'])
+
+# Pin flags the view tests, as bits of PinTile.flags.
+_invertFlag = mdl.pinFlagBits['~']
+_bidirFlag = mdl.pinFlagBits['%']
+_pinArtFlags = mdl.pinFlagMask(['^', '!st', '!tri'])
+
+def _pinArtTable():
+    """Returns a dict of (art width, stroke method) for each combination
+    of pin art flags.  Clock art wins over Schmitt trigger, which wins
+    over tri-state."""
+    choices = [('^', GVPin.clockArtWidth, GVPin._strokeClock),
+               ('!st', GVPin.schmittArtWidth, GVPin._strokeSchmitt),
+               ('!tri', GVPin.tristateArtWidth, GVPin._strokeTristate)]
+    d = dict()
+    for n in xrange(1 << len(choices)):
+        flags = mdl.pinFlagMask([f for i, (f, w, m) in enumerate(choices)
+                                 if n & (1 << i)])
+        d[flags] = (0, None)
+        for f, w, m in choices:
+            if flags & mdl.pinFlagBits[f]:
+                d[flags] = (w, m)
+                break
+    return d
+
+GVPin._pinArt = _pinArtTable()
 
 class GVGlyphicTile(GVTile):
+    __slots__ = ['glyphviews']
     bufferspace = 50
     def __init__(self, viewedModel, parent, placement):
         super(GVGlyphicTile,self).__init__(viewedModel, parent, placement)
@@ -750,6 +1139,7 @@ class GVGlyphicTile(GVTile):
         return [self.lo, self.glyphviews]
     def minHeight(self):
         return 2*_gridspacing # FIXME: Allow for non-standard font heights.
+    @_cachedSize('_minW')
     def minWidth(self):
         t = reduce(lambda x,y:x+y, [g.width for g in self.glyphviews])
         t += (len(self.glyphviews)-1) * _letterspace
@@ -773,7 +1163,7 @@ class GVGlyphicTile(GVTile):
             g.layout(xCursor)
             xCursor = g.lo.right + _letterspace
     def strokes(self, pkg):
-        l = []
+        l = StrokeArray()
         for g in self.glyphviews:
             l.extend(g.strokes())
         return l
@@ -782,11 +1172,19 @@ class GVGlyphicTile(GVTile):
         for g in self.glyphviews:
             l.extend(g.render(pkg))
         return l
+    def addRecords(self, t, pkgs):
+        for g in self.glyphviews:
+            g.addRecords(t, pkgs)
+    def setContext(self, ctx):
+        self.ctx = ctx
+        for g in self.glyphviews:
+            g.setContext(ctx)
     @property
     def singleGlyph(self):
         return len(self.glyphviews) == 1
 
 class GVSpacerTile(GVTile):
+    __slots__ = []
     def minHeight(self):
         return self.tile.h
     def minWidth(self):
@@ -799,18 +1197,19 @@ class GVSpacerTile(GVTile):
         if self.directives['showspacers']:
             lineWidth = 5
             dashPen = (2,20,20)
-            p1 = Pt(self.lo.x, self.lo.y)
-            p2 = p1 + Pt(self.minWidth(),0)
-            p3 = p2 + Pt(0,self.minHeight())
-            p4 = p1 + Pt(0,self.minHeight())
-            l = [Stroke(p1, p2, lineWidth, dashPen),
-                 Stroke(p3, p4, lineWidth, dashPen)]
+            x1 = self.lo.x
+            x2 = x1 + self.minWidth()
+            y1 = self.lo.y
+            y2 = y1 + self.minHeight()
+            l = StrokeArray()
+            l.add(x1, y1, x2, y1, lineWidth, dashPen)
+            l.add(x2, y2, x1, y2, lineWidth, dashPen)
             if self.lo.x != self.parentBand.lo.x:
-                l.extend([Stroke(p2, p3, lineWidth, dashPen),
-                          Stroke(p4, p1, lineWidth, dashPen)])
+                l.add(x2, y1, x2, y2, lineWidth, dashPen)
+                l.add(x1, y2, x1, y1, lineWidth, dashPen)
             return l
         else:
-            return []
+            return StrokeArray()
 
 # Set up the tile viewers.
 GVTile.viewers['NoneType'] = GVNoTile
@@ -822,14 +1221,18 @@ GVTile.viewers['SpacerTile'] = GVSpacerTile
 # Band view classes #
 #####################
 class GVBand(GViewer):
+    __slots__ = ['band', 'lo', 'lview', 'cview', 'rview', 'index', '_minW', '_minH']
     viewers = dict()
     def __init__(self, viewedModel, parent):
+        super(GVBand,self).__init__(parent)
+        self.ctx = self.ctx._replace(band=self)
         self.band = viewedModel
-        self.parent = parent 
+        self._minW = None # (size generation, width), see _cachedSize().
+        self._minH = None
         self.lo = Layout()
-        self.lview = GVNoTile(None, self, 'l')
-        self.cview = GVNoTile(None, self, 'c')
-        self.rview = GVNoTile(None, self, 'r')
+        self.lview = _noTiles['l']
+        self.cview = _noTiles['c']
+        self.rview = _noTiles['r']
         self.index = None # Set by owning GVBlock() after creation.
     def reprvals(self):
         return [self.lo, self.lview, self.cview, self.rview]
@@ -854,10 +1257,10 @@ class GVBand(GViewer):
     def layout(self):
         for tv in [self.lview, self.cview, self.rview]:
             tv.layout()
-    def assignPinseq(self, pinMap, pkgName, n):
+    def assignPinseq(self, pkgName, n):
         return n
     def strokes(self, pkg):
-        return []
+        return StrokeArray()
     def render(self,pkg):
         return self.renderTiles(pkg)
     def renderTiles(self, pkg):
@@ -866,19 +1269,33 @@ class GVBand(GViewer):
         l.extend(self.cview.render(pkg))
         l.extend(self.rview.render(pkg))
         return l
+    def addStrokes(self, t, pkgs):
+        "Adds strokes to RenderTemplate t; pkgs are the block's packages."
+        t.addStrokes(self.strokes(pkgs[0]))
+    def addRecords(self, t, pkgs):
+        "Adds the lines render() returns to RenderTemplate t."
+        for tv in [self.lview, self.cview, self.rview]:
+            tv.addRecords(t, pkgs)
+    def setContext(self, ctx):
+        self.ctx = ctx._replace(band=self)
+        for tv in [self.lview, self.cview, self.rview]:
+            tv.setContext(self.ctx)
     @property
     def lineNo(self):
         n = self.band.lineNo
         return n if n != None else self.parent.lineNo
 
 class GVIOBand(GVBand):
+    __slots__ = []
     def __init__(self, viewedModel, parent):
         super(GVIOBand,self).__init__(viewedModel, parent)
         self.lview = GVTile.viewOf(self.band.ltile, self, 'l')
         self.cview = GVTile.viewOf(self.band.ctile, self, 'c')
         self.rview = GVTile.viewOf(self.band.rtile, self, 'r')
+    @_cachedSize('_minH')
     def minHeight(self):
         return max([x.minHeight() for x in [self.lview,self.cview,self.rview]])
+    @_cachedSize('_minW')
     def minWidth(self):
         ctrMin = self.cview.minWidth()
         if ctrMin > 0:
@@ -887,22 +1304,28 @@ class GVIOBand(GVBand):
         else:
             sp = self.lview.minWidth() + self.rview.minWidth() + _minwordspace
         return sp
-    def assignPinseq(self, pinMap, pkgName, n):
-        n = self.lview.assignPinseq(pinMap, pkgName, n)
-        n = self.rview.assignPinseq(pinMap, pkgName, n)
+    def assignPinseq(self, pkgName, n):
+        n = self.lview.assignPinseq(pkgName, n)
+        n = self.rview.assignPinseq(pkgName, n)
         return n
     def strokes(self, pkg):
         l = self.lview.strokes(pkg)
         l.extend(self.cview.strokes(pkg))
         l.extend(self.rview.strokes(pkg))
         return l
+    def addStrokes(self, t, pkgs):
+        for tv in [self.lview, self.cview, self.rview]:
+            tv.addStrokes(t, pkgs)
 
 class GVNeckBand(GVBand):
+    __slots__ = []
     def __init__(self, viewedModel, parent):
         super(GVNeckBand,self).__init__(viewedModel, parent)
         self.cview = GVTile.viewOf(self.band.ctile, self, 'c')
+    @_cachedSize('_minH')
     def minHeight(self):
         return self.cview.minHeight()
+    @_cachedSize('_minW')
     def minWidth(self):
         return self.cview.minWidth() + 2 * (_neckindent + _minwordspace)
     @property
@@ -915,6 +1338,7 @@ class GVNeckBand(GVBand):
         return self.lo.right - _neckindent
 
 class GVSepBand(GVBand):
+    __slots__ = []
     def __init__(self, viewedModel, parent):
         super(GVSepBand,self).__init__(viewedModel, parent)
     def minHeight(self):
@@ -923,29 +1347,40 @@ class GVSepBand(GVBand):
         return 0
     def strokes(self, pkg):
         yy = self.lo.y + (self.height/2 if self.band.wide else 0)
-        return [Stroke(Pt(self.lo.x, yy), Pt(self.lo.x + self.lo.w, yy))]
+        l = StrokeArray()
+        l.add(self.lo.x, yy, self.lo.x + self.lo.w, yy)
+        return l
 
 class GVTopBand(GVBand):
+    __slots__ = ['refdes']
     def __init__(self, viewedModel, parent):
         super(GVTopBand,self).__init__(viewedModel, parent)
         self.cview = GVTile.viewOf(self.band.ctile, self, 'c')
         self.refdes = self.parentPart.attrs['refdes']
+    @_cachedSize('_minH')
     def minHeight(self):
         return _gridspacing + self.cview.minHeight()
+    @_cachedSize('_minW')
     def minWidth(self):
         return _minwordspace + self.cview.minWidth()
     def strokes(self, pkg):
         return self.cview.strokes(pkg)
-    def render(self,pkg):
+    def renderRefdes(self):
         av = GVAttr(self.refdes,self)
         ax = self.lo.middleX
         ay = self.lo.top + _refdesOffset
         av.setLayout(Pt(ax,ay),'lm',10,'attribute',(True,'v'))
-        l = av.render()
+        return av.render()
+    def render(self,pkg):
+        l = self.renderRefdes()
         l.extend(self.renderTiles(pkg))
         return l
+    def addRecords(self, t, pkgs):
+        t.extend(self.renderRefdes())
+        super(GVTopBand,self).addRecords(t, pkgs)
 
 class GVBotBand(GVBand):
+    __slots__ = []
     def __init__(self, viewedModel, parent):
         super(GVBotBand,self).__init__(viewedModel,parent)
     def minWidth(self):
@@ -954,11 +1389,14 @@ class GVBotBand(GVBand):
         return 0 if isinstance(self.pred(),GVNeckBand) else _gridspacing
 
 class GVTextBand(GVBand):
+    __slots__ = []
     def __init__(self, viewedModel, parent):
         super(GVTextBand,self).__init__(viewedModel, parent)
         self.cview = GVTile.viewOf(self.band.ctile, self, 'c')
+    @_cachedSize('_minW')
     def minWidth(self):
         return self.cview.minWidth() + 2 * _minwordspace
+    @_cachedSize('_minH')
     def minHeight(self):
         return max([self.cview.minHeight(),2*_gridspacing])
     @property
@@ -977,21 +1415,24 @@ GVBand.viewers['TextBand'] = GVTextBand
 # Block view #
 ##############
 class GVBlock(GViewer):
+    __slots__ = ['block', 'bandViews', 'attrViews', 'attrLocs', 'lo', 'numPins',
+                 '_template', '_minW']
     viewers = dict()
     def __init__(self, viewedModel, parent):
+        super(GVBlock,self).__init__(parent)
+        self.ctx = self.ctx._replace(block=self)
         self.block = viewedModel
-        self.parent = parent
+        self._minW = None # (size generation, width), see _cachedSize().
         self.bandViews = [GVBand.viewOf(b,self) for b in self.block.bands]
         self._setBandIndices() # Set up the bandView indices for succ() and pred()
         # Blocks inherit most attributes from parent part.
         # refdes gets special handling in the GVTopband.
-        self.attrViews = [GVAttr(x,self) \
-                          for x in self.parent.part.attrs.values() \
-                          if x.name != 'refdes']
+        self.attrViews = list(self.parent.attrViews)
+        self.attrLocs = dict() # Location of each GVAttr in attrViews.
         # Initialize some view properties.
         self.lo = Layout(_pinlength, 0) # Set lower-left corner of block.
-        self.pinMap = self._initialPinMap()
         self.numPins = dict() # dict[pkgName] of pin count of this block
+        self._template = None # RenderTemplate, made on first render().
     def reprvals(self):
         return [self.block, self.parent, self.bandViews]
     @classmethod
@@ -999,13 +1440,6 @@ class GVBlock(GViewer):
         cn = aBlock.__class__.__name__
         view = self.viewers[cn](aBlock, aParent)
         return view
-    def _initialPinMap(self):
-        "Initialize empty pinMap"
-        # Pin map is: dict[pkgName] of dict[pinSeq] of pinNumList.
-        d = dict()
-        for pkg in self.block.pkgSet():
-            d[pkg] = dict()
-        return d
         l = self.bandViews
         return l
     @property
@@ -1015,11 +1449,15 @@ class GVBlock(GViewer):
     def pkgSet(self):
         return self.block.pkgSet()
     @property
-    def parentBlock(self):
-        return self
-    @property
     def parentBlockName(self):
         return self.block.referenceBlockName
+    def setContext(self, ctx):
+        self.ctx = ctx._replace(block=self)
+        for av in self.attrViews:
+            if av.parent is self:
+                av.setContext(self.ctx)
+        for b in self.bandViews:
+            b.setContext(self.ctx)
     def packageNameOf(self, blockId):
         for pkg, blk in self.block.pkgs:
             if blockId == blk:
@@ -1051,9 +1489,11 @@ class GVBlock(GViewer):
     def setBandXCoords(self):
         for b in self.bandViews:
             b.lo.x = self.lo.x
+    @_cachedSize('_minW')
     def minWidth(self):
         return max([b.minWidth() for b in self.bandViews])
     def layout(self, minWidthSpec=None):
+        self._template = None
         self.setBandXCoords()
         wl = [gridUp(self.minWidth())]
         if minWidthSpec != None:
@@ -1065,27 +1505,26 @@ class GVBlock(GViewer):
         for b in self.bandViews:
             b.layout()
     def layoutAttrs(self):
+        self._template = None
         step = 2 * _gridspacing
         cur_y = self.lo.top + step
         x = self.lo.right
         al = [a for a in self.attrViews if not a.attr.refBy(self.parentBlockName)] 
         al.reverse()
         for av in al:
-            av.setLayout(Pt(x,cur_y))
+            self.attrLocs[av] = Pt(x,cur_y)
             cur_y += step
     # Pin Sequence and slotting
     def assignPinseq(self):
+        index = self.parent.part.pinIndex
         for pkg in self.block.pkgSet():
             n = 1
             for b in self.bandViews:
-                n = b.assignPinseq(self.pinMap, pkg, n)
-            self.numPins[pkg] = n-1
+                n = b.assignPinseq(pkg, n)
+            self.numPins[pkg] = index.pinCount(self.block, pkg)
     def slotPins(self, aPkg, aSlot):
         "Returns list of pins for aSlot in pinseq order."
-        l = []
-        for i in range(0,self.numPins[aPkg]):
-            l.append(self.pinMap[aPkg][i+1][aSlot-1])
-        return l
+        return self.parent.part.pinIndex.slotPins(self.block, aPkg, aSlot)
     def addSlotAttrs(self):
         "Creates numslots=# and slotdef=#:#,#,...  attributes if needed."
         # Slotting and shadow pins don't work together, so it is sufficient to
@@ -1105,7 +1544,7 @@ class GVBlock(GViewer):
         self.attrViews.append(GVAttr(a,self))
     # Rendering
     def strokes(self, pkg):
-        'Return list of all strokes in the block.'
+        'Return StrokeArray of all strokes in the block.'
         l = self.outlineStrokes()
         l.extend(self.bandStrokes(pkg))
         return l
@@ -1116,57 +1555,38 @@ class GVBlock(GViewer):
                 return (b,'bottom' if isinstance(b.succ(), GVBotBand) else 'middle')
         return (None, None)
     def outlineStrokes(self):
-        'Return list of box outline strokes.'
-        l = [] # Stroke accumulator
+        'Return StrokeArray of box outline strokes.'
+        l = StrokeArray() # Stroke accumulator
         lo = self.lo # Local dereference for readability.
         lwb = _linewidth_for_box # saves typing...
         # Top of box.
-        l.append(Stroke(Pt(lo.x,lo.top),Pt(lo.right,lo.top),lwb))
+        l.add(lo.x,lo.top, lo.right,lo.top, lwb)
         # The rest of the box shape depends on neck placement.
         neckBand, neckPlace = self.findNeck()
         if neckPlace == None:
             # Square box.
-            l.append(Stroke(Pt(lo.x,lo.y),Pt(lo.x, lo.top),lwb)) # Left
-            l.append(Stroke(Pt(lo.x,lo.y),Pt(lo.right,lo.y),lwb)) # Bottom
-            l.append(Stroke(Pt(lo.right,lo.y),Pt(lo.right,lo.top),lwb)) # Right
+            l.add(lo.x,lo.y, lo.x,lo.top, lwb) # Left
+            l.add(lo.x,lo.y, lo.right,lo.y, lwb) # Bottom
+            l.add(lo.right,lo.y, lo.right,lo.top, lwb) # Right
             return l
         # Top part of block and neck indentation.
-        l.append(Stroke(
-                 Pt(lo.x, lo.top),
-                 Pt(lo.x, neckBand.lo.top), lwb)) # Top left side
-        l.append(Stroke(
-                 Pt(lo.right, lo.top),
-                 Pt(lo.right, neckBand.lo.top), lwb)) # Top right side
-        l.append(Stroke(
-                 Pt(lo.x, neckBand.lo.top),
-                 Pt(neckBand.lindent, neckBand.lo.top),lwb)) # Left neck horizontal
-        l.append(Stroke(
-                 Pt(lo.right, neckBand.lo.top),
-                 Pt(neckBand.rindent, neckBand.lo.top), lwb)) # Right neck horizontal
-        l.append(Stroke(Pt(neckBand.lindent, neckBand.lo.top),
-                 Pt(neckBand.lindent, neckBand.lo.y), lwb)) # Left neck vertical
-        l.append(Stroke(Pt(neckBand.rindent, neckBand.lo.top),
-                 Pt(neckBand.rindent, neckBand.lo.y), lwb)) # Right neck vertical
+        nlo = neckBand.lo
+        l.add(lo.x, lo.top, lo.x, nlo.top, lwb) # Top left side
+        l.add(lo.right, lo.top, lo.right, nlo.top, lwb) # Top right side
+        l.add(lo.x, nlo.top, neckBand.lindent, nlo.top, lwb) # Left neck horizontal
+        l.add(lo.right, nlo.top, neckBand.rindent, nlo.top, lwb) # Right neck horizontal
+        l.add(neckBand.lindent, nlo.top, neckBand.lindent, nlo.y, lwb) # Left neck vertical
+        l.add(neckBand.rindent, nlo.top, neckBand.rindent, nlo.y, lwb) # Right neck vertical
         if neckPlace == 'middle':
-            l.append(Stroke(
-                     Pt(lo.x, neckBand.lo.y),
-                     Pt(lo.right, neckBand.lo.y), lwb)) # Neck separator stroke
-            l.append(Stroke(
-                     Pt(lo.x, lo.y),
-                     Pt(lo.x, neckBand.lo.y), lwb)) # Box bottom left side
-            l.append(Stroke(
-                     Pt(lo.right, lo.y),
-                     Pt(lo.right, neckBand.lo.y), lwb)) # Box bottom right side
-            l.append(Stroke(
-                     Pt(lo.x, lo.y), 
-                     Pt(lo.right, lo.y), lwb)) # Box bottom horizontal stroke
+            l.add(lo.x, nlo.y, lo.right, nlo.y, lwb) # Neck separator stroke
+            l.add(lo.x, lo.y, lo.x, nlo.y, lwb) # Box bottom left side
+            l.add(lo.right, lo.y, lo.right, nlo.y, lwb) # Box bottom right side
+            l.add(lo.x, lo.y, lo.right, lo.y, lwb) # Box bottom horizontal stroke
         else: # neckPlace == 'bottom':
-            l.append(Stroke(
-                     Pt(neckBand.lindent, lo.y),
-                     Pt(neckBand.rindent, lo.y), lwb)) # Bottom horizontal stroke
+            l.add(neckBand.lindent, lo.y, neckBand.rindent, lo.y, lwb) # Bottom horizontal stroke
         return l
     def bandStrokes(self, pkg):
-        l = []
+        l = StrokeArray()
         for b in self.bandViews:
             l.extend(b.strokes(pkg))
         return l
@@ -1177,19 +1597,41 @@ class GVBlock(GViewer):
         for b in self.bandViews:
             l.extend(b.render(pkg))
         return l
-    def render(self, pkg):
-        'Return a list of strings to print to a .sym file.'
-        l = [_fileversion]
-        l.extend([s.render(Pt(0,0)) for s in self.strokes(pkg)])
+    def renderAttrs(self):
+        l = []
         for av in self.attrViews:
-            l.extend(av.render())
-        l.extend(self.renderBands(pkg))
+            loc = self.attrLocs.get(av)
+            if loc != None:
+                l.extend(av.render(loc))
         return l
+    def renderTemplate(self):
+        '''Returns the RenderTemplate all packages of the block are
+        rendered from, making it on the first call after layout.'''
+        if self._template == None:
+            with trace.span('template'):
+                pkgs = list(self.pkgSet)
+                t = RenderTemplate()
+                t.extend([_fileversion])
+                t.addStrokes(self.outlineStrokes())
+                for b in self.bandViews:
+                    b.addStrokes(t, pkgs)
+                t.extend(self.renderAttrs())
+                for b in self.bandViews:
+                    b.addRecords(t, pkgs)
+                self._template = t.finish()
+        return self._template
+    def render(self, pkg):
+        'Generates the strings of the .sym file, to join with newlines.'
+        t = self.renderTemplate()
+        with trace.span('render', package=pkg):
+            for s in t.fill(pkg):
+                yield s
     @property
     def lineNo(self):
         return self.block.lineNo
 
 class GVUnusedBlock(GVBlock):
+    __slots__ = []
     def layout(self, minw):
         pass
     def layoutAttrs(self):
@@ -1204,57 +1646,103 @@ GVBlock.viewers['UnusedBlock'] = GVUnusedBlock
 # Part view #
 #############
 class GVPart(GViewer):
-    def __init__(self, aPart):
-        "View of a Part model."
+    __slots__ = ['part', 'attrViews', 'blockViews',
+                 '_fonts', '_directivesSeen', '_sizeGeneration', '_measured']
+    def __init__(self, aPart, blockIds = None):
+        """View of a Part model.  If blockIds is given, only blocks with
+        one of those ids get views, and are laid out and rendered."""
         super(GVPart,self).__init__(None)
         self.part = aPart
-        self.blockViews = [GVBlock.viewOf(b,self) for b in self.part.blocks]
-        self._textFont = None # gets cached on first call
-        self._pinFont = None # gets cached on first call
+        self._fonts = None # (fontname, textfontsize, pinfontsize) in use.
+        self._directivesSeen = aPart.directives.generation
+        self._sizeGeneration = 0
+        self.ctx = self._makeContext()
+        self._measured = None # Size generation measureText() last ran for.
+        # Views of the part's attributes, shared by all the blocks.
+        self.attrViews = [GVAttr(x,self) for x in self.part.attrs.values()
+                          if x.name != 'refdes']
+        self.blockViews = [GVBlock.viewOf(b,self) for b in self.part.blocks
+                           if blockIds == None or b.blockNameSet() & blockIds]
     def reprvals(self):
         return self.blockViews
-    @property
-    def directives(self):
-        "Reference directives dictionary in viewed mdl.Part() instance."
-        return self.part.directives
+    def _makeContext(self):
+        d = self.part.directives
+        self._fonts = (d['fontname'], d['textfontsize'], d['pinfontsize'])
+        return ViewContext(self, None, None, d,
+                           fontInfo(d['fontname'], d['textfontsize']),
+                           fontInfo(d['fontname'], d['pinfontsize']))
+    def setContext(self, ctx):
+        self.ctx = ctx
+        for av in self.attrViews:
+            av.setContext(ctx)
+        for b in self.blockViews:
+            b.setContext(ctx)
     @property
     def parentPart(self):
         return self.part
     @property
-    def textFont(self):
-        "Returns instance of FontInfo."
-        if self._textFont == None:
-            name = self.part.directives['fontname']
-            size = self.part.directives['textfontsize']
-            self._textFont = FontInfo(name, size)
-        return self._textFont 
-    @property
-    def pinFont(self):
-        "Returns instance of FontInfo."
-        if self._pinFont == None:
-            name = self.part.directives['fontname']
-            size = self.part.directives['pinfontsize']
-            self._pinFont = FontInfo(name, size)
-        return self._pinFont
+    def sizeGeneration(self):
+        """Changes whenever minimum sizes cached by the views may be stale:
+        when a font directive changes, or invalidate() is called.  New
+        fonts are handed to every view in a new context."""
+        d = self.part.directives
+        if d.generation != self._directivesSeen:
+            self._directivesSeen = d.generation
+            if (d['fontname'], d['textfontsize'], d['pinfontsize']) != self._fonts:
+                self.setContext(self._makeContext())
+                self._sizeGeneration += 1
+        return self._sizeGeneration
+    def invalidate(self):
+        """Drops the cached minimum sizes.  Must be called after editing
+        tiles or glyphs of the viewed model in place, before laying it out
+        again; the model doesn't tell its views it has changed.  Adding or
+        replacing bands or tiles needs a new GVPart."""
+        self._sizeGeneration += 1
+    def measureText(self):
+        "Measures all pin names and text glyphs of the part as one batch."
+        pinNames = []
+        texts = list(self.part.pkgSet())
+        for b in self.blockViews:
+            for bv in b.bandViews:
+                for tv in [bv.lview, bv.cview, bv.rview]:
+                    if isinstance(tv, GVPin):
+                        pinNames.append(tv.tile.name)
+                    elif isinstance(tv, GVGlyphicTile):
+                        texts.extend([g.glyph.text for g in tv.glyphviews
+                                      if isinstance(g, GVTextGlyphBase)
+                                      and not isinstance(g, GVPkgTextGlyph)])
+        self.pinFont.measureMany(pinNames)
+        self.textFont.measureMany(texts)
     def layoutAll(self):
         'Lays out the part.'
-        # Set height of all bands and blocks.
-        for b in self.blockViews:
-            b.setBandHeights()
-        # Set Y coordinate of all bands in each band.
-        for b in self.blockViews:
-            b.setBandYCoords()
-        # Set widths of all bands and blocks.
-        widths = [self.directives['minwidth']]
-        if self.directives['samewidth']:
-            widths.extend([b.minWidth() for b in self.blockViews])
-        minw = gridUp(max(widths))
-        if minw == 0:
-            minw = None
-        # Perform detail layout.
-        for b in self.blockViews:
-            b.layout(minw)
-            b.layoutAttrs()
+        with trace.span('layout'):
+            if self._measured != self.sizeGeneration:
+                with trace.span('measureText'):
+                    self.measureText()
+                self._measured = self.sizeGeneration
+            # Set height of all bands and blocks.
+            for b in self.blockViews:
+                b.setBandHeights()
+            # Set Y coordinate of all bands in each band.
+            for b in self.blockViews:
+                b.setBandYCoords()
+            # Set widths of all bands and blocks.
+            widths = [self.directives['minwidth']]
+            if self.directives['samewidth']:
+                widths.extend([b.minWidth() for b in self.blockViews])
+                widths.extend(self._otherBlockWidths())
+            minw = gridUp(max(widths))
+            if minw == 0:
+                minw = None
+            # Perform detail layout.
+            for b in self.blockViews:
+                b.layout(minw)
+                b.layoutAttrs()
+    def _otherBlockWidths(self):
+        "Minimum widths of the blocks left out of blockViews."
+        viewed = set([b.block for b in self.blockViews])
+        return [GVBlock.viewOf(b,self).minWidth() for b in self.part.blocks
+                if b not in viewed and b.blockNameSet()]
     def assignPinseqAll(self):
         for b in self.blockViews:
             b.assignPinseq()
@@ -1267,9 +1755,37 @@ class GVPart(GViewer):
                 return b
         return None
     def render(self, blockId):
+        "Generates the strings of the .sym file for blockId, to join with newlines."
         blk = self.blockViewing(blockId)
         pkg = blk.packageNameOf(blockId)
         return blk.render(pkg)
 
         
 #######################
+
+
+#############################################################################
+# Module quick-test #
+#####################
+if __name__ == '__main__':
+
+    # Sizes are cached, so editing the model under a view needs an
+    # invalidate() before layout sees the edit.
+    import ansisymParser
+    test = '''
+A device "74HC04"
+A refdes U?
+BK 74HC04-1
+T &ge&1
+IO A 1;;Y 2
+'''
+    part = ansisymParser.parse(test, [['distlicense','unlimited']])
+    view = GVPart(part)
+    view.layoutAll()
+    before = view.blockViews[0].lo.w
+    part.blocks[0].bands[1].ltile.name = 'A_MUCH_LONGER_PIN_NAME'
+    view.invalidate()
+    view.layoutAll()
+    after = view.blockViews[0].lo.w
+    print 'width before edit', before, 'after edit', after
+    assert after > before
@@ -47,9 +47,11 @@ information for creating an ANSI-compliant graphic."""
 # defaultdict
 #   DirectiveDict
 
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 import re
+import json
 import ansisymErrorSink as er
+from ansisymTrace import trace
 
 # Attribute names expected in a valid part.
 _requiredAttrs = ['refdes','device']
@@ -79,16 +81,25 @@ class DirectiveDict(defaultdict):
     def isValid(self, directiveName):
         "Returns true if directiveName is valid."
         return directiveName in self.directiveDefaults
+    def settings(self):
+        "Sorted list of (name, value) of every directive, set or not."
+        return sorted([(k, self[k]) for k in self.directiveDefaults])
+    generation = 0 # Counts changes, so views can tell if theirs is stale.
     def __setitem__(self, key, value):
         typer = self.directiveDefaults[key][0]
         val = typer(value)
         super(DirectiveDict,self).__setitem__(key, val)
+        self.generation += 1
+    def __delitem__(self, key):
+        super(DirectiveDict,self).__delitem__(key)
+        self.generation += 1
 
 #
 # Base class for most models
 #
 class ModelObject(object):
     "Base class for ansisym model classes."
+    __slots__ = ['_lineNo']
     def __repr__(self):
         s = self.__class__.__name__ + '('
         s += ','.join([repr(x) for x in self.reprvals()])
@@ -116,6 +127,7 @@ class ModelObject(object):
 # Tile classes.
 #
 class Tile(ModelObject):
+    __slots__ = []
     @property
     def numSlots(self):
         "Returns number of slots, or 0 if non-slotted.  -1 indicates slotting error."
@@ -127,32 +139,72 @@ class Tile(ModelObject):
     def pinsUsed(self, pkg = None):
         return set()
 
+#
+# Pin flags.
+#
+# A pin's flags are kept as a bitmask, so validating and drawing a pin
+# takes a few integer operations instead of set lookups.  The flags
+# that imply a pin type come first, in the order pinType gives them
+# precedence, so the lowest type flag set picks the type.
+pinFlagNames = ['^', '!tri', '!trin', '%', '!pas', '!tp', '!oc', '!oe',
+                '!in', '!out', '!pwr', '~', '!st']
+pinFlagBits = dict([(f, 1 << i) for i, f in enumerate(pinFlagNames)])
+
+def pinFlagMask(flags):
+    "Returns the bitmask of the pin flag names in flags."
+    m = 0
+    for f in flags:
+        try:
+            m |= pinFlagBits[f]
+        except KeyError:
+            raise ValueError('Unknown pin flag: ' + str(f))
+    return m
+
 class PinTile(Tile):
-    _validPinTypes = frozenset(['^', '~', '!tri','!trin','%','!pas','!tp',
-                                '!oc','!oe','!in','!out','!pwr','!st'])
-    _mutexPinTypes = frozenset(['!tri','!pas','!tp','!oc','!oe','!pwr'])
-    _conflictPinTypes = {
-        '!st':frozenset(['!out','!pwr']),
-        '^':frozenset(['!out','!pwr']),
-        '%':frozenset(['!in', '!out','!pwr']),
-    }
+    __slots__ = ['name', 'flags', 'pinListDict', '_pinType']
+    _validPinTypes = frozenset(pinFlagNames)
+    _allFlags = (1 << len(pinFlagNames)) - 1
+    _pinTypeOfFlag = dict([(pinFlagBits[f], t) for f, t in [
+        ('^','clk'), ('!tri','tri'), ('!trin','tri'), ('%','io'), ('!pas','pas'),
+        ('!tp','tp'), ('!oc','oc'), ('!oe','oe'), ('!in','in'), ('!out','out'),
+        ('!pwr','pwr')]])
+    _typeFlags = sum(_pinTypeOfFlag.keys())
+    _mutexFlags = pinFlagMask(['!tri','!pas','!tp','!oc','!oe','!pwr'])
+    # (flag, flags it can't be used with)
+    _conflictFlags = [
+        (pinFlagBits['!st'], pinFlagMask(['!out','!pwr'])),
+        (pinFlagBits['^'], pinFlagMask(['!out','!pwr'])),
+        (pinFlagBits['%'], pinFlagMask(['!in', '!out','!pwr'])),
+    ]
     _powerAlias = frozenset(['vcc','gnd','vss','vdd']) # List of pin names interpreted as a power pin.
-    def __init__(self, aName, aPinFlagSet, aPackagePinListDict, aPinType=None):
-        self.name = aName
-        if not aPinFlagSet <= self._validPinTypes:
+    _flagSets = dict() # Flag name sets by bitmask, for pinFlags.
+    def __init__(self, aName, aPinFlags, aPackagePinListDict, aPinType=None):
+        "aPinFlags is a bitmask of pin flags, see pinFlagMask()."
+        # Names like GND repeat endlessly in big parts, so identical
+        # ones are shared.
+        self.name = intern(aName) if type(aName) == str else aName
+        if aPinFlags & ~self._allFlags:
             raise ValueError
-        self.pinFlags = aPinFlagSet
+        self.flags = aPinFlags
         self.pinListDict = aPackagePinListDict
         self._pinType = aPinType
     def reprvals(self):
         l = [self.name, self.pinFlags, self.pinListDict]
         if self._pinType != None:
-            l.append(self_pintype)
+            l.append(self._pinType)
         return l
     @classmethod
     def isValidPinType(cls, pinFlag):
         return pinFlag in cls._validPinTypes
     @property
+    def pinFlags(self):
+        "The set of pin flag names."
+        try:
+            return self._flagSets[self.flags]
+        except KeyError:
+            s = frozenset([f for f in pinFlagNames if self.flags & pinFlagBits[f]])
+            return self._flagSets.setdefault(self.flags, s)
+    @property
     def anonymous(self):
         return self.name == ''
     @property
@@ -168,34 +220,10 @@ class PinTile(Tile):
     def pinType(self):
         if self._pinType == None:
             # Set/guess a pin type from pin flags or pin name and cache it.
-            if '^' in self.pinFlags:
-                # clock
-                self._pinType = 'clk'
-            elif '!tri' in self.pinFlags or '!trin' in self.pinFlags:
-                # Tri-state
-                self._pinType = 'tri'
-            elif '%' in self.pinFlags:
-                # bi-directional
-                self._pinType = 'io'
-            elif '!pas' in self.pinFlags:
-                # Passive
-                self._pinType = 'pas'
-            elif '!tp' in self.pinFlags:
-                # totem pole
-                self._pinType = 'tp'
-            elif '!oc' in self.pinFlags:
-                # open collector
-                self._pinType = 'oc'
-            elif '!oe' in self.pinFlags:
-                # open emitter
-                self._pinType = 'oe'
-            elif '!in' in self.pinFlags:
-                # in
-                self._pinType = 'in'
-            elif '!out' in self.pinFlags:
-                # out
-                self._pinType = 'out'
-            elif '!pwr' in self.pinFlags or self.isPowerAlias:
+            t = self.flags & self._typeFlags
+            if t:
+                self._pinType = self._pinTypeOfFlag[t & -t]
+            elif self.isPowerAlias:
                 # Power pin
                 self._pinType = 'pwr'
             # Just leave it at None if can't guess.
@@ -221,20 +249,24 @@ class PinTile(Tile):
             for l in self.pinListDict.values():
                 if 0 in l:
                     er.ror.msg('f',
-                        'Shadow pins not allowed in slots. Line: ' + str(self.lineNo))
+                        'Shadow pins not allowed in slots. Line: ' + str(self.lineNo),
+                        self.lineNo)
                     valid = False
         else:
             valid = False
-            er.ror.msg('f','Package slot counts differ. Line: ' + str(self.lineNo))
-        if len(self.pinFlags.intersection(self._mutexPinTypes)) > 1:
+            er.ror.msg('f','Package slot counts differ. Line: ' + str(self.lineNo),
+                       self.lineNo)
+        flags = self.flags
+        m = flags & self._mutexFlags
+        if m & (m - 1): # More than one bit set.
             valid = False
             m = 'Mutually-exclusive pin flag conflict. Line: ' + str(self.lineNo)
-            er.ror.msg('f', m)
-        for pf in self._conflictPinTypes:
-            if not self.pinFlags.isdisjoint(self._conflictPinTypes[pf]):
+            er.ror.msg('f', m, self.lineNo)
+        for pf, conflicts in self._conflictFlags:
+            if flags & pf and flags & conflicts:
                 valid = False
                 m = 'Pin flag conflict. Line: ' + str(self.lineNo)
-                er.ror.msg('f', m)
+                er.ror.msg('f', m, self.lineNo)
         return valid
     @property
     def isPowerAlias(self):
@@ -246,6 +278,7 @@ class PinTile(Tile):
 
 class SpacerTile(Tile):
     "Forces space in layout."
+    __slots__ = ['w', 'h']
     def __init__(self, width, height = 0):
         assert width > 0
         assert height >= 0
@@ -265,10 +298,12 @@ class SpacerTile(Tile):
 ######################
 class Glyph(ModelObject):
     "A graphical element."
+    __slots__ = []
     pass
     
 class TextGlyph(Glyph):
     "Normal text -- draw with normal font."
+    __slots__ = ['_text']
     def __init__(self, someText = ''):
         self._text = someText
     def reprvals(self):
@@ -285,6 +320,7 @@ class TextGlyph(Glyph):
 
 class RefGlyph(Glyph):
     "A text glyph whose value is the value of a named attribute."
+    __slots__ = ['_attr']
     def __init__(self, anAttr, aBlockName):
         assert not anAttr.refBy(aBlockName) # An attr can't be refered to multiple times in a block.
         self._attr = anAttr
@@ -305,6 +341,7 @@ class RefGlyph(Glyph):
         return self._attr.name
     
 class GraphicGlyph(Glyph):
+    __slots__ = ['glyph']
     _implements = frozenset(['tristate','driver','ge','testbox','pkg'])
     # 'pkg' isn't really a graphic element, but process flow is the same.
     def __init__(self, glyphname):
@@ -320,6 +357,7 @@ class GraphicGlyph(Glyph):
 
 class GlyphicTile(Tile):
     "A tile containing a list of glyphs."
+    __slots__ = ['glyphs']
     # Set of attributes that are not @@ referenceable.
     _unreferenceable = frozenset(['device'])
     def __init__(self, aGlyphlist = []):
@@ -407,6 +445,7 @@ class GlyphicTile(Tile):
 # Band classes. #
 #################
 class Band(ModelObject):
+    __slots__ = ['ltile', 'ctile', 'rtile']
     def __init__(self, leftTile = None, centerTile = None, rightTile = None):
         assert isinstance(leftTile, Tile) or leftTile == None
         assert isinstance(centerTile, Tile) or centerTile == None
@@ -438,6 +477,7 @@ class Band(ModelObject):
                 tile.lineNo = self.lineNo 
     
 class TopBand(Band):
+    __slots__ = []
     def __init__(self,centerTile = None):
         "The band at the top of a block.  Required for all blocks."
         assert centerTile == None or isinstance(centerTile,Tile)
@@ -447,12 +487,14 @@ class TopBand(Band):
 
 class BotBand(Band):
     "The band at the bottom of a block. Required for all blocks."
+    __slots__ = []
     def __init__(self):
         super(BotBand,self).__init__()
     def reprvals(self):
         return []
 
 class IOBand(Band):
+    __slots__ = []
     def __init__(self, leftTile = None, centerTile = None, rightTile = None):
         assert leftTile == None or isinstance(leftTile,Tile)
         assert centerTile == None or isinstance(centerTile,Tile)
@@ -474,6 +516,7 @@ class IOBand(Band):
         return s
     
 class NeckBand(Band):
+    __slots__ = []
     def __init__(self, centerTile = None):
         assert centerTile == None or isinstance(centerTile,Tile)
         super(NeckBand,self).__init__(None, centerTile, None)
@@ -481,6 +524,7 @@ class NeckBand(Band):
         return [self.ctile]
 
 class SepBand(Band):
+    __slots__ = ['wide']
     def __init__(self, wide=False):
         super(SepBand,self).__init__()
         self.wide = wide
@@ -488,6 +532,7 @@ class SepBand(Band):
         return [self.wide] if self.wide else []
 
 class TextBand(Band):
+    __slots__ = ['upKerning']
     def __init__(self, centerTile, upKerning = 0):
         assert centerTile == None or isinstance(centerTile,Tile)
         super(TextBand,self).__init__(None, centerTile, None)
@@ -497,6 +542,7 @@ class TextBand(Band):
 # Block class.
 #
 class BlockBase(ModelObject):
+    __slots__ = []
     def numSlots(self):
         return 0
     def blockNameSet(self):
@@ -509,6 +555,7 @@ class BlockBase(ModelObject):
         return set()
 
 class UnusedBlock(BlockBase):
+    __slots__ = ['pkgName', 'pins', 'bands']
     def __init__(self, aPackageName, aPinList):
         assert isinstance(aPackageName, str)
         assert isinstance(aPinList, list)
@@ -529,6 +576,7 @@ class UnusedBlock(BlockBase):
         return True
 
 class Block(BlockBase):
+    __slots__ = ['pkgs', 'bands']
     def __init__(self, packageList, bandList):
         self.pkgs = packageList # A list of (package name, block name) tuples.
         self.bands = bandList # A list of Band() instances.
@@ -561,9 +609,10 @@ class Block(BlockBase):
     def isValid(self):
         valid = self._validateBlockNames()
         if self.numSlots() < 0:
-            er.ror.msg('f',' '.join(['Inconsistent number of slots in block',self.pkgs[0][1]]))
+            er.ror.msg('f',' '.join(['Inconsistent number of slots in block',self.pkgs[0][1]]),
+                       self.lineNo)
             valid = False
-        valid &= self._validateBandorder() & self._validatePinsUsed()
+        valid &= self._validateBandorder()
         valid &= self._validateBands()
         return valid
     def _validateBandorder(self):
@@ -574,11 +623,11 @@ class Block(BlockBase):
         necks = 0
         if not isinstance(self.bands[0], TopBand):
             m = ' '.join(['First band not a top band in block',self.pkgs[0][1]])
-            er.ror.msg('f',m)
+            er.ror.msg('f',m,self.lineNo)
             valid = False
         if not isinstance(self.bands[-1], BotBand):
             m = ' '.join(['Last band not bottom band in block ',self.pkgs[0][1]])
-            er.ror.msg('f',m)
+            er.ror.msg('f',m,self.lineNo)
             valid = False
         for b in self.bands:
             if isinstance(b,TopBand):
@@ -588,34 +637,26 @@ class Block(BlockBase):
             if isinstance(b,NeckBand):
                 necks +=1
         if tops == 0:        
-            er.ror.msg('f',' '.join(['No top band in block' + self.pkgs[0][1]]))
+            er.ror.msg('f',' '.join(['No top band in block' + self.pkgs[0][1]]),
+                       self.lineNo)
             valid = False
         if bottoms == 0:        
-            er.ror.msg('f',' '.join(['No bottom band in block' + self.pkgs[0][1]]))
+            er.ror.msg('f',' '.join(['No bottom band in block' + self.pkgs[0][1]]),
+                       self.lineNo)
             valid = False
         if tops > 1:        
-            er.ror.msg('f',' '.join(['Multiple top bands in block' + self.pkgs[0][1]]))
+            er.ror.msg('f',' '.join(['Multiple top bands in block' + self.pkgs[0][1]]),
+                       self.lineNo)
             valid = False
         if bottoms > 1:        
-            er.ror.msg('f',' '.join(['Multiple bottom bands in block' + self.pkgs[0][1]]))
+            er.ror.msg('f',' '.join(['Multiple bottom bands in block' + self.pkgs[0][1]]),
+                       self.lineNo)
             valid = False
         if necks > 1:        
-            er.ror.msg('f',' '.join(['Multiple neck bands in block' + self.pkgs[0][1]]))
+            er.ror.msg('f',' '.join(['Multiple neck bands in block' + self.pkgs[0][1]]),
+                       self.lineNo)
             valid = False
         return valid
-    def _validatePinsUsed(self):
-        "Any pin number can appear at most once in a block, per package."
-        valid = True
-        for pkg in [p for (p,n) in self.pkgs]:
-            u = set()
-            for b in self.bands:
-                if not u.isdisjoint(b.pinsUsed(pkg)):
-                    er.ror.msg('f',''.join(['Pin(s) '] + [str(x) for x in u & b.pinsUsed(pkg)]
-                                             + [' used multiple times in package "',pkg,'".']))
-                    valid = False
-                u |= b.pinsUsed(pkg)
-                u.discard(0)
-        return valid
     def _validateBands(self):
         valid = True
         for b in self.bands:
@@ -629,7 +670,8 @@ class Block(BlockBase):
         for pkg,blk in self.pkgs:
             if blk in s:
                 er.ror.msg('f',
-                    ' '.join(['Block name', blk, 'appears multiple times.']))
+                    ' '.join(['Block name', blk, 'appears multiple times.']),
+                    self.lineNo)
                 valid = False
         return valid
 
@@ -637,6 +679,7 @@ class Block(BlockBase):
 # Attribute classes. 
 #
 class Attr(ModelObject):
+    __slots__ = ['name', '_value', '_refTo']
     def __init__(self, aName, aValue, refTo = None):
         self.name = aName
         self.value = str(aValue)
@@ -679,10 +722,91 @@ class AttrDict(dict):
     def add(self,v):
         self[v.name] = v
 
+#
+# Pin index.
+#
+PinUse = namedtuple('PinUse', 'block band slot lineNo')
+
+def pinRanges(pins):
+    "Formats a sorted list of pin numbers compactly, e.g. '1-4, 7, 9-10'."
+    l = []
+    i = 0
+    while i < len(pins):
+        j = i
+        while j + 1 < len(pins) and pins[j + 1] == pins[j] + 1:
+            j += 1
+        if j == i:
+            l.append(str(pins[i]))
+        else:
+            l.append('{0:d}-{1:d}'.format(pins[i], pins[j]))
+        i = j + 1
+    return ', '.join(l)
+
+class PinIndex(object):
+    '''Where every pin number of a part is used, built in one pass over
+    the part.  uses[pkg][pin] is the PinUse that first claims pin in
+    package pkg; an 'unused' block's pins have no band and slot 0.
+    order[block][pkg] lists the block's PinTiles in pinseq order, less
+    shadow pins.  duplicates lists (block, pkg, [pin,...]) for pins
+    used in more than one band of a block.'''
+    def __init__(self, part):
+        self.uses = defaultdict(dict)
+        self.order = dict()
+        self.duplicates = []
+        for blk in part.blocks:
+            if isinstance(blk, UnusedBlock):
+                u = self.uses[blk.pkgName]
+                use = PinUse(blk, None, 0, blk.lineNo)
+                for pin in blk.pins:
+                    u.setdefault(pin, use)
+            else:
+                self._addBlock(blk)
+    def _addBlock(self, blk):
+        order = dict([(pkg, []) for pkg in blk.pkgSet()])
+        self.order[blk] = order
+        seen = defaultdict(set)
+        dups = defaultdict(set)
+        for band in blk.bands:
+            # The two sides of one band may share pins, as in a
+            # bidirectional buffer, so pins are checked band by band.
+            bandPins = defaultdict(set)
+            for t in [band.ltile, band.rtile]:
+                if not isinstance(t, PinTile):
+                    continue
+                for pkg, pins in t.pinListDict.items():
+                    if pins[0] == 0:
+                        continue # Shadow pin.
+                    order.setdefault(pkg, []).append(t)
+                    u = self.uses[pkg]
+                    for slot, pin in enumerate(pins):
+                        bandPins[pkg].add(pin)
+                        if pin not in u:
+                            u[pin] = PinUse(blk, band, slot + 1, band.lineNo)
+            for pkg, pins in bandPins.items():
+                pins.discard(0)
+                dups[pkg] |= seen[pkg] & pins
+                seen[pkg] |= pins
+        for pkg in sorted([pkg for pkg in dups if dups[pkg]]):
+            self.duplicates.append((blk, pkg, sorted(dups[pkg])))
+    def missing(self, pkg):
+        "Sorted list of pin numbers below the highest in pkg that nothing uses."
+        u = self.uses.get(pkg)
+        if not u:
+            return []
+        return [pin for pin in xrange(1, max(u)) if pin not in u]
+    def pinCount(self, blk, pkg):
+        "Number of pins, less shadow pins, blk has in pkg."
+        return len(self.order.get(blk, {}).get(pkg, []))
+    def slotPins(self, blk, pkg, slot):
+        "Pin numbers for slot (from 1) of blk in pkg, in pinseq order."
+        return [t.pinListDict[pkg][slot - 1]
+                for t in self.order.get(blk, {}).get(pkg, [])]
+
 #
 # Part class.
 #
 class Part(ModelObject):
+    __slots__ = ['attrs', 'blocks', 'directives', '_pinIndex']
     def __init__(self, attributes = AttrDict(), theBlocks=[], \
                  directiveDict=DirectiveDict()): 
         self.attrs = attributes
@@ -704,20 +828,33 @@ class Part(ModelObject):
         return reduce(lambda x,y:x|y, [b.pinsUsed(pkg) for b in self.blocks])
     def pinsNotUsed(self, pkg):
         return reduce(lambda x,y:x|y, [b.pinsNotUsed(pkg) for b in self.blocks])
+    @property
+    def pinIndex(self):
+        "The PinIndex of this part, built on first use."
+        try:
+            return self._pinIndex
+        except AttributeError:
+            self._pinIndex = PinIndex(self)
+            return self._pinIndex
     def _validatePinsUsedByPackage(self, pkg):
         "True if every pin from 1 to maximum pin# mentioned is accounted for."
-        p = self.pinsUsed(pkg) | self.pinsNotUsed(pkg)
-        valid = True
-        for pin in xrange(1,max(p)):
-            if pin not in p:
-                er.ror.msg('f',' '.join(['Pin',str(pin),'not used by package',pkg]))
-                valid = False
-        return valid
+        missing = self.pinIndex.missing(pkg)
+        if missing:
+            er.ror.msg('f',' '.join(['Pin' if len(missing) == 1 else 'Pins',
+                                     pinRanges(missing), 'not used by package', pkg]))
+        return not missing
     def _validatePinsUsed(self):
         "True if all packages have valid pin usage."
         valid = True
-        for p in self.pkgSet():
+        for p in sorted(self.pkgSet()):
             valid &= self._validatePinsUsedByPackage(p)
+        # Any pin number can appear at most once in a block, per package.
+        for blk, pkg, pins in self.pinIndex.duplicates:
+            m = ''.join(['Pin' if len(pins) == 1 else 'Pins', ' ', pinRanges(pins),
+                         ' used multiple times in package "', pkg, '" in block ',
+                         blk.referenceBlockName, '.'])
+            er.ror.msg('f', m, blk.lineNo)
+            valid = False
         return valid
     def _validateAttrs(self):
         "True if required attributes are present. Also issues warnings."
@@ -735,20 +872,175 @@ class Part(ModelObject):
         pass
     @property
     def isValid(self):
-        valid = self._validatePinsUsed()
-        valid &= self._validateAttrs()
-        for b in self.blocks:
-            valid &= b.isValid
+        with trace.span('isValid'):
+            valid = self._validatePinsUsed()
+            valid &= self._validateAttrs()
+            for b in self.blocks:
+                valid &= b.isValid
         return valid
 
-#########################
-# External Entry Points #
-#########################
+##################################
+# Intermediate representation IO #
+##################################
+# A .symr file holds a parsed, validated Part as JSON lines: a header
+# object, then one list per record, written and read one at a time.
+#   ["attr", name, value, lineNo]
+#   ["block", [[package, block name],...], lineNo]
+#   ["band", class name, lineNo, ltile, ctile, rtile, wide or upKerning]
+#   ["unused", package, [pin,...], lineNo]
+#   ["end"]
+# Bands belong to the block before them.  A tile is null or one of
+#   ["pin", name, [flag,...], {package:[pin,...]}, pinType, lineNo]
+#   ["spacer", w, h, lineNo]
+#   ["glyphs", [["text", text] | ["ref", attr name] | ["graphic", name],...], lineNo]
+# Attribute references are rebuilt from the "ref" glyphs, so nothing
+# in the file is ever evaluated.
+_repVersion = 1
+_repEncoding = 'latin-1' # Round-trips any byte string.
+
+def _encodeTile(t):
+    if t == None:
+        return None
+    if isinstance(t, PinTile):
+        return ['pin', t.name, sorted(t.pinFlags), t.pinListDict,
+                t._pinType, t.lineNo]
+    if isinstance(t, SpacerTile):
+        return ['spacer', t.w, t.h, t.lineNo]
+    l = []
+    for g in t.glyphs:
+        if isinstance(g, RefGlyph):
+            l.append(['ref', g.attrName])
+        elif isinstance(g, GraphicGlyph):
+            l.append(['graphic', g.glyph])
+        else:
+            l.append(['text', g.text])
+    return ['glyphs', l, t.lineNo]
+
+def _b(u):
+    "Turns a string json hands back as unicode into a byte string."
+    return u.encode(_repEncoding)
+
+def _decodeTile(r, attrs, blockName):
+    if r[0] == 'pin':
+        t = PinTile(_b(r[1]), pinFlagMask([_b(x) for x in r[2]]),
+                    dict([(_b(k), v) for k, v in r[3].items()]),
+                    _b(r[4]) if r[4] != None else None)
+    elif r[0] == 'spacer':
+        t = SpacerTile(r[1], r[2])
+    elif r[0] == 'glyphs':
+        l = []
+        for kind, v in r[1]:
+            if kind == 'ref':
+                l.append(RefGlyph(attrs[v], blockName))
+            elif kind == 'graphic':
+                l.append(GraphicGlyph(_b(v)))
+            elif kind == 'text':
+                l.append(TextGlyph(_b(v)))
+            else:
+                raise ValueError('Unknown glyph: ' + kind)
+        t = GlyphicTile(l)
+    else:
+        raise ValueError('Unknown tile: ' + r[0])
+    t._lineNo = r[-1]
+    return t
+
+_bandMakers = {
+    'TopBand':lambda l,c,r,x: TopBand(c),
+    'BotBand':lambda l,c,r,x: BotBand(),
+    'IOBand':lambda l,c,r,x: IOBand(l,c,r),
+    'NeckBand':lambda l,c,r,x: NeckBand(c),
+    'SepBand':lambda l,c,r,x: SepBand(x),
+    'TextBand':lambda l,c,r,x: TextBand(c,x),
+}
+
+def _encodeBand(b):
+    if isinstance(b, SepBand):
+        extra = b.wide
+    elif isinstance(b, TextBand):
+        extra = b.upKerning
+    else:
+        extra = None
+    return ['band', b.__class__.__name__, b.lineNo, _encodeTile(b.ltile),
+            _encodeTile(b.ctile), _encodeTile(b.rtile), extra]
+
+def dumpRep(part, f):
+    "Writes part to open file 'f' in intermediate representation."
+    def put(record):
+        f.write(json.dumps(record, encoding=_repEncoding, separators=(',',':'),
+                           sort_keys=True))
+        f.write('\n')
+    put({'format':'ansisym-rep', 'version':_repVersion,
+         'directives':dict(part.directives)})
+    for a in part.attrs.values():
+        put(['attr', a.name, a.value, a.lineNo])
+    for b in part.blocks:
+        if isinstance(b, UnusedBlock):
+            put(['unused', b.pkgName, b.pins, b.lineNo])
+        else:
+            put(['block', b.pkgs, b.lineNo])
+            for band in b.bands:
+                put(_encodeBand(band))
+    put(['end'])
+
 def loadRep(f):
-    "Load representation from open file 'f'."
-    s = f.read()
-    return eval(s)
-    
+    """Loads a Part from open file 'f', written by dumpRep(), or returns
+    None at end of file.  Parts written one after another to the same
+    file are read back by successive calls.  Raises ValueError if f
+    isn't a valid representation."""
+    lines = iter(f)
+    try:
+        first = next(lines)
+    except StopIteration:
+        return None
+    try:
+        header = json.loads(first)
+        if header.get('format') != 'ansisym-rep' \
+        or header.get('version') != _repVersion:
+            raise ValueError('Not a version {0:d} representation.'.format(_repVersion))
+        directives = DirectiveDict()
+        for k, v in header['directives'].items():
+            directives[_b(k)] = _b(v) if isinstance(v, unicode) else v
+        attrs = AttrDict()
+        blocks = []
+        block = blockName = None
+        decode = json.JSONDecoder().raw_decode
+        for line in lines:
+            r = decode(line)[0]
+            kind = r[0]
+            if kind == 'band':
+                if block == None:
+                    raise ValueError('Band record outside a block.')
+                # Most tiles are empty, so skip the call for those.
+                lt, ct, rt = r[3:6]
+                band = _bandMakers[r[1]](lt and _decodeTile(lt, attrs, blockName),
+                                         ct and _decodeTile(ct, attrs, blockName),
+                                         rt and _decodeTile(rt, attrs, blockName),
+                                         r[6])
+                band._lineNo = r[2]
+                block.bands.append(band)
+            elif kind == 'attr':
+                a = Attr(_b(r[1]), _b(r[2]))
+                a.lineNo = r[3]
+                attrs.add(a)
+            elif kind == 'block':
+                block = Block([(_b(p), _b(n)) for p, n in r[1]], [])
+                block.lineNo = r[2]
+                blockName = block.referenceBlockName
+                blocks.append(block)
+            elif kind == 'unused':
+                b = UnusedBlock(_b(r[1]), r[2])
+                b.lineNo = r[3]
+                blocks.append(b)
+                block = blockName = None
+            elif kind == 'end':
+                return Part(attrs, blocks, directives)
+            else:
+                raise ValueError('Unknown record: ' + kind)
+    except (StopIteration, KeyError, IndexError, TypeError, AttributeError,
+            AssertionError):
+        pass
+    raise ValueError('Truncated or damaged representation.')
+
 
 ########################################################################
     
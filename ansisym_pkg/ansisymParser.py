@@ -19,12 +19,24 @@
 #   
 
 from os.path import dirname
+import os
+import re
+import sys
+import hashlib
+import importlib
+import copy
+import threading
+from functools import partial
+from itertools import chain, repeat
+from operator import add, itemgetter
 
 import ply.lex as lex
 import ply.yacc as yacc
 
 import ansisymErrorSink as er
 import ansisymModel as mdl
+from ansisymProfile import prof
+from ansisymTrace import trace
 
 
 #################
@@ -32,14 +44,18 @@ import ansisymModel as mdl
 #################
 _anonymousPin = '_'
 
-###############################
-# Parsing State and Constants #
-###############################
-_packageListContext = None # Nasty parsing context to track package names.
-_attrContext = None # Nasty parsing context to make attribute dict available.
-_blockContext = None # Especially nasty context for ref-attr validation.
-_directive = mdl.DirectiveDict()
-_boilerplate = [] # Expecting a list of [name, value] lists here.
+#################
+# Parsing State #
+#################
+class ParseContext(object):
+    """State for one parse.  The grammar actions find it through the
+    parser instance ply hands them: p.parser.ctx"""
+    def __init__(self, boilerplate):
+        self.packageListContext = None # Nasty parsing context to track package names.
+        self.attrContext = None # Nasty parsing context to make attribute dict available.
+        self.blockContext = None # Especially nasty context for ref-attr validation.
+        self.directive = mdl.DirectiveDict()
+        self.boilerplate = boilerplate # Expecting a list of [name, value] lists here.
 
 ####################
 # Lexical Analyzer #
@@ -179,8 +195,8 @@ def t_strstate_error(t):
 # 'part' is the start symbol.
 def p_part(p):
     "part : directives global_attrs block_list"
-    global _attrContext
-    p[0] = mdl.Part(_attrContext, p[3], _directive)
+    ctx = p.parser.ctx
+    p[0] = mdl.Part(ctx.attrContext, p[3], ctx.directive)
 
 # Directives
 def p_directives(p):
@@ -194,13 +210,13 @@ def p_directive(p):
     """directive : KW_DIR STR STR NL
         | KW_DIR STR NUM NL
         | KW_DIR STR NL"""
+    ctx = p.parser.ctx
     # Capture directive setting in dictionary.
-    global _directive
-    if not _directive.isValid(p[2]):
+    if not ctx.directive.isValid(p[2]):
         er.ror.msg('w',' '.join([p[2], 'is not a valid directive name - ignored.']))
     else:
         v = p[3] if len(p) > 4 else True
-        _directive[p[2]] = v
+        ctx.directive[p[2]] = v
 
 def p_directive_err(p):
     "directive : KW_DIR error NL"
@@ -209,27 +225,27 @@ def p_directive_err(p):
 # Attribute collection.
 def p_global_attrs_attr(p):
     "global_attrs : global_attrs attr"
-    global _attrContext
-    _attrContext.add(p[2])
+    ctx = p.parser.ctx
+    ctx.attrContext.add(p[2])
 
 def p_global_attrs_boilerplate(p):
     "global_attrs : global_attrs AB NL"
-    global _attrContext
-    for nm,val in _boilerplate:
-        _attrContext.add(mdl.Attr(nm,val))
+    ctx = p.parser.ctx
+    for nm,val in ctx.boilerplate:
+        ctx.attrContext.add(mdl.Attr(nm,val))
 
 def p_global_attrs_induce_attr(p):
     "global_attrs : attr"
-    global _attrContext
-    _attrContext = mdl.AttrDict()
-    _attrContext.add(p[1])
+    ctx = p.parser.ctx
+    ctx.attrContext = mdl.AttrDict()
+    ctx.attrContext.add(p[1])
 
 def p_global_attrs_induce_boilerplate(p):
     "global_attrs : AB NL"
-    global _attrContext
-    _attrContext = mdl.AttrDict()
-    for nm,val in _boilerplate:
-        _attrContext.add(mdl.Attr(nm,val))
+    ctx = p.parser.ctx
+    ctx.attrContext = mdl.AttrDict()
+    for nm,val in ctx.boilerplate:
+        ctx.attrContext.add(mdl.Attr(nm,val))
 
 def p_global_attrs_completely_missing(p):
     "global_attrs : %prec 'A'"
@@ -284,15 +300,15 @@ def p_block_bk(p):
 
 def p_block_header(p):
     "block_header : BK bk_package_list NL"
-    global _packageListContext
-    _packageListContext = [x for (x,y) in p[2]]
-    global _blockContext 
-    _blockContext = p[2][0][1] # First file name becomes blockName key.
+    ctx = p.parser.ctx
+    ctx.packageListContext = [x for (x,y) in p[2]]
+    ctx.blockContext = p[2][0][1] # First file name becomes blockName key.
     # This is a good place to error check that if mdl.unnamedPackage
     # is present, that it is the only package.
-    if mdl.unnamedPackage in _packageListContext \
-    and len(_packageListContext) > 1:
-        er.ror.msg('f','Explicit package name required. Line:' + str(p.lineno(1)))
+    if mdl.unnamedPackage in ctx.packageListContext \
+    and len(ctx.packageListContext) > 1:
+        er.ror.msg('f','Explicit package name required. Line:' + str(p.lineno(1)),
+                   p.lineno(1))
     p[0] = (p[2], p.lineno(1)) # Kinda kludgy tuple to pass lineno up parse tree.
     
 def p_block_header_err(p):
@@ -333,14 +349,16 @@ def p_band_list_induce(p):
 # Top band
 def p_band_top(p):
     "band : T opt_str NL"
-    gt = mdl.GlyphicTile.fromSTR(p[2], _attrContext, _blockContext) if p[2] != "" else None
+    ctx = p.parser.ctx
+    gt = mdl.GlyphicTile.fromSTR(p[2], ctx.attrContext, ctx.blockContext) if p[2] != "" else None
     p[0] = mdl.TopBand(gt)
     p[0].lineNo = p.lineno(1)
     
 # Neck band
 def p_band_neck(p):
     "band : KW_NECK opt_str NL"
-    gt = mdl.GlyphicTile.fromSTR(p[2],_attrContext, _blockContext) if p[2] != "" else None
+    ctx = p.parser.ctx
+    gt = mdl.GlyphicTile.fromSTR(p[2],ctx.attrContext, ctx.blockContext) if p[2] != "" else None
     p[0] = mdl.NeckBand(gt)
     p[0].lineNo = p.lineno(1)
 
@@ -358,7 +376,8 @@ def p_band_text(p):
     
 def p_band_kerntext(p):
     "band : KW_CTXTU NUM STR NL"
-    gt = mdl.GlyphicTile.fromSTR(p[3], _attrContext, _blockContext)
+    ctx = p.parser.ctx
+    gt = mdl.GlyphicTile.fromSTR(p[3], ctx.attrContext, ctx.blockContext)
     p[0] = mdl.TextBand(gt, p[2])
     p[0].lineNo = p.lineno(1)
     
@@ -374,7 +393,6 @@ def p_spacer_spec_wh(p):
 # Bad keyword error trap.
 def p_band_bad(p):
     """band : BAD error NL"""
-    p[0].lineNo = p.lineno(3)-1
     raise SyntaxError
 
     
@@ -387,16 +405,18 @@ def p_band_io(p):
 # Syntax error recovery in a band
 def p_band_err(p):
     "band : error NL"
+    ctx = p.parser.ctx
     p[0] = mdl.TextBand(mdl.GlyphicTile.fromSTR('syntax error',
-                        _attrContext, _blockContext))
+                        ctx.attrContext, ctx.blockContext))
     
 # Glyph tiles.
 def p_opt_glyph_tile(p):
     """opt_glyph_tile : STR
         | NUM
         | """
+    ctx = p.parser.ctx
     if len(p) > 1:
-        p[0] = mdl.GlyphicTile.fromSTR(str(p[1]),_attrContext,_blockContext)
+        p[0] = mdl.GlyphicTile.fromSTR(str(p[1]),ctx.attrContext,ctx.blockContext)
     else:
         p[0] = None
 
@@ -409,7 +429,7 @@ def validPinnumLists(pnl):
     # pnl is a list of pinlists.
     # Each list should be irredundant.
     # If any list is longer than 1, it should not contain 0.
-    # FIXME: combine with check against _packageListContext which is
+    # FIXME: combine with check against ctx.packageListContext which is
     # still in the production function.
     return True # FIXME
 
@@ -417,52 +437,52 @@ def p_opt_io_tile(p):
     """opt_io_tile : pinflag_list NUM package_pinnum_list
        opt_io_tile : pinflag_list STR package_pinnum_list
         | """
+    ctx = p.parser.ctx
     if len(p) > 1:
-        if len(p[3]) != len(_packageListContext):
+        if len(p[3]) != len(ctx.packageListContext):
             plc = len(p[3])
-            pkc = len(_packageListContext)
+            pkc = len(ctx.packageListContext)
             m = str(plc) + ' pinlists found, but ' + str(pkc) + ' are required.'
             m += '  Line: ' + str(p.lineno(2))
-            er.ror.msg('f',m)
+            er.ror.msg('f',m,p.lineno(2))
             p[0] = None
         elif not validPinnumLists(p[3]):
             p[0] = None
         else:
             d = dict()
-            for i in xrange(0,len(_packageListContext)):
-                d[_packageListContext[i]] = p[3][i]
+            for i in xrange(0,len(ctx.packageListContext)):
+                d[ctx.packageListContext[i]] = p[3][i]
             pinName = str(p[2]) if p[2] != _anonymousPin else ''
             p[0] = mdl.PinTile(pinName, p[1], d)
     else:
         p[0] = None
     
 # IO pin flags.
-# Pin flags are represented as a set() of the lexical literals.
+# Pin flags are represented as a bitmask, see mdl.pinFlagMask().
 def p_pinflag_list_recurse(p):
     "pinflag_list : pinflag_list pinflag"
-    p[0] = p[1]
-    p[0].add(p[2])
+    p[0] = p[1] | p[2]
 
 def p_pinflag_list_induce(p):
     "pinflag_list : pinflag"
-    p[0] = set([p[1]])
+    p[0] = p[1]
 
 def p_pinflag_list_empty(p):
     "pinflag_list : %prec FLAG"
-    p[0] = set()
+    p[0] = 0
 
 def p_pinflag(p):
     """pinflag : '~'
         | '^'
         | '%'
         | FLAG"""
-    if mdl.PinTile.isValidPinType(p[1]):
-        p[0] = p[1]
-    else:
+    try:
+        p[0] = mdl.pinFlagBits[p[1]]
+    except KeyError:
         m = ' '.join([p[1],'is not a valid pin type. Line:',
                     str(p.lineno(1))])
-        er.ror.msg('f',m)
-        p[0] = '!pas' # Force a valid type to continue syntax checking.
+        er.ror.msg('f',m,p.lineno(1))
+        p[0] = mdl.pinFlagBits['!pas'] # Force a valid type to continue syntax checking.
 
 # IO pin numbers.
 # A package_pinnum_list list a list of lists.  The lists of
@@ -497,59 +517,340 @@ def p_opt_str(p):
 # Error Recovery #
 ##################
 def p_error(p):
-    if p.type == None:
+    if p == None or p.type == None:
         errtok = 'EOF'
-        errline = 'EOF'
+        lineNo = None
     elif p.type == 'NL':
         errtok = 'newline'
-        errline = str(p.lineno-1) # compensate for lineno being off-by-1 on NL
+        lineNo = p.lineno-1 # compensate for lineno being off-by-1 on NL
     else:
         errtok = p.type
-        errline = str(p.lineno)
+        lineNo = p.lineno
+    errline = 'EOF' if lineNo == None else str(lineNo)
     s = ''.join(["Syntax error at token: ",errtok,", line: ", errline])
     if errtok in extraneous:
         s += ' -- Extraneous character.'
-    er.ror.msg('f',s)
+    er.ror.msg('f',s,lineNo)
 
 ###########################
 # Build lexer and parser. #
 ###########################
-
-# Make the lexer.
-_lexer = lex.lex()
-_lexer.lineno -= 1 # Back off by one to compensate for sour-dough '\n'.
-# table generation is disabled -- this keeps ply from leaving ply-turds
-# all over the user's workspace.  For a grammar this small, it isn't
-# a big deal.
-
-
-# Make the parser. 
-# Production deployment:
+# ply can build the lexer and the LALR tables from the rules above on
+# every run, but it takes longer than parsing most parts.  Instead the
+# tables are generated once, by writeTables() ('ansisym --setup'), and
+# shipped in the install directory as lextab.py and parsetab.py.  Each
+# carries a checksum of the rules it was made from.  If the checksums
+# don't match the rules, the tables are built in memory for the run,
+# with a warning, and nothing is written to the install directory.
 try:
     _cacheDir = dirname(__file__) # Find out where this module lives during install.
 except:
     _cacheDir = '.'
-_parser = yacc.yacc(debug=0,outputdir=_cacheDir) # Cache files to install directory.
+_tablePrefix = __name__.rpartition('.')[0] + '.' if '.' in __name__ else ''
+_tableNames = ['lextab', 'parsetab']
+
+def tableChecksum():
+    """md5, in hex, of what the lexer and parser tables are made from:
+    the tokens, literals, states and precedence, and the name and
+    regex or productions of every rule, in ply's order.  ply's version
+    and table format versions are included too: ply quietly ignores
+    tables from another version and rebuilds them on every run."""
+    g = globals()
+    sig = hashlib.md5()
+    for v in [lex.__version__, lex.__tabversion__, yacc.__tabversion__]:
+        sig.update(v)
+    for name in ['tokens', 'literals', 'states', 'precedence']:
+        sig.update(repr(g[name]))
+    funcs = sorted([(f.func_code.co_firstlineno, n, f.__doc__ or '')
+                    for n, f in g.items()
+                    if n.startswith(('t_', 'p_')) and callable(f)])
+    for line, n, doc in funcs:
+        sig.update(n)
+        sig.update(doc)
+    for n in sorted([n for n in g if n.startswith('t_') and isinstance(g[n], str)]):
+        sig.update(n)
+        sig.update(g[n])
+    return sig.hexdigest()
+
+def _loadTables():
+    """Returns the lextab and parsetab modules if they were made from
+    the current rules, else None."""
+    try:
+        tables = [importlib.import_module(_tablePrefix + n) for n in _tableNames]
+    except ImportError:
+        return None
+    checksum = tableChecksum()
+    for t in tables:
+        if getattr(t, '_checksum', None) != checksum:
+            return None
+    return tables
+
+def writeTables(outputdir = _cacheDir):
+    """Regenerates lextab.py and parsetab.py in outputdir, and marks them
+    with the checksum of the rules.  Do this after changing the lexer
+    or the grammar."""
+    for n in _tableNames:
+        for ext in ['.py', '.pyc']:
+            try:
+                os.remove(os.path.join(outputdir, n + ext))
+            except OSError:
+                pass
+        sys.modules.pop(_tablePrefix + n, None) # Or yacc would find it again.
+    module = sys.modules[__name__]
+    lex.lex(module=module).writetab(_tableNames[0], outputdir)
+    yacc.yacc(module=module, debug=0, tabmodule=_tablePrefix + _tableNames[1],
+              outputdir=outputdir)
+    for n in _tableNames:
+        with open(os.path.join(outputdir, n + '.py'), 'a') as f:
+            f.write("_checksum = {0!r}\n".format(tableChecksum()))
+
+# Make the lexer.
+_tables = _loadTables()
+if _tables != None:
+    _lexer = lex.lex(optimize=1, lextab=_tables[0])
+else:
+    er.ror.msg('w', "Parser tables are missing or out of date, so they are "
+                    "built for this run.  Run 'ansisym --setup' to update them.")
+    _lexer = lex.lex()
+_lexer.lineno -= 1 # Back off by one to compensate for sour-dough '\n'.
+
+################
+# Line scanner #
+################
+# The ply lexer above defines the tokens, but it is slow: a master
+# regex, a LexToken and a function call per token, an exception for
+# every string that isn't a number, and a copy of the whole input to
+# wrap it in newlines.  Since every line starts with a keyword,
+# LineScanner reads the input a line at a time straight from the
+# buffer (a str or an mmap), dispatches on the keyword, and splits the
+# rest of the line with one findall().  A dict remembers the type and
+# value of each token text it has seen, so a line's tokens are made
+# with a few map() calls, and token() is the next() of an iterator
+# over them; there is no Python code run per token.  It produces the
+# tokens the ply lexer would, as though the input were wrapped in
+# newlines, except that lexpos is the offset of the token's line.
+# Lines it doesn't expect (no keyword, an unterminated string, an
+# illegal character) are handed to the ply lexer, so odd input and its
+# errors are handled just as before.
+
+class ScanToken(tuple):
+    """A (type, value, lineno, lexpos) tuple with the attributes ply's
+    parser reads from a token."""
+    __slots__ = []
+    type = property(itemgetter(0))
+    value = property(itemgetter(1))
+    lineno = property(itemgetter(2))
+    lexpos = property(itemgetter(3))
+    lexer = None # Stops the parser from setting it on an error token.
+    def __repr__(self):
+        return 'LexToken({0:s},{1!r},{2:d},{3:d})'.format(*self)
+
+_makeTokens = partial(map, partial(tuple.__new__, ScanToken))
+
+_symbolKeywords = {'--':'KW_SEP', '-':'KW_SEP', ']':'KW_NECK', '|^':'KW_CTXTU',
+                   '|':'KW_CTXT', '%':'KW_DIR'}
+_keywordRe = re.compile(r'[ \t]*(?:([A-Z]+)|(--|-|\]|\|\^|\||%)|(\#|$))')
+# After the keyword: a string or number, a flag, a quoted string, a
+# comment, or any other character.
+_restRe = re.compile(r'[ \t]*([a-zA-Z0-9&@_][a-zA-Z0-9&@_?-]*|![a-z]+'
+                     r'|"(?:[^"\n\\]|\\")*"|\#.*|.)')
+_kindsLimit = 50000 # Token texts remembered between inputs.
+
+class _TokenKinds(dict):
+    """Maps the text of a token after the keyword to its (type, value),
+    or to None for a comment or an empty string.  Raises KeyError for a
+    character the ply lexer would reject."""
+    def __init__(self):
+        dict.__init__(self, [(c, (c, c)) for c in literals])
+    def __missing__(self, text):
+        c = text[0]
+        if text.isdigit():
+            kind = ('NUM', int(text))
+        elif c == '!':
+            kind = ('FLAG', text)
+        elif c == '"' and len(text) > 1:
+            kind = ('STR', text[1:-1]) if len(text) > 2 else None
+        elif c == '#':
+            kind = None
+        elif c.isalnum() or c in '&@_':
+            kind = ('STR', text)
+        else:
+            raise KeyError(text)
+        self[text] = kind
+        return kind
+
+class LineScanner(object):
+    """Drop-in replacement for the ply lexer as the parser's token source:
+    input(text), then token() until it returns None.  Set lineno to one
+    less than the line number of the first line, as for the ply lexer."""
+    def __init__(self):
+        self.lineno = 0
+        self.lexpos = 0
+        self._plyLexer = _lexer.clone()
+        self._kinds = _TokenKinds()
+        self.token = repeat(None).next
+    def input(self, data):
+        if len(self._kinds) > _kindsLimit:
+            self._kinds = _TokenKinds()
+        self.token = chain.from_iterable(self._lines(data)).next
+    def _lines(self, data):
+        "Generates a list of tokens per line of data, then None forever."
+        lineno = self.lineno
+        # The newline ply sees in front of the input.
+        yield [ScanToken(('NL', '\n', lineno, 0))]
+        find = data.find
+        matchKeyword = _keywordRe.match
+        findRest = _restRe.findall
+        kindOf = self._kinds.__getitem__
+        start = 0
+        end = len(data)
+        while start <= end:
+            eol = find('\n', start, end)
+            if eol < 0:
+                eol = end # Ends with the newline ply sees after the input.
+            lineno += 1
+            self.lineno = lineno
+            self.lexpos = start + 1
+            m = matchKeyword(data, start, eol)
+            if m == None:
+                yield self._plyLine(data, start, eol, lineno) # No keyword.
+            elif m.lastindex != 3: # Otherwise a blank or comment line.
+                kw = m.group(m.lastindex)
+                try:
+                    kinds = map(kindOf, findRest(data, m.end(), eol))
+                except KeyError:
+                    yield self._plyLine(data, start, eol, lineno)
+                else:
+                    if None in kinds:
+                        kinds = filter(None, kinds)
+                    kinds.insert(0, (kw if kw in reserved else 'BAD' if m.lastindex == 1
+                                     else _symbolKeywords[kw], kw))
+                    kinds.append(('NL', '\n'))
+                    yield _makeTokens(map(add, kinds, repeat((lineno, start + 1),
+                                                             len(kinds))))
+            start = eol + 1
+        yield repeat(None)
+    def _plyLine(self, data, start, eol, lineno):
+        """Has the ply lexer tokenize one line, starting as it would, and
+        returns the tokens.  Raises any error once they have been read."""
+        lexer = self._plyLexer
+        lexer.begin('kwstate')
+        lexer.lineno = lineno
+        lexer.input(data[start:eol] + '\n')
+        l = []
+        try:
+            while True:
+                tok = lexer.token()
+                if tok == None:
+                    return _makeTokens(l)
+                l.append((tok.type, tok.value, tok.lineno, start + 1))
+        except lex.LexError as e:
+            e.lineno = lineno # For the error report, see ansisymBuild.readParts().
+            def raiseError():
+                raise e
+                yield
+            return chain(_makeTokens(l), raiseError())
+
+# Make the parser.
+if _tables != None:
+    _parser = yacc.yacc(debug=0, optimize=1, tabmodule=_tables[1], write_tables=0)
+else:
+    _parser = yacc.yacc(debug=0, write_tables=0)
 
 # Debug:
 #_parser = yacc.yacc() # development - ply puts temps into cwd
-#_parser = yacc.yacc(debug=0,write_tables=0) # disable ply caching and messages
 
 #######################
 # Module Entry Points #
 #######################
-def parse(inputText, boilerplate, debugFlag=0):
+class Parser(object):
+    """A re-entrant parser.  Each instance owns a line scanner and
+    a copy of the LR parser that shares the module's tables, so building
+    one is cheap.  Use one instance per thread; an instance can parse any
+    number of sources back-to-back."""
+    def __init__(self):
+        self._lexer = LineScanner()
+        self._parser = copy.copy(_parser)
+        self._parser.ctx = None
+    def parse(self, inputText, boilerplate, debugFlag=0, firstLine=1):
+        """Parse inputText, returning a Part() instance. boilerplate = [[nm,val]...]
+        firstLine is the line number of the first line of inputText."""
+        # Start each parse from a clean slate.
+        self._parser.ctx = ParseContext(boilerplate)
+        self._lexer.lineno = firstLine - 1 # Compensates for sour-dough '\n', see below.
+        # Wrapping the input text in newlines makes syntax error
+        # recovery simpler.  Otherwise the grammar could leave out
+        # NL's entirely and be cleaner.  NL's are the 'handle' for
+        # error productions, generally, but having explicit NL's
+        # in the grammar complicates the beginning and end-of-file
+        # cases.  Soooo.... the input text is wrapped in gratuitous
+        # newlines.  The line scanner supplies them itself, so the
+        # text isn't copied to add them.
+        try:
+            with trace.span('parse', line=firstLine):
+                self._lexer.input(inputText)
+                return self._parser.parse(lexer=self._lexer, debug=debugFlag,
+                                          tokenfunc=self._countingToken()
+                                                    if prof.enabled else None)
+        finally:
+            self._parser.ctx = None # Don't hang on to the model.
+
+    def _countingToken(self):
+        "Returns a token function that counts tokens for the profiler."
+        token = self._lexer.token
+        def countingToken():
+            tok = token()
+            if tok != None:
+                prof.count('tokens')
+            return tok
+        return countingToken
+
+_threadParsers = threading.local() # One Parser per thread for parse().
+
+def parse(inputText, boilerplate, debugFlag=0, firstLine=1):
     "Parse inputText, returning a Part() instance. boilerplate = [[nm,val]...]"
-    global _boilerplate
-    _boilerplate = boilerplate
-    # Wrapping the input text in newlines makes syntax error
-    # recovery simpler.  Otherwise the grammar could leave out
-    # NL's entirely and be cleaner.  NL's are the 'handle' for
-    # error productions, generally, but having explicit NL's
-    # in the grammar complicates the beginning and end-of-file
-    # cases.  Soooo.... the input text is wrapped in gratuitous
-    # newlines.
-    return _parser.parse(inputText.join(['\n','\n']), debug=debugFlag)
+    try:
+        parser = _threadParsers.parser
+    except AttributeError:
+        parser = Parser()
+        _threadParsers.parser = parser
+    return parser.parse(inputText, boilerplate, debugFlag, firstLine)
+
+# Library files.
+#
+# A library holds any number of parts, each starting with a line
+# 'P' or 'P name' and running to the next P line.  Only comments
+# and blank lines may come before the first P line.  A file with
+# no P lines is a single part, as always.  The parts are split out
+# at the line level so the grammar only ever sees one part.
+_partLine = re.compile(r'P(?:[ \t]+([^\s#]+))?\s*(?:#.*)?$')
+
+def splitParts(lines):
+    """Splits the lines of a source file into parts, yielding
+    (part text, line number of its first line, part name) for each.
+    No more lines are read than the part being yielded needs.  The
+    part name is None if there are no P lines."""
+    chunk = []
+    firstLine = 1
+    name = None
+    for n, line in enumerate(lines, 1):
+        m = _partLine.match(line)
+        if m == None:
+            chunk.append(line)
+            continue
+        if name != None:
+            yield ''.join(chunk), firstLine, name
+        else:
+            for i, ln in enumerate(chunk):
+                ln = ln.strip()
+                if ln != '' and ln[0] != '#':
+                    er.ror.msg('f', 'Text before first P line. Line: '
+                               + str(firstLine + i), firstLine + i)
+                    break
+        chunk = []
+        firstLine = n + 1
+        name = m.group(1) if m.group(1) != None else ''
+    yield ''.join(chunk), firstLine, name
 
 
 #############################################################################
@@ -0,0 +1,238 @@
+"ansisym profiler -- per-phase times, call counts, memory and counters."
+
+#   Copyright 2013 David B. Curtis
+
+#   This file is part of ansisym.
+#
+#   ansisym is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   ansisym is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with ansisym.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# 'ansisym --profile' answers the question of where the time goes:
+# parsing, validation, layout, rendering or writing files.  The build
+# driver brackets each phase with prof.phase(name) and bumps counters
+# with prof.count(); while profiling is off both cost next to nothing.
+# Text measurements and cache hits come from the text width cache's
+# own counters, so the measuring code needs no hooks at all.
+#
+# Memory is the traced allocation peak within each pass through a
+# phase if tracemalloc can reset its peak (Python 3.9 and later).
+# Otherwise it is how much the resident size grew during the pass,
+# read from /proc as bench/memBench.py does.  The process's peak
+# resident size only ever goes up, so it says nothing about a phase.
+#
+# Statistics are kept per source file, so the JSON report can be
+# aggregated across builds, and worker processes hand theirs back to
+# be merged with merge().
+
+import time
+import resource
+
+import ansisymGSView as vw
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+if tracemalloc != None and hasattr(tracemalloc, 'reset_peak'):
+    _memory = 'tracemalloc'
+else:
+    _memory = 'rss'
+
+_reportVersion = 2
+
+# Phases in the order they happen, for the report.
+phases = ['parse', 'loadrep', 'validate', 'dumprep', 'view', 'pinseq',
+          'slotattrs', 'layout', 'render', 'write']
+
+counters = ['parts', 'tokens', 'blocks', 'bands', 'pins', 'strokes',
+            'measurements', 'cachehits']
+
+def _rssKB():
+    "Current resident size in KB, from /proc if possible."
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except (IOError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class _NullPhase(object):
+    "Stands in for _Phase while profiling is off."
+    def __enter__(self):
+        pass
+    def __exit__(self, *exc):
+        return False
+
+_nullPhase = _NullPhase()
+
+class _Phase(object):
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+    def __enter__(self):
+        if _memory == 'tracemalloc':
+            tracemalloc.reset_peak()
+        else:
+            self.rss = _rssKB()
+        self.start = time.time()
+    def __exit__(self, *exc):
+        t = time.time() - self.start
+        if _memory == 'tracemalloc':
+            kb = tracemalloc.get_traced_memory()[1] // 1024
+        else:
+            kb = max(0, _rssKB() - self.rss)
+        s = self.stats.setdefault(self.name, [0.0, 0, 0])
+        s[0] += t
+        s[1] += 1
+        s[2] = max(s[2], kb)
+        return False
+
+class _Source(object):
+    def __init__(self, profiler, fname):
+        self.profiler = profiler
+        self.fname = fname
+    def __enter__(self):
+        self.profiler._current = self.profiler._stats(self.fname)
+        self.hits = vw.textWidths.hits
+        self.misses = vw.textWidths.misses
+    def __exit__(self, *exc):
+        self.profiler.count('measurements', vw.textWidths.misses - self.misses)
+        self.profiler.count('cachehits', vw.textWidths.hits - self.hits)
+        self.profiler._current = self.profiler._stats(None)
+        return False
+
+class Profiler(object):
+    "Collects phase times and counters while enabled."
+    enabled = False
+    def __init__(self):
+        self._sources = dict() # Source name to (phase stats, counters).
+        self._current = self._stats(None)
+        self._start = time.time()
+    def _stats(self, fname):
+        return self._sources.setdefault(fname, (dict(), dict()))
+    def enable(self):
+        self.enabled = True
+        self._start = time.time()
+        if _memory == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+    def phase(self, name):
+        "Context manager that times one pass through phase name."
+        if not self.enabled:
+            return _nullPhase
+        return _Phase(self._current[0], name)
+    def source(self, fname):
+        "Context manager that charges everything inside it to source fname."
+        if not self.enabled:
+            return _nullPhase
+        return _Source(self, fname)
+    def count(self, name, n = 1):
+        if self.enabled:
+            c = self._current[1]
+            c[name] = c.get(name, 0) + n
+    def countPart(self, part):
+        "Counts the blocks, bands and pins in a model Part."
+        if not self.enabled:
+            return
+        import ansisymModel as mdl
+        bands = pins = 0
+        for blk in part.blocks:
+            bands += len(blk.bands)
+            for band in blk.bands:
+                for t in [band.ltile, band.rtile]:
+                    if isinstance(t, mdl.PinTile):
+                        pins += 1
+        self.count('parts')
+        self.count('blocks', len(part.blocks))
+        self.count('bands', bands)
+        self.count('pins', pins)
+    def countOutput(self, text):
+        "Counts the strokes in a rendered .sym file."
+        if self.enabled:
+            self.count('strokes', text.count('\nL '))
+    def takeSources(self):
+        "Returns the per-source statistics and forgets them, for merge()."
+        d = dict([(fn, {'phases':ph, 'counters':c})
+                  for fn, (ph, c) in self._sources.items()
+                  if fn != None and (ph or c)])
+        self._sources = dict()
+        self._current = self._stats(None)
+        return d
+    def merge(self, sources):
+        "Adds statistics returned by takeSources() in another process."
+        for fn, d in sources.items():
+            ph, c = self._stats(fn)
+            for name, (t, calls, kb) in d['phases'].items():
+                s = ph.setdefault(name, [0.0, 0, 0])
+                s[0] += t
+                s[1] += calls
+                s[2] = max(s[2], kb)
+            for name, n in d['counters'].items():
+                c[name] = c.get(name, 0) + n
+    def report(self):
+        "Returns the statistics as a dict, ready for json."
+        import ansisym_pkg
+        totalPhases = dict()
+        totalCounters = dict([(name, 0) for name in counters])
+        sources = dict()
+        for fn, (ph, c) in self._sources.items():
+            for name, (t, calls, kb) in ph.items():
+                s = totalPhases.setdefault(name, [0.0, 0, 0])
+                s[0] += t
+                s[1] += calls
+                s[2] = max(s[2], kb)
+            for name, n in c.items():
+                totalCounters[name] = totalCounters.get(name, 0) + n
+            if fn != None and (ph or c):
+                sources[fn] = {'phases':_phaseDict(ph), 'counters':c}
+        return {'version':_reportVersion,
+                'ansisym':ansisym_pkg.__version__,
+                'memory':_memory,
+                'wall':time.time() - self._start,
+                'phases':_phaseDict(totalPhases),
+                'counters':totalCounters,
+                'sources':sources}
+
+def _phaseDict(ph):
+    # memoryKB is the largest of any one pass through the phase; see
+    # the report's 'memory' for what it measures.
+    return dict([(name, {'seconds':t, 'calls':calls, 'memoryKB':kb})
+                 for name, (t, calls, kb) in ph.items()])
+
+def formatReport(r):
+    "Returns the lines of a readable report for report() results r."
+    ph = r['phases']
+    traced = r['memory'] == 'tracemalloc'
+    l = ['==== Profile ====',
+         '{0:12s} {1:>10s} {2:>8s} {3:>10s}'.format('phase', 'ms', 'calls',
+                                                   'peak KB' if traced
+                                                   else 'RSS +KB')]
+    names = [p for p in phases if p in ph] \
+            + sorted([p for p in ph if p not in phases])
+    for name in names:
+        s = ph[name]
+        l.append('{0:12s} {1:10.1f} {2:8d} {3:10d}'.format(name,
+                 s['seconds'] * 1000.0, s['calls'], s['memoryKB']))
+    l.append('{0:12s} {1:10.1f}'.format('total',
+             sum([s['seconds'] for s in ph.values()]) * 1000.0))
+    l.append('{0:12s} {1:10.1f}'.format('wall', r['wall'] * 1000.0))
+    c = r['counters']
+    l.append(', '.join(['{0:s} {1:d}'.format(name, c[name])
+                        for name in counters if name in c]))
+    l.append('Memory is the peak of traced allocations in one pass through the phase.'
+             if traced else
+             'Memory is the most the resident size grew in one pass through the phase.')
+    return l
+
+# Single instance of Profiler, shared by the whole process.
+prof = Profiler()
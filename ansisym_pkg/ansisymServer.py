@@ -0,0 +1,282 @@
+"ansisym compile server -- a resident compiler on a Unix domain socket."
+
+#   Copyright 2013 David B. Curtis
+
+#   This file is part of ansisym.
+#
+#   ansisym is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   ansisym is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with ansisym.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Starting ansisym costs far more than compiling a typical part, so
+# 'ansisym --serve' keeps a compiler resident and the ansisym script
+# hands its sources to it when it is running.
+#
+# The protocol is one JSON object per line.  The client sends
+#   {'version':..., 'checksum':..., 'options':{...},
+#    'boilerplate':[[attr,value],...], 'sources':[[file name, text],...]}
+# where version is the release and checksum the codeChecksum() of the
+# client, and the server replies with
+#   {'results':[{'name':..., 'ok':..., 'messages':[...],
+#                'counts':[i,w,f,p], 'outputs':[[file name, text],...]},...]}
+# or {'error':...} if it can't handle the request.  The server never
+# touches the client's files; the client reads the sources, resolves
+# the boilerplate, and writes the outputs itself.  Requests are served
+# one at a time, since the error sink is shared.
+#
+# The socket lives in a directory only its user can enter, and is
+# bound with a umask that keeps it private.  The client only talks to
+# a socket of its own user's, and only writes outputs with names it
+# would have given them itself.
+
+import os
+import stat
+import glob
+import copy
+import json
+import socket
+import hashlib
+import tempfile
+import SocketServer
+
+import ansisym_pkg
+import ansisymErrorSink as er
+import ansisymBuild as bld
+import ansisymGSView as vw
+
+# $XDG_RUNTIME_DIR is private to the user; failing that, the server
+# makes a directory of its own in the temp directory.
+socketDir = os.environ.get('XDG_RUNTIME_DIR') or \
+    os.path.join(tempfile.gettempdir(), 'ansisym-{0:d}'.format(os.getuid()))
+socketPath = os.path.join(socketDir, 'ansisym.sock')
+
+# Options that affect the outputs and travel with each request.
+requestOptions = ['block', 'reponly', 'fromrep', 'metrics']
+
+def _str(x):
+    "Undoes json's conversion of str to unicode."
+    if isinstance(x, unicode):
+        return x.encode('utf-8')
+    if isinstance(x, list):
+        return [_str(y) for y in x]
+    if isinstance(x, dict):
+        return dict([(_str(k), _str(v)) for k, v in x.items()])
+    return x
+
+_codeChecksum = None
+
+def codeChecksum():
+    """md5, in hex, of the package's modules and data files.  A server
+    only serves clients running the same code, so one left running
+    across an upgrade isn't used."""
+    global _codeChecksum
+    if _codeChecksum == None:
+        h = hashlib.md5()
+        d = os.path.dirname(os.path.abspath(__file__))
+        for fn in sorted(glob.glob(os.path.join(d, '*.py')) +
+                         glob.glob(os.path.join(d, '*.json'))):
+            with open(fn, 'rb') as f:
+                h.update(f.read())
+        _codeChecksum = h.hexdigest()
+    return _codeChecksum
+
+def _makePrivateDir(d):
+    """Makes directory d, that only this user can enter, unless it
+    exists.  Panics if it isn't a directory of ours that only we can
+    enter."""
+    try:
+        os.mkdir(d, 0700)
+    except OSError:
+        pass # Checked below.
+    try:
+        st = os.lstat(d)
+    except OSError as e:
+        er.ror.msg('p', ' '.join(["Can't make", d + ':', e.strerror]))
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() \
+       or st.st_mode & 077:
+        er.ror.msg('p', ' '.join([d, 'is not a private directory of yours.']))
+
+def isOwnSocket(path):
+    "True if path is a socket that belongs to this user."
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid()
+
+def isRunning(path = socketPath):
+    "True if a server is accepting connections on path."
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+        return True
+    except socket.error:
+        return False
+    finally:
+        s.close()
+
+class _Handler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        try:
+            reply = self.server.compile(_str(json.loads(self.rfile.readline())))
+        except (ValueError, KeyError, TypeError) as e:
+            reply = {'error':repr(e)}
+        self.wfile.write(json.dumps(reply))
+        self.wfile.write('\n')
+
+class CompileServer(SocketServer.UnixStreamServer):
+    "Compiles sources sent by clients, with args as the server's defaults."
+    def __init__(self, args, path = socketPath):
+        if path == socketPath:
+            _makePrivateDir(socketDir)
+        if os.path.exists(path):
+            if isRunning(path):
+                er.ror.msg('p', ' '.join(['A server is already running on',
+                                          path + '.']))
+            os.remove(path) # Left behind by a server that died.
+        # Bind with the socket already private; chmod after bind leaves
+        # a moment in which anyone can connect.
+        mask = os.umask(077)
+        try:
+            SocketServer.UnixStreamServer.__init__(self, path, _Handler)
+        finally:
+            os.umask(mask)
+        self.path = path
+        self.args = args
+        self._metrics = args.metrics
+    def compile(self, req):
+        "Handles one decoded request, returns the reply."
+        if req['version'] != ansisym_pkg.__version__ \
+           or req['checksum'] != codeChecksum():
+            return {'error':'Server is ansisym ' + ansisym_pkg.__version__
+                            + ', checksum ' + codeChecksum()}
+        args = copy.copy(self.args)
+        for k in requestOptions:
+            setattr(args, k, req['options'][k])
+        if args.metrics != self._metrics:
+            vw.setMetricsBackend(args.metrics)
+            self._metrics = args.metrics
+        boilerplate = req['boilerplate']
+        sources = req['sources']
+        results = []
+        for fname, text in sources:
+            r = {'name':fname, 'ok':False, 'outputs':[]}
+            before = er.ror.counts
+            er.ror.source = fname if len(sources) > 1 else None
+            er.ror.capture()
+            try:
+                for rendered in bld.renderSource(fname, boilerplate, args, text):
+                    r['outputs'].extend(rendered)
+                r['ok'] = True
+            except er.ansisymPanic:
+                pass
+            except Exception as e:
+                er.ror.msg('f', ' '.join(['Internal error:', repr(e)]))
+            r['messages'] = er.ror.release()
+            r['counts'] = [a - b for a,b in zip(er.ror.counts, before)]
+            r['ok'] = r['ok'] and r['counts'][2] == 0 and r['counts'][3] == 0
+            er.ror.source = None
+            results.append(r)
+        return {'results':results}
+    def close(self):
+        self.server_close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def serve(args, path = socketPath):
+    "Runs a compile server until interrupted."
+    server = CompileServer(args, path)
+    print 'Serving on', path
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+#
+# Client side.
+#
+def request(req, path = socketPath):
+    "Sends req to the server on path and returns its reply."
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+        s.sendall(json.dumps(req))
+        s.sendall('\n')
+        f = s.makefile('rb')
+        try:
+            return _str(json.loads(f.readline()))
+        finally:
+            f.close()
+    finally:
+        s.close()
+
+def _isOutputName(fn, src, args):
+    "True if fn is a name the client would give an output of source src."
+    if os.sep in fn or (os.altsep != None and os.altsep in fn):
+        return False
+    if args.reponly:
+        return fn == bld.fileNameRoot(src) + '.symr'
+    if args.block != None:
+        return fn == args.block + '.sym'
+    return fn.endswith('.sym') and fn != '.sym'
+
+def compileFiles(fnames, boilerplate, args, manifest = None, path = socketPath):
+    """Compiles source files on the server and writes the outputs here.
+    Returns count of failures, or None if there is no usable server,
+    in which case nothing has been done."""
+    if not isOwnSocket(path):
+        return None
+    try:
+        sources = []
+        for fname in fnames:
+            with open(fname) as f:
+                sources.append([fname, f.read()])
+        reply = request({'version':ansisym_pkg.__version__,
+                         'checksum':codeChecksum(),
+                         'options':dict([(k, getattr(args, k))
+                                         for k in requestOptions]),
+                         'boilerplate':boilerplate, 'sources':sources}, path)
+        results = reply['results']
+        if len(results) != len(fnames):
+            return None
+    except (IOError, socket.error, ValueError, KeyError, UnicodeError):
+        return None
+    failed = 0
+    # Results come in the order the sources were sent.
+    for fname, r in zip(fnames, results):
+        for m in r['messages']:
+            print m
+        er.ror.merge(r['counts'])
+        ok = r['ok']
+        outputs = r['outputs']
+        bad = [fn for fn, text in outputs if not _isOutputName(fn, fname, args)]
+        if bad:
+            er.ror.msg('f', ' '.join(['Server sent an unexpected output file',
+                                      repr(bad[0]), 'for', fname + '.']))
+            ok = False
+            outputs = []
+        try:
+            bld.writeOutputs(outputs, args)
+        except (IOError, OSError) as e:
+            er.ror.msg('f', ' '.join(["Can't process", fname + ':',
+                                      e.strerror]))
+            ok = False
+        if manifest != None:
+            manifest.update(fname, ok, [fn for fn, text in outputs])
+        if not ok:
+            failed += 1
+    return failed
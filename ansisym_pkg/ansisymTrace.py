@@ -0,0 +1,105 @@
+"ansisym tracing -- begin/end events, exported in Chrome trace format."
+
+#   Copyright 2013 David B. Curtis
+
+#   This file is part of ansisym.
+#
+#   ansisym is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   ansisym is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with ansisym.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Where --profile sums up a build, 'ansisym --trace FILE' records a
+# timeline of it.  Interesting stretches of code are wrapped in
+#   with trace.span('name'):
+# which records a begin and an end event while tracing is on, and
+# costs one attribute test while it is off.  Events carry the process
+# and thread they happened in and a wall clock time stamp, so events
+# from -j worker processes, handed back with takeEvents() and added
+# with merge(), line up with the parent's.
+#
+# save() writes the Chrome trace event format, which chrome://tracing,
+# Perfetto and speedscope all read.
+
+import os
+import json
+import time
+import thread
+
+class _NullSpan(object):
+    "Stands in for _Span while tracing is off."
+    def __enter__(self):
+        pass
+    def __exit__(self, *exc):
+        return False
+
+_nullSpan = _NullSpan()
+
+class _Span(object):
+    def __init__(self, events, name, args):
+        self.events = events
+        self.name = name
+        self.args = args
+    def __enter__(self):
+        self.events.append(('B', self.name, time.time(), thread.get_ident(),
+                            self.args))
+    def __exit__(self, *exc):
+        self.events.append(('E', self.name, time.time(), thread.get_ident(),
+                            None))
+        return False
+
+class Tracer(object):
+    "Records begin/end events while enabled."
+    enabled = False
+    category = 'ansisym'
+    def __init__(self):
+        self._events = [] # (phase, name, seconds, thread id, args)
+        self._merged = [] # Trace event dicts from other processes.
+    def enable(self):
+        self.enabled = True
+    def reset(self):
+        "Forgets all events, e.g. those a worker inherits from its parent."
+        self._events = []
+        self._merged = []
+    def span(self, name, **args):
+        "Context manager that records the code inside it as a span."
+        if not self.enabled:
+            return _nullSpan
+        return _Span(self._events, name, args if args else None)
+    def takeEvents(self, processName = None):
+        "Returns this process's events as trace event dicts, and forgets them."
+        pid = os.getpid()
+        l = []
+        if processName != None:
+            l.append({'name':'process_name', 'ph':'M', 'pid':pid, 'tid':0,
+                      'args':{'name':processName}})
+        for ph, name, t, tid, args in self._events:
+            e = {'name':name, 'cat':self.category, 'ph':ph,
+                 'ts':int(t * 1000000.0), 'pid':pid, 'tid':tid}
+            if args != None:
+                e['args'] = args
+            l.append(e)
+        self._events = []
+        return l
+    def merge(self, events):
+        "Adds events returned by takeEvents() in another process."
+        self._merged.extend(events)
+    def save(self, fname):
+        "Writes every event recorded or merged so far to fname as a Chrome trace."
+        import ansisym_pkg
+        events = self.takeEvents('ansisym') + self._merged
+        with open(fname, 'w') as f:
+            json.dump({'traceEvents':events, 'displayTimeUnit':'ms',
+                       'otherData':{'ansisym':ansisym_pkg.__version__}}, f)
+
+# Single instance of Tracer, shared by the whole process.
+trace = Tracer()
@@ -0,0 +1,175 @@
+"ansisym watch mode -- recompiles sources as they are saved."
+
+#   Copyright 2013 David B. Curtis
+
+#   This file is part of ansisym.
+#
+#   ansisym is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   ansisym is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with ansisym.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Watch mode stays resident, so the parser tables, font tables and
+# text width cache are loaded once and every later compile is warm.
+# Changes are picked up with inotify when pyinotify is installed,
+# otherwise by polling modification times.  A changed source is
+# recompiled on its own; a changed boilerplate file recompiles
+# everything, since every symbol carries the boilerplate attributes.
+
+import os
+import time
+
+import ansisymErrorSink as er
+import ansisymBuild as bld
+
+pollInterval = 0.5 # Seconds between checks of the known files when polling.
+rescanInterval = 5.0 # Seconds between searches for new sources when polling.
+
+def _norm(fname):
+    return os.path.normpath(os.path.expanduser(fname))
+
+class PollingWatcher(object):
+    """Finds changed files by comparing modification times and sizes.
+    Each poll only stats the files it knows of; the directories are
+    searched for new sources every rescanInterval seconds, since that
+    is what costs on a library of thousands of files."""
+    def __init__(self, dirs, extraFiles):
+        self.dirs = dirs
+        self.extraFiles = extraFiles
+        self._files = self._search()
+        self._searched = time.time()
+        self._stamps = self._stat(self._files)
+    def _search(self):
+        return [_norm(fn) for fn in bld.expandSources(self.dirs)] + self.extraFiles
+    @staticmethod
+    def _stat(fnames):
+        d = dict()
+        for fname in fnames:
+            try:
+                st = os.stat(fname)
+                d[fname] = (st.st_mtime, st.st_size)
+            except OSError:
+                pass
+        return d
+    def changes(self, timeout):
+        "Waits up to timeout seconds, returns set of changed or removed files."
+        deadline = time.time() + timeout
+        while True:
+            if time.time() - self._searched >= rescanInterval:
+                self._files = self._search()
+                self._searched = time.time()
+            stamps = self._stat(self._files)
+            changed = set([fn for fn, st in stamps.items()
+                           if self._stamps.get(fn) != st])
+            changed |= set(self._stamps) - set(stamps)
+            self._stamps = stamps
+            now = time.time()
+            if changed or now >= deadline:
+                return changed
+            time.sleep(min(pollInterval, deadline - now))
+
+class InotifyWatcher(object):
+    "Finds changed files with inotify.  Raises ImportError without pyinotify."
+    def __init__(self, dirs, extraFiles):
+        import pyinotify
+        self.dirs = [_norm(d) for d in dirs]
+        self.extraFiles = extraFiles
+        self._changed = set()
+        self._wm = pyinotify.WatchManager()
+        # Editors often save by writing a new file and renaming it
+        # over the old one, hence the move events.
+        mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO \
+               | pyinotify.IN_MOVED_FROM | pyinotify.IN_DELETE
+        for d in self.dirs:
+            self._wm.add_watch(d, mask, rec=True, auto_add=True)
+        for d in set([os.path.dirname(os.path.abspath(fn)) for fn in extraFiles]):
+            if os.path.isdir(d):
+                self._wm.add_watch(d, mask)
+        self._notifier = pyinotify.Notifier(self._wm, self._event)
+        self._extra = set([os.path.abspath(fn) for fn in extraFiles])
+    def _event(self, event):
+        fname = _norm(event.pathname)
+        if fname.endswith(bld.sourceSuffix):
+            self._changed.add(fname)
+        elif os.path.abspath(fname) in self._extra:
+            for fn in self.extraFiles:
+                if os.path.abspath(fn) == os.path.abspath(fname):
+                    self._changed.add(fn)
+    def changes(self, timeout):
+        "Waits up to timeout seconds, returns set of changed or removed files."
+        if self._notifier.check_events(int(timeout * 1000)):
+            self._notifier.read_events()
+            self._notifier.process_events()
+        changed = self._changed
+        self._changed = set()
+        return changed
+
+def makeWatcher(dirs, extraFiles):
+    "Returns an InotifyWatcher if possible, else a PollingWatcher."
+    try:
+        return InotifyWatcher(dirs, extraFiles)
+    except ImportError:
+        return PollingWatcher(dirs, extraFiles)
+
+def rebuild(fnames, boilerplate, args, manifest = None):
+    "Compiles fnames, printing one status line per file.  Returns count of failures."
+    if manifest != None:
+        fnames = manifest.staleSources(fnames, boilerplate, args)
+    failed = 0
+    for fname in fnames:
+        start = time.time()
+        er.ror.source = fname
+        outputs = []
+        try:
+            ok = bld.compileFile(fname, boilerplate, args, outputs)
+        except Exception as e:
+            # A bug tripped by one file mustn't stop the watcher.
+            er.ror.msg('f', ' '.join(['Internal error:', repr(e)]))
+            ok = False
+        finally:
+            er.ror.source = None
+        if manifest != None:
+            manifest.update(fname, ok, outputs)
+        if not ok:
+            failed += 1
+        print '{0:s} {1:s} {2:s} ({3:.0f} ms)'.format(time.strftime('%H:%M:%S'),
+            fname, 'ok' if ok else 'FAILED', (time.time() - start) * 1000.0)
+    if manifest != None and fnames and not args.dry_run:
+        manifest.save()
+    return failed
+
+def watch(dirs, boilerplate, args, manifest = None):
+    """Compiles the sources under dirs, then recompiles them as they
+    change.  Runs until interrupted."""
+    bpFiles = [_norm(fn) for fn in
+               ([args.boilerplate] if args.boilerplate else bld.boilerplatePath)]
+    watcher = makeWatcher(dirs, bpFiles)
+    print 'Watching', ', '.join(dirs), '(inotify)' \
+        if isinstance(watcher, InotifyWatcher) else '(polling)'
+    rebuild(bld.expandSources(dirs), boilerplate, args, manifest)
+    try:
+        while True:
+            changed = watcher.changes(1.0)
+            if not changed:
+                continue
+            if changed & set(bpFiles):
+                try:
+                    boilerplate = bld.loadBoilerplate(bld.boilerplatePath,
+                                                      args.boilerplate)
+                except IOError:
+                    er.ror.msg('w', "Can't read boilerplate.")
+                todo = bld.expandSources(dirs)
+            else:
+                todo = sorted([fn for fn in changed if os.path.isfile(fn)])
+            rebuild(todo, boilerplate, args, manifest)
+    except KeyboardInterrupt:
+        pass
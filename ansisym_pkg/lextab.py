@@ -0,0 +1,10 @@
+# lextab.py. This file automatically created by PLY (version 3.4). Don't edit!
+_tabversion   = '3.4'
+_lextokens    = {'A': 1, 'KW_CTXTU': 1, 'AB': 1, 'NL': 1, 'IO': 1, 'KW_CTXT': 1, 'KW_SEP': 1, 'BAD': 1, 'BK': 1, 'FLAG': 1, 'NUM': 1, 'U': 1, 'T': 1, 'STR': 1, 'KW_NECK': 1, 'KW_DIR': 1}
+_lexreflags   = 0
+_lexliterals  = ",%^~;:[]=/$(<`'+{*.>!)}"
+_lexstateinfo = {'strstate': 'exclusive', 'kwstate': 'inclusive', 'INITIAL': 'inclusive'}
+_lexstatere   = {'strstate': [('(?P<t_strstate_STR>([^"\\n\\\\]|(\\\\"))+)|(?P<t_strstate_done>")', [None, ('t_strstate_STR', 'STR'), None, None, ('t_strstate_done', 'done')])], 'kwstate': [('(?P<t_kwstate_NL>\\n)|(?P<t_kwstate_KW>[A-Z]+)|(?P<t_kwstate_KWS>(\\-\\-)|(\\-)|(\\])|(\\|\\^)|(\\|)|%)', [None, ('t_kwstate_NL', 'NL'), ('t_kwstate_KW', 'KW'), ('t_kwstate_KWS', 'KWS')]), ('(?P<t_NL>\\n)|(?P<t_STR>[a-zA-Z0-9&@_][a-zA-Z0-9&@_?-]*)|(?P<t_STR_start>")|(?P<t_FLAG>![a-z]+)|(?P<t_comment>\\#.*)', [None, ('t_NL', 'NL'), ('t_STR', 'STR'), ('t_STR_start', 'STR_start'), ('t_FLAG', 'FLAG'), ('t_comment', 'comment')])], 'INITIAL': [('(?P<t_NL>\\n)|(?P<t_STR>[a-zA-Z0-9&@_][a-zA-Z0-9&@_?-]*)|(?P<t_STR_start>")|(?P<t_FLAG>![a-z]+)|(?P<t_comment>\\#.*)', [None, ('t_NL', 'NL'), ('t_STR', 'STR'), ('t_STR_start', 'STR_start'), ('t_FLAG', 'FLAG'), ('t_comment', 'comment')])]}
+_lexstateignore = {'strstate': '', 'kwstate': ' \t', 'INITIAL': ' \t'}
+_lexstateerrorf = {'strstate': 't_strstate_error', 'kwstate': 't_error', 'INITIAL': 't_error'}
+_checksum = '452b8e00f64bde82f454ba6ab0ab5061'
@@ -0,0 +1,91 @@
+
+# ansisym_pkg/parsetab.py
+# This file is automatically generated. Do not edit.
+_tabversion = '3.2'
+
+_lr_method = 'LALR'
+
+_lr_signature = '\xf5?\xa67@\xfb\x8b\xa7}\xbc\xe2\xc1\x1a\x8c\xa5\x12'
+    
+_lr_action_items = {'STR':([3,6,8,17,22,25,38,44,45,46,55,56,59,60,61,63,64,65,66,84,87,105,],[6,15,17,30,35,50,-51,72,76,76,35,83,-50,-55,86,-53,-54,-52,88,-49,72,-51,]),'BK':([0,1,2,5,10,11,12,13,16,19,21,24,26,27,28,31,32,37,42,47,52,53,58,67,68,78,81,89,91,92,93,100,103,110,],[-5,-4,-3,-14,-12,-2,22,-8,-9,-13,-10,22,-19,-7,-6,-17,-11,-23,-31,-18,-16,-15,-30,-41,-34,-21,-22,-39,-35,-32,-33,-36,-20,-40,]),'BAD':([23,37,42,54,57,58,67,68,89,91,92,93,100,110,],[43,43,-31,-24,-25,-30,-41,-34,-39,-35,-32,-33,-36,-40,]),'KW_CTXTU':([23,37,42,54,57,58,67,68,89,91,92,93,100,110,],[39,39,-31,-24,-25,-30,-41,-34,-39,-35,-32,-33,-36,-40,]),'NL':([0,6,7,9,14,15,18,20,29,30,33,34,35,36,40,41,44,45,46,48,49,51,69,70,71,72,74,75,76,77,82,83,88,94,95,96,97,98,101,105,107,108,109,],[1,13,16,19,27,28,31,32,52,53,54,-27,-29,57,67,68,-44,-61,-61,78,-59,81,89,-43,-45,-42,91,92,-60,93,-26,-28,100,-58,103,-46,-57,-47,-37,-48,-56,110,-38,]),',':([48,49,90,94,95,97,107,],[79,-59,102,-58,79,79,79,]),'/':([33,34,35,49,82,83,94,96,97,98,107,],[55,-27,-29,-59,-26,-28,-58,104,-57,104,-56,]),'NUM':([6,17,25,38,39,44,59,60,61,63,64,65,73,79,80,84,85,86,87,102,104,105,],[14,29,49,-51,66,70,-50,-55,85,-53,-54,-52,90,94,49,-49,49,49,70,106,49,-51,]),';':([38,49,62,70,71,72,87,94,96,97,98,99,101,107,109,],[-48,-59,87,-43,-45,-42,-44,-58,-46,-57,-47,105,-37,-56,-38,]),':':([35,50,],[56,80,]),'$end':([4,24,26,37,42,47,58,67,68,78,81,89,91,92,93,100,103,110,],[0,-1,-19,-23,-31,-18,-30,-41,-34,-21,-22,-39,-35,-32,-33,-36,-20,-40,]),'A':([0,1,2,5,10,11,12,13,16,19,21,27,28,31,32,52,53,],[-5,-4,-3,8,-12,-2,8,-8,-9,-13,-10,-7,-6,-17,-11,-16,-15,]),'AB':([0,1,2,5,10,11,12,13,16,19,21,27,28,31,32,52,53,],[-5,-4,-3,9,-12,-2,20,-8,-9,-13,-10,-7,-6,-17,-11,-16,-15,]),'FLAG':([38,59,60,61,63,64,65,84,105,],[60,-50,-55,60,-53,-54,-52,-49,60,]),'KW_CTXT':([23,37,42,54,57,58,67,68,89,91,92,93,100,110,],[44,44,-31,-24,-25,-30,-41,-34,-39,-35,-32,-33,-36,-40,]),'U':([0,1,2,5,10,11,12,13,16,19,21,24,26,27,28,31,32,37,42,47,52,53,58,67,68,78,81,89,91,92,93,100,103,110,],[-5,-4,-3,-14,-12,-2,25,-8,-9,-13,-10,25,-19,-7,-6,-17,-11,-23,-31,-18,-16,-15,-30,-41,-34,-21,-22,-39,-35,-32,-33,-36,-20,-40,]),'T':([23,37,42,54,57,58,67,68,89,91,92,93,100,110,],[45,45,-31,-24,-25,-30,-41,-34,-39,-35,-32,-33,-36,-40,]),'IO':([23,37,42,54,57,58,67,68,89,91,92,93,100,110,],[38,38,-31,-24,-25,-30,-41,-34,-39,-35,-32,-33,-36,-40,]),'KW_NECK':([23,37,42,54,57,58,67,68,89,91,92,93,100,110,],[46,46,-31,-24,-25,-30,-41,-34,-39,-35,-32,-33,-36,-40,]),'%':([38,59,60,61,63,64,65,84,105,],[64,-50,-55,64,-53,-54,-52,-49,64,]),'[':([44,87,],[73,73,]),']':([90,106,],[101,109,]),'^':([38,59,60,61,63,64,65,84,105,],[63,-50,-55,63,-53,-54,-52,-49,63,]),'KW_DIR':([0,1,2,5,11,13,16,27,28,],[3,-4,-3,3,-2,-8,-9,-7,-6,]),'KW_SEP':([23,37,42,54,57,58,67,68,89,91,92,93,100,110,],[41,41,-31,-24,-25,-30,-41,-34,-39,-35,-32,-33,-36,-40,]),'error':([3,8,22,23,25,37,42,43,54,57,58,67,68,89,91,92,93,100,110,],[7,18,36,40,51,40,-31,69,-24,-25,-30,-41,-34,-39,-35,-32,-33,-36,-40,]),'~':([38,59,60,61,63,64,65,84,105,],[65,-50,-55,65,-53,-54,-52,-49,65,]),}
+
+_lr_action = { }
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = { }
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'opt_str':([45,46,],[75,77,]),'band_list':([23,],[37,]),'package_pinnum_list':([85,86,],[96,98,]),'attr':([5,12,],[10,21,]),'directive':([0,5,],[2,11,]),'bk_package_list':([22,],[33,]),'pinflag':([38,61,105,],[59,84,59,]),'block_header':([12,24,],[23,23,]),'pinflag_list':([38,105,],[61,61,]),'pinnum_list':([25,80,85,86,104,],[48,95,97,97,107,]),'band':([23,37,],[42,58,]),'opt_io_tile':([38,105,],[62,108,]),'part':([0,],[4,]),'global_attrs':([5,],[12,]),'bk_package_spec':([22,55,],[34,82,]),'block_list':([12,],[24,]),'directives':([0,],[5,]),'opt_glyph_tile':([44,87,],[74,99,]),'block':([12,24,],[26,47,]),'spacer_spec':([44,87,],[71,71,]),}
+
+_lr_goto = { }
+for _k, _v in _lr_goto_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = { }
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> part","S'",1,None,None,None),
+  ('part -> directives global_attrs block_list','part',3,'p_part','ansisym_pkg/ansisymParser.py',197),
+  ('directives -> directives directive','directives',2,'p_directives','ansisym_pkg/ansisymParser.py',203),
+  ('directives -> directive','directives',1,'p_directives','ansisym_pkg/ansisymParser.py',204),
+  ('directives -> NL','directives',1,'p_directives','ansisym_pkg/ansisymParser.py',205),
+  ('directives -> <empty>','directives',0,'p_directives','ansisym_pkg/ansisymParser.py',206),
+  ('directive -> KW_DIR STR STR NL','directive',4,'p_directive','ansisym_pkg/ansisymParser.py',210),
+  ('directive -> KW_DIR STR NUM NL','directive',4,'p_directive','ansisym_pkg/ansisymParser.py',211),
+  ('directive -> KW_DIR STR NL','directive',3,'p_directive','ansisym_pkg/ansisymParser.py',212),
+  ('directive -> KW_DIR error NL','directive',3,'p_directive_err','ansisym_pkg/ansisymParser.py',222),
+  ('global_attrs -> global_attrs attr','global_attrs',2,'p_global_attrs_attr','ansisym_pkg/ansisymParser.py',227),
+  ('global_attrs -> global_attrs AB NL','global_attrs',3,'p_global_attrs_boilerplate','ansisym_pkg/ansisymParser.py',232),
+  ('global_attrs -> attr','global_attrs',1,'p_global_attrs_induce_attr','ansisym_pkg/ansisymParser.py',238),
+  ('global_attrs -> AB NL','global_attrs',2,'p_global_attrs_induce_boilerplate','ansisym_pkg/ansisymParser.py',244),
+  ('global_attrs -> <empty>','global_attrs',0,'p_global_attrs_completely_missing','ansisym_pkg/ansisymParser.py',251),
+  ('attr -> A STR STR NL','attr',4,'p_attr','ansisym_pkg/ansisymParser.py',258),
+  ('attr -> A STR NUM NL','attr',4,'p_attr','ansisym_pkg/ansisymParser.py',259),
+  ('attr -> A error NL','attr',3,'p_attr_err','ansisym_pkg/ansisymParser.py',263),
+  ('block_list -> block_list block','block_list',2,'p_block_list_recurse','ansisym_pkg/ansisymParser.py',268),
+  ('block_list -> block','block_list',1,'p_block_list_induce','ansisym_pkg/ansisymParser.py',273),
+  ('block -> U STR : pinnum_list NL','block',5,'p_block_u','ansisym_pkg/ansisymParser.py',278),
+  ('block -> U pinnum_list NL','block',3,'p_block_u','ansisym_pkg/ansisymParser.py',279),
+  ('block -> U error NL','block',3,'p_block_u_err','ansisym_pkg/ansisymParser.py',290),
+  ('block -> block_header band_list','block',2,'p_block_bk','ansisym_pkg/ansisymParser.py',296),
+  ('block_header -> BK bk_package_list NL','block_header',3,'p_block_header','ansisym_pkg/ansisymParser.py',302),
+  ('block_header -> BK error NL','block_header',3,'p_block_header_err','ansisym_pkg/ansisymParser.py',315),
+  ('bk_package_list -> bk_package_list / bk_package_spec','bk_package_list',3,'p_bk_package_list_recurse','ansisym_pkg/ansisymParser.py',320),
+  ('bk_package_list -> bk_package_spec','bk_package_list',1,'p_bk_package_list_induce','ansisym_pkg/ansisymParser.py',325),
+  ('bk_package_spec -> STR : STR','bk_package_spec',3,'p_bk_package_spec','ansisym_pkg/ansisymParser.py',329),
+  ('bk_package_spec -> STR','bk_package_spec',1,'p_bk_package_spec','ansisym_pkg/ansisymParser.py',330),
+  ('band_list -> band_list band','band_list',2,'p_band_list_recurse','ansisym_pkg/ansisymParser.py',341),
+  ('band_list -> band','band_list',1,'p_band_list_induce','ansisym_pkg/ansisymParser.py',346),
+  ('band -> T opt_str NL','band',3,'p_band_top','ansisym_pkg/ansisymParser.py',351),
+  ('band -> KW_NECK opt_str NL','band',3,'p_band_neck','ansisym_pkg/ansisymParser.py',359),
+  ('band -> KW_SEP NL','band',2,'p_band_sep','ansisym_pkg/ansisymParser.py',367),
+  ('band -> KW_CTXT opt_glyph_tile NL','band',3,'p_band_text','ansisym_pkg/ansisymParser.py',373),
+  ('band -> KW_CTXTU NUM STR NL','band',4,'p_band_kerntext','ansisym_pkg/ansisymParser.py',378),
+  ('spacer_spec -> [ NUM ]','spacer_spec',3,'p_spacer_spec_w','ansisym_pkg/ansisymParser.py',386),
+  ('spacer_spec -> [ NUM , NUM ]','spacer_spec',5,'p_spacer_spec_wh','ansisym_pkg/ansisymParser.py',390),
+  ('band -> BAD error NL','band',3,'p_band_bad','ansisym_pkg/ansisymParser.py',395),
+  ('band -> IO opt_io_tile ; opt_glyph_tile ; opt_io_tile NL','band',7,'p_band_io','ansisym_pkg/ansisymParser.py',401),
+  ('band -> error NL','band',2,'p_band_err','ansisym_pkg/ansisymParser.py',407),
+  ('opt_glyph_tile -> STR','opt_glyph_tile',1,'p_opt_glyph_tile','ansisym_pkg/ansisymParser.py',414),
+  ('opt_glyph_tile -> NUM','opt_glyph_tile',1,'p_opt_glyph_tile','ansisym_pkg/ansisymParser.py',415),
+  ('opt_glyph_tile -> <empty>','opt_glyph_tile',0,'p_opt_glyph_tile','ansisym_pkg/ansisymParser.py',416),
+  ('opt_glyph_tile -> spacer_spec','opt_glyph_tile',1,'p_opt_glyph_spacer_tile','ansisym_pkg/ansisymParser.py',424),
+  ('opt_io_tile -> pinflag_list NUM package_pinnum_list','opt_io_tile',3,'p_opt_io_tile','ansisym_pkg/ansisymParser.py',437),
+  ('opt_io_tile -> pinflag_list STR package_pinnum_list','opt_io_tile',3,'p_opt_io_tile','ansisym_pkg/ansisymParser.py',438),
+  ('opt_io_tile -> <empty>','opt_io_tile',0,'p_opt_io_tile','ansisym_pkg/ansisymParser.py',439),
+  ('pinflag_list -> pinflag_list pinflag','pinflag_list',2,'p_pinflag_list_recurse','ansisym_pkg/ansisymParser.py',463),
+  ('pinflag_list -> pinflag','pinflag_list',1,'p_pinflag_list_induce','ansisym_pkg/ansisymParser.py',467),
+  ('pinflag_list -> <empty>','pinflag_list',0,'p_pinflag_list_empty','ansisym_pkg/ansisymParser.py',471),
+  ('pinflag -> ~','pinflag',1,'p_pinflag','ansisym_pkg/ansisymParser.py',475),
+  ('pinflag -> ^','pinflag',1,'p_pinflag','ansisym_pkg/ansisymParser.py',476),
+  ('pinflag -> %','pinflag',1,'p_pinflag','ansisym_pkg/ansisymParser.py',477),
+  ('pinflag -> FLAG','pinflag',1,'p_pinflag','ansisym_pkg/ansisymParser.py',478),
+  ('package_pinnum_list -> package_pinnum_list / pinnum_list','package_pinnum_list',3,'p_package_pinnum_list_recurse','ansisym_pkg/ansisymParser.py',492),
+  ('package_pinnum_list -> pinnum_list','package_pinnum_list',1,'p_package_pinnum_list_induce','ansisym_pkg/ansisymParser.py',498),
+  ('pinnum_list -> pinnum_list , NUM','pinnum_list',3,'p_pinnum_list_recurse','ansisym_pkg/ansisymParser.py',502),
+  ('pinnum_list -> NUM','pinnum_list',1,'p_pinnum_list_induce','ansisym_pkg/ansisymParser.py',507),
+  ('opt_str -> STR','opt_str',1,'p_opt_str','ansisym_pkg/ansisymParser.py',512),
+  ('opt_str -> <empty>','opt_str',0,'p_opt_str','ansisym_pkg/ansisymParser.py',513),
+]
+_checksum = '452b8e00f64bde82f454ba6ab0ab5061'
@@ -0,0 +1,7 @@
+"""ansisym benchmarks -- synthetic .symt inputs and per-phase timing.
+
+Run from the top of the source tree:
+    python -m bench.benchRunner              # run the standard cases
+    python -m bench.benchRunner -o new.json --compare baseline.json
+    python -m bench.symtGen --pins 3000 > big.symt
+"""
@@ -0,0 +1,305 @@
+"benchRunner -- times each compile phase on synthetic parts."
+
+#   Copyright 2013 David B. Curtis
+
+#   This file is part of ansisym.
+#
+#   ansisym is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   ansisym is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with ansisym.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Each case is run in a child process of its own, so its peak memory
+# isn't muddied by the cases before it.  Every phase is timed over
+# several repeats and the best time is kept, which is the least noisy
+# figure on a busy machine.  The text width cache is emptied before
+# each repeat, so layout always pays for measuring text.
+#
+# Times are noisy, so each case also counts the Python function calls
+# per pin it takes to make, lay out and render the views, once, with
+# cProfile.  That figure is the same on every run.
+#
+# Start-up is timed too: the best of several runs of the ansisym
+# script itself, in a fresh interpreter, on a small part with -n.
+#
+# Usage, from the top of the source tree:
+#   python -m bench.benchRunner [-o results.json] [--compare baseline.json]
+
+import os
+import sys
+import json
+import time
+import shutil
+import pstats
+import argparse
+import cProfile
+import resource
+import tempfile
+import platform
+import subprocess
+import cStringIO
+import multiprocessing
+
+import ansisym_pkg
+import ansisym_pkg.ansisymBuild as bld
+import ansisym_pkg.ansisymGSView as vw
+import symtGen
+
+_resultsVersion = 1
+
+phases = ['lex', 'parse', 'validate', 'pinseq', 'slotattrs', 'layout',
+          'render', 'write']
+
+# The standard cases: one axis at a time away from a modest part.
+standardCases = [
+    ('pins-16', {'pins':16}),
+    ('pins-300', {'pins':300}),
+    ('pins-1000', {'pins':1000}),
+    ('pins-3000', {'pins':3000}),
+    ('packages-4', {'pins':300, 'packages':4}),
+    ('slots-4', {'pins':100, 'slots':4}),
+    ('blocks-16', {'pins':64, 'blocks':16}),
+    ('parts-100', {'pins':32, 'parts':100}),
+]
+
+class _WriteArgs(object):
+    "The options writeOutputs() looks at."
+    dry_run = False
+    nosave = True
+
+def _timePhases(text, outDir):
+    "Compiles text once, returns dict of phase name to seconds."
+    import ansisym_pkg.ansisymParser as ps
+    t = dict([(p, 0.0) for p in phases])
+    clock = time.time
+    # Lexing on its own; the parse phase below lexes again as it goes.
+    start = clock()
+    lexer = ps.LineScanner()
+    lexer.input(text)
+    token = lexer.token
+    while token():
+        pass
+    t['lex'] = clock() - start
+    for partText, firstLine, name in ps.splitParts(cStringIO.StringIO(text)):
+        start = clock()
+        part = ps.parse(partText, [], 0, firstLine)
+        t['parse'] += clock() - start
+        start = clock()
+        if not part.isValid:
+            raise ValueError('Generated part is not valid.')
+        t['validate'] += clock() - start
+        view = vw.GVPart(part)
+        start = clock()
+        view.assignPinseqAll()
+        t['pinseq'] += clock() - start
+        start = clock()
+        view.addSlotAttrsAll()
+        t['slotattrs'] += clock() - start
+        start = clock()
+        view.layoutAll()
+        t['layout'] += clock() - start
+        start = clock()
+        outputs = []
+        for name in part.blockNameSet():
+            outputs.append((os.path.join(outDir, name + '.sym'),
+                            '\n'.join(view.render(name)) + '\n'))
+        t['render'] += clock() - start
+        start = clock()
+        bld.writeOutputs(outputs, _WriteArgs)
+        t['write'] += clock() - start
+    return t
+
+def _callsPerPin(text):
+    "Counts function calls per pin to make, lay out and render the views of text."
+    import ansisym_pkg.ansisymParser as ps
+    vw.textWidths = vw.TextWidthCache(vw.textWidths.maxEntries)
+    calls = pins = 0
+    for partText, firstLine, name in ps.splitParts(cStringIO.StringIO(text)):
+        part = ps.parse(partText, [], 0, firstLine)
+        if not part.isValid:
+            raise ValueError('Generated part is not valid.')
+        p = cProfile.Profile()
+        p.enable()
+        view = vw.GVPart(part)
+        view.assignPinseqAll()
+        view.addSlotAttrsAll()
+        view.layoutAll()
+        for name in part.blockNameSet():
+            '\n'.join(view.render(name))
+        p.disable()
+        calls += pstats.Stats(p).total_calls
+        for b in view.blockViews:
+            for bv in b.bandViews:
+                pins += len([tv for tv in [bv.lview, bv.rview]
+                             if isinstance(tv, vw.GVPin)])
+    return calls / float(max(pins, 1))
+
+def _runCase(params, repeat, queue):
+    "Child process body: times one case, puts the result on queue."
+    try:
+        text = symtGen.generate(**params)
+        best = None
+        for r in xrange(repeat):
+            outDir = tempfile.mkdtemp(prefix='ansisym-bench-')
+            vw.textWidths = vw.TextWidthCache(vw.textWidths.maxEntries)
+            try:
+                t = _timePhases(text, outDir)
+            finally:
+                shutil.rmtree(outDir, True)
+            if best == None:
+                best = t
+            else:
+                best = dict([(p, min(best[p], t[p])) for p in phases])
+        best['total'] = sum([best[p] for p in phases])
+        queue.put({'phases':best, 'bytes':len(text),
+                   'callsPerPin':_callsPerPin(text),
+                   'peakKB':resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+    except Exception as e:
+        queue.put({'error':repr(e)})
+
+def runCase(name, params, repeat = 3):
+    "Times one case in a child process.  Returns its result dict."
+    queue = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_runCase, args=(params, repeat, queue))
+    p.start()
+    r = queue.get()
+    p.join()
+    r['name'] = name
+    r['params'] = params
+    return r
+
+def coldStart(repeat = 5):
+    """Best time, in seconds, to run the ansisym script with -n on a
+    small part in a fresh interpreter."""
+    top = os.path.dirname(os.path.dirname(os.path.abspath(ansisym_pkg.__file__)))
+    workDir = tempfile.mkdtemp(prefix='ansisym-bench-')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([top] + filter(None,
+                            [env.get('PYTHONPATH')]))
+    try:
+        with open(os.path.join(workDir, 'part.symt'), 'w') as f:
+            f.write(symtGen.generate(pins=16))
+        cmd = [sys.executable, os.path.join(top, 'ansisym'), '--no-server',
+               '-n', 'part.symt']
+        best = None
+        with open(os.devnull, 'w') as null:
+            for r in xrange(repeat):
+                start = time.time()
+                subprocess.check_call(cmd, cwd=workDir, env=env,
+                                      stdout=null, stderr=subprocess.STDOUT)
+                t = time.time() - start
+                if best == None or t < best:
+                    best = t
+    finally:
+        shutil.rmtree(workDir, True)
+    return best
+
+def runAll(cases, repeat = 3, progress = None):
+    "Runs cases, a list of (name, params).  Returns results dict."
+    results = {'version':_resultsVersion,
+               'ansisym':ansisym_pkg.__version__,
+               'python':platform.python_version(),
+               'platform':platform.platform(),
+               'date':time.strftime('%Y-%m-%d %H:%M:%S'),
+               'repeat':repeat,
+               'coldStart':coldStart(max(repeat, 5)),
+               'cases':[]}
+    for name, params in cases:
+        r = runCase(name, params, repeat)
+        results['cases'].append(r)
+        if progress != None:
+            progress(r)
+    return results
+
+def formatCase(r):
+    "One line summary of a case result, times in ms."
+    if 'error' in r:
+        return '{0:12s} ERROR {1:s}'.format(r['name'], r['error'])
+    ph = r['phases']
+    return '{0:12s} '.format(r['name']) \
+        + ' '.join(['{0:s} {1:.1f}'.format(p, ph[p] * 1000.0) for p in phases]) \
+        + ' | total {0:.1f} ms, peak {1:d} KB, {2:.0f} calls/pin'.format(
+            ph['total'] * 1000.0, r['peakKB'], r.get('callsPerPin', 0.0))
+
+def compare(results, baseline, threshold = 0.2, floor = 0.002):
+    """Compares results to baseline.  Returns list of regression
+    messages: phases more than threshold (a fraction) slower than the
+    baseline, ignoring differences under floor seconds, and peak
+    memory or function calls per pin more than threshold over the
+    baseline.  Start-up time is compared the same way as a phase."""
+    base = dict([(r['name'], r) for r in baseline['cases'] if 'error' not in r])
+    l = []
+    if 'coldStart' in baseline and 'coldStart' in results:
+        new, old = results['coldStart'], baseline['coldStart']
+        if new > old * (1.0 + threshold) and new - old > floor:
+            l.append('start-up {0:.1f} ms -> {1:.1f} ms (+{2:.0f}%)'.format(
+                old * 1000.0, new * 1000.0, (new / old - 1.0) * 100.0))
+    for r in results['cases']:
+        b = base.get(r['name'])
+        if b == None or 'error' in r:
+            continue
+        if b['params'] != r['params']:
+            l.append(r['name'] + ': parameters differ from baseline, not compared.')
+            continue
+        for p in phases + ['total']:
+            new, old = r['phases'][p], b['phases'][p]
+            if new > old * (1.0 + threshold) and new - old > floor:
+                l.append('{0:s}: {1:s} {2:.1f} ms -> {3:.1f} ms (+{4:.0f}%)'.format(
+                    r['name'], p, old * 1000.0, new * 1000.0,
+                    (new / old - 1.0) * 100.0 if old > 0 else 100.0))
+        if r['peakKB'] > b['peakKB'] * (1.0 + threshold):
+            l.append('{0:s}: peak memory {1:d} KB -> {2:d} KB'.format(
+                r['name'], b['peakKB'], r['peakKB']))
+        if 'callsPerPin' in b and \
+           r['callsPerPin'] > b['callsPerPin'] * (1.0 + threshold):
+            l.append('{0:s}: calls per pin {1:.0f} -> {2:.0f}'.format(
+                r['name'], b['callsPerPin'], r['callsPerPin']))
+    return l
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Time ansisym compile phases.')
+    parser.add_argument('--output', '-o', metavar='FILE',
+        help='Write results to FILE as JSON.')
+    parser.add_argument('--compare', '-c', metavar='BASELINE',
+        help='Compare with results saved earlier; exit 1 on regressions.')
+    parser.add_argument('--threshold', type=float, default=0.2,
+        help='Slowdown, as a fraction, counted as a regression. (default: %(default)s)')
+    parser.add_argument('--repeat', '-r', type=int, default=3,
+        help='Times to run each case; the best is kept. (default: %(default)s)')
+    parser.add_argument('--case', action='append', metavar='NAME',
+        help='Run only the named standard case.  May be repeated.')
+    parser.add_argument('--metrics', choices=vw.metricsBackends, default='auto',
+        help='Text measurement backend. (default: %(default)s)')
+    args = parser.parse_args(argv)
+    vw.setMetricsBackend(args.metrics)
+    cases = [(n, p) for n, p in standardCases
+             if args.case == None or n in args.case]
+    def progress(r):
+        print formatCase(r)
+        sys.stdout.flush()
+    results = runAll(cases, args.repeat, progress)
+    print 'start-up     {0:.1f} ms'.format(results['coldStart'] * 1000.0)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for m in regressions:
+            print 'REGRESSION', m
+        if regressions:
+            return 1
+        print 'No regressions against', args.compare
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
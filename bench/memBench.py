@@ -0,0 +1,99 @@
+"memBench -- measures the memory cost of each pin of a part."
+
+#   Copyright 2013 David B. Curtis
+
+#   This file is part of ansisym.
+#
+#   ansisym is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   ansisym is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with ansisym.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Parses and lays out two synthetic parts of different sizes, each in
+# a child process of its own, and keeps the model and view alive while
+# it measures them.  The difference between the two, divided by the
+# difference in pin count, is the cost of one pin: bytes of resident
+# memory, and objects tracked by the garbage collector.
+#
+# Usage, from the top of the source tree:
+#   python -m bench.memBench [--pins 1000 --pins 4000] [--packages 2]
+
+import gc
+import sys
+import argparse
+import resource
+import multiprocessing
+
+import ansisym_pkg.ansisymGSView as vw
+import symtGen
+
+def _rssKB():
+    "Current resident size in KB, from /proc if possible."
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except (IOError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _measure(pins, packages, queue):
+    "Child process body: builds one part, puts its footprint on queue."
+    import ansisym_pkg.ansisymParser as ps
+    text = symtGen.generate(pins=pins, packages=packages)
+    gc.collect()
+    rss = _rssKB()
+    objects = len(gc.get_objects())
+    part = ps.parse(text, [])
+    if not part.isValid:
+        raise ValueError('Generated part is not valid.')
+    view = vw.GVPart(part)
+    view.assignPinseqAll()
+    view.addSlotAttrsAll()
+    view.layoutAll()
+    gc.collect()
+    queue.put({'pins':pins, 'kB':_rssKB() - rss,
+               'objects':len(gc.get_objects()) - objects})
+    del view, part
+
+def measure(pins, packages = 1):
+    "Returns {'pins', 'kB', 'objects'} for a part with pins pins."
+    queue = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_measure, args=(pins, packages, queue))
+    p.start()
+    r = queue.get()
+    p.join()
+    return r
+
+def perPin(small, large):
+    "Returns (bytes, objects) per pin from two measure() results."
+    n = float(large['pins'] - small['pins'])
+    return ((large['kB'] - small['kB']) * 1024.0 / n,
+            (large['objects'] - small['objects']) / n)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Measure memory per pin.')
+    parser.add_argument('--pins', type=int, action='append',
+        help='Pin counts of the two parts. (default: 1000 and 4000)')
+    parser.add_argument('--packages', type=int, default=1,
+        help='Packages per BK line. (default: %(default)s)')
+    args = parser.parse_args(argv)
+    small, large = args.pins if args.pins and len(args.pins) == 2 else [1000, 4000]
+    rs = measure(small, args.packages)
+    rl = measure(large, args.packages)
+    for r in [rs, rl]:
+        print '{0:6d} pins: {1:8d} KB, {2:8d} objects'.format(r['pins'], r['kB'],
+                                                              r['objects'])
+    b, o = perPin(rs, rl)
+    print 'Per pin: {0:.0f} bytes, {1:.1f} objects'.format(b, o)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"symtGen -- generates synthetic .symt sources for benchmarking."
+
+#   Copyright 2013 David B. Curtis
+
+#   This file is part of ansisym.
+#
+#   ansisym is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   ansisym is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with ansisym.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# The generated parts are valid and reproducible: every package uses
+# each pin number from 1 up exactly once, pin names are drawn from a
+# seeded random generator, and the mix of pin flags, separators and
+# center text resembles real parts.
+
+import random
+
+_flags = ['', '', '', '~', '^', '!oc ', '!tri ', '!st ']
+_prefixes = ['A', 'D', 'Q', 'PB', 'PC', 'ADC', 'GPIO', 'SDA', 'nCS', 'CLK']
+
+def _pinName(rnd, i):
+    name = rnd.choice(_prefixes) + str(i)
+    if rnd.random() < 0.1:
+        name = '"' + name + ' (' + rnd.choice(_prefixes) + str(i) + ')"'
+    return name
+
+def generatePart(name, pins = 16, packages = 1, slots = 1, blocks = 1, seed = 1):
+    """Returns the lines of one synthetic part.  Each of the blocks has
+    pins IO pins, each pin is listed for every package, and each pin
+    of a slotted part has slots pin numbers."""
+    rnd = random.Random(seed)
+    l = ['A device ' + name.upper(),
+         'A refdes U?',
+         'A description "Synthetic part ' + name + '"',
+         'A author "ansisym benchmark"',
+         'A copyright "2013 ansisym benchmark"',
+         'A uselicense unlimited',
+         'A distlicense "GPL V3 or later"']
+    pkgNames = ['PKG' + str(p) for p in xrange(packages)]
+    nextPin = 1
+    for b in xrange(blocks):
+        l.append('BK ' + '/'.join(['{0:s}:{1:s}-{2:s}-{3:d}'.format(p, name, p.lower(), b)
+                                   for p in pkgNames]))
+        l.append('T ' + name.upper())
+        for i in xrange(pins):
+            if i > 0 and i % 8 == 0:
+                l.append('|' if rnd.random() < 0.5 else '-')
+            pinList = ','.join([str(nextPin + s) for s in xrange(slots)])
+            nextPin += slots
+            pin = rnd.choice(_flags) + _pinName(rnd, i) + ' ' \
+                  + '/'.join([pinList] * packages)
+            l.append('IO ' + pin + ';;' if i % 2 == 0 else 'IO ;; ' + pin)
+    return l
+
+def generate(pins = 16, packages = 1, slots = 1, blocks = 1, parts = 1, seed = 1):
+    """Returns the text of a synthetic source.  With more than one part
+    the source is a library with a P line before each part."""
+    if parts == 1:
+        return '\n'.join(generatePart('synth', pins, packages, slots, blocks,
+                                      seed)) + '\n'
+    l = ['# Synthetic library']
+    for i in xrange(parts):
+        name = 'synth' + str(i)
+        l.append('P ' + name)
+        l.extend(generatePart(name, pins, packages, slots, blocks, seed + i))
+    return '\n'.join(l) + '\n'
+
+
+#############################################################################
+# Module quick-test #
+#####################
+if __name__ == '__main__':
+    # Writes a synthetic source to stdout, e.g.
+    #   python -m bench.symtGen --pins 3000 --packages 2 > big.symt
+    import sys
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate a synthetic .symt source.')
+    parser.add_argument('--pins', type=int, default=16, help='IO pins per block.')
+    parser.add_argument('--packages', type=int, default=1, help='Packages per BK line.')
+    parser.add_argument('--slots', type=int, default=1, help='Slots per pin.')
+    parser.add_argument('--blocks', type=int, default=1, help='Blocks per part.')
+    parser.add_argument('--parts', type=int, default=1, help='Parts in the library.')
+    parser.add_argument('--seed', type=int, default=1)
+    a = parser.parse_args()
+    sys.stdout.write(generate(a.pins, a.packages, a.slots, a.blocks, a.parts, a.seed))
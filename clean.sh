@@ -5,7 +5,8 @@ rm -f *.pyc
 rm -f *.py~
 rm -f ansisym~
 rm -f ansisym_pkg/parser.out
-rm -f ansisym_pkg/parsetab.py
 rm -f ansisym_pkg/*.pyc
 rm -f ansisym_pkg/*.py~
 
+rm -f ansisym_pkg/fontwidths.cache
+rm -f ansisym_pkg/fonttable-*.json